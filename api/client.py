@@ -0,0 +1,53 @@
+import json
+from typing import Iterator
+
+import requests
+
+
+class ChatApiClient:
+    """
+    HTTP client for api.server with the same execute_chat / execute_chat_stream methods as ChatService,
+    so the Streamlit page can use either one.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 300):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def chat(self, question: str, request_id: str = None) -> dict:
+        """:return: {'request_id', 'answer', 'status', 'cypher', 'duration_ms', 'stages_ms'}"""
+        response = self.session.post(f'{self.base_url}/chat', json={'question': question, 'request_id': request_id},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def execute_chat(self, user_input: str) -> str:
+        return self.chat(user_input)['answer']
+
+    def iter_events(self, question: str, request_id: str = None) -> Iterator[tuple]:
+        """:return: Generator of (event, data) server-sent events"""
+        with self.session.post(f'{self.base_url}/chat/stream', json={'question': question, 'request_id': request_id},
+                               stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                elif line.startswith('data: '):
+                    yield event, json.loads(line[len('data: '):])
+
+    def execute_chat_stream(self, user_input: str) -> Iterator[str]:
+        try:
+            for event, data in self.iter_events(user_input):
+                if event == 'token':
+                    yield data['text']
+        except requests.RequestException as e:
+            print(f"Error calling chat API: {e}")
+            yield "An error occurred while processing your request."
+
+
+if __name__ == "__main__":
+    client = ChatApiClient('http://localhost:8000')
+    for text in client.execute_chat_stream("介绍一下张坤和他管理的基金都有哪些?"):
+        print(text, end="", flush=True)
@@ -0,0 +1,172 @@
+import json
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from core.chat_service import ChatService, get_chat_service, DEFAULT_CONFIG_PATH
+from utils.logging import getLogger
+from utils.tracing import get_registry, count
+
+logger = getLogger()
+
+
+class ChatRequest(BaseModel):
+    question: str
+    request_id: Optional[str] = None
+
+
+class ChatServer:
+    """
+    Asyncio front end for ChatService.
+
+    The pipeline itself stays synchronous (boto3, requests and opensearch-py), so every question is offloaded
+    to a bounded thread pool; the event loop only waits on futures and can hold many questions in flight.
+    Questions beyond max_in_flight + max_queued are rejected with 429 instead of piling up.
+    """
+
+    def __init__(self, chat_service: ChatService, max_in_flight: int = 64, max_queued: int = 256):
+        self.chat_service = chat_service
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='chat')
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.waiting = 0
+        get_registry().register_collector('api', lambda: {'waiting': self.waiting, 'max_in_flight': self.max_in_flight})
+
+    def check_capacity(self):
+        if self.waiting >= self.max_in_flight + self.max_queued:
+            count('api_rejected_total', 'Questions rejected because the server is full')
+            raise HTTPException(status_code=429, detail='Too many questions in flight, retry later')
+
+    @asynccontextmanager
+    async def admit(self):
+        self.waiting += 1
+        try:
+            async with self.slots:
+                yield
+        finally:
+            self.waiting -= 1
+
+    @staticmethod
+    def trace_summary(trace) -> dict:
+        result = trace.to_json()
+        return {
+            'request_id': trace.request_id,
+            'status': result['status'],
+            'cypher': result['attributes'].get('cypher'),
+            'duration_ms': result['duration_ms'],
+            'stages_ms': trace.stage_timings()
+        }
+
+    async def chat(self, request: ChatRequest) -> dict:
+        self.check_capacity()
+        async with self.admit():
+            trace = self.chat_service.new_trace(request.request_id)
+            loop = asyncio.get_running_loop()
+            answer = await loop.run_in_executor(self.executor, self.chat_service.execute_chat, request.question, trace)
+            return dict(self.trace_summary(trace), answer=answer)
+
+    async def chat_stream(self, request: ChatRequest, http_request: Request):
+        """Server-sent events: one 'token' event per text delta, then a 'done' event with the trace summary."""
+        async with self.admit():
+            trace = self.chat_service.new_trace(request.request_id)
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+            end = object()
+
+            def produce():
+                stream = self.chat_service.execute_chat_stream(request.question, trace)
+                try:
+                    for text in stream:
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+                finally:
+                    stream.close()
+                    loop.call_soon_threadsafe(queue.put_nowait, end)
+
+            producer = loop.run_in_executor(self.executor, produce)
+            try:
+                yield self.sse('start', {'request_id': trace.request_id})
+                while True:
+                    text = await queue.get()
+                    if text is end:
+                        break
+                    if await http_request.is_disconnected():
+                        cancelled.set()
+                        break
+                    yield self.sse('token', {'text': text})
+                await producer
+                yield self.sse('done', self.trace_summary(trace))
+            finally:
+                # 客户端断开时通知后台线程停止读取 Bedrock 流
+                cancelled.set()
+
+    @staticmethod
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(config_path: str = DEFAULT_CONFIG_PATH) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        loop = asyncio.get_running_loop()
+        chat_service = await loop.run_in_executor(None, get_chat_service, config_path)
+        api_info = chat_service.aws_config.get('api_info', {})
+        app.state.server = ChatServer(
+            chat_service,
+            max_in_flight=api_info.get('max_in_flight', 64),
+            max_queued=api_info.get('max_queued', 256)
+        )
+        yield
+        app.state.server.executor.shutdown(wait=False)
+
+    app = FastAPI(title='FundQA ChatService', lifespan=lifespan)
+
+    @app.post('/chat')
+    async def chat(body: ChatRequest, request: Request):
+        return await request.app.state.server.chat(body)
+
+    @app.post('/chat/stream')
+    async def chat_stream(body: ChatRequest, request: Request):
+        server: ChatServer = request.app.state.server
+        # 在返回响应头之前检查容量, 以便仍能返回 429
+        server.check_capacity()
+        return StreamingResponse(server.chat_stream(body, request), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.get('/healthz')
+    async def healthz():
+        return {'status': 'ok'}
+
+    @app.get('/metrics')
+    async def metrics():
+        return PlainTextResponse(get_registry().to_prometheus(), media_type='text/plain; version=0.0.4')
+
+    @app.get('/metrics.json')
+    async def metrics_json():
+        return JSONResponse(get_registry().to_json())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve ChatService over HTTP (JSON and server-sent events)')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
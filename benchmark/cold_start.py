@@ -0,0 +1,200 @@
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+import yaml
+from yaml.loader import SafeLoader
+
+DEFAULT_CONFIG_PATH = 'benchmark/benchmark_config.yaml'
+# 本项目的包按模块逐个统计, 第三方包按顶层包合并统计
+REPO_PACKAGES = ('api', 'benchmark', 'config_files', 'core', 'database', 'llm', 'pages', 'utils')
+RESULT_PREFIX = 'COLD_START_RESULT '
+
+# Runs in a fresh interpreter: import the service module, construct the service and optionally
+# touch every client, then report the timings and the loaded modules on one stdout line
+CHILD_SCRIPT = '''
+import sys, json, time
+preloaded = sorted(sys.modules)
+start = time.perf_counter()
+import core.chat_service
+imported = time.perf_counter()
+service = core.chat_service.ChatService(sys.argv[1])
+initialized = time.perf_counter()
+modules = sorted(sys.modules)
+first_use_ms = None
+if sys.argv[2] == '1':
+    service.warm_up()
+    first_use_ms = (time.perf_counter() - initialized) * 1000
+from utils.startup import init_timings
+print(%r + json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'init_ms': (initialized - imported) * 1000,
+    'first_use_ms': first_use_ms,
+    'components_ms': init_timings(),
+    'preloaded': preloaded,
+    'modules': modules,
+}))
+''' % RESULT_PREFIX
+
+# Runs in a fresh interpreter: import the page's UI framework, then the page module, and report the
+# modules the page itself added. A framework that is not installed is reported instead
+PAGE_SCRIPT = '''
+import sys, json, importlib
+try:
+    for framework in filter(None, sys.argv[2].split(',')):
+        importlib.import_module(framework)
+except ImportError as e:
+    print(%r + json.dumps({'missing': e.name}))
+    sys.exit(0)
+before = set(sys.modules)
+importlib.import_module(sys.argv[1])
+print(%r + json.dumps({'modules': sorted(set(sys.modules) - before)}))
+''' % (RESULT_PREFIX, RESULT_PREFIX)
+
+
+def run_child(service_config: str, first_use: bool, import_profile: bool) -> dict:
+    command = [sys.executable] + (['-X', 'importtime'] if import_profile else []) + ['-c', CHILD_SCRIPT, service_config, '1' if first_use else '0']
+    completed = subprocess.run(command, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not lines:
+        raise Exception(f"Cold start run failed ({completed.returncode}): {completed.stderr[-2000:]}")
+    result = json.loads(lines[-1][len(RESULT_PREFIX):])
+    if import_profile:
+        result['import_profile'] = parse_importtime(completed.stderr, set(result['preloaded']))
+    return result
+
+
+def run_page(page: str, frameworks: List[str]) -> dict:
+    """:return: {'modules': [modules loaded by the page module]} or {'missing': framework not installed}"""
+    completed = subprocess.run([sys.executable, '-c', PAGE_SCRIPT, page, ','.join(frameworks)], capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not lines:
+        raise Exception(f"Importing page {page} failed ({completed.returncode}): {completed.stderr[-2000:]}")
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+def parse_importtime(stderr: str, preloaded: set) -> Dict[str, float]:
+    """
+    :return: Exclusive import time in ms per repo module / third-party top-level package, for the
+             modules imported by the service (the interpreter's own startup imports are left out)
+    """
+    profile: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        if name in preloaded:
+            continue
+        package = name.split('.')[0]
+        key = name if package in REPO_PACKAGES else package
+        profile[key] = profile.get(key, 0.0) + int(self_us) / 1000
+    return dict(sorted(profile.items(), key=lambda item: -item[1]))
+
+
+def measure(service_config: str, runs: int, first_use: bool) -> dict:
+    results = [run_child(service_config, first_use, import_profile=False) for _ in range(runs)]
+    profiled = run_child(service_config, first_use, import_profile=True)
+
+    def median(key):
+        values = [result[key] for result in results if result[key] is not None]
+        return round(statistics.median(values), 2) if values else None
+
+    components = {}
+    for result in results:
+        for name, value in result['components_ms'].items():
+            components.setdefault(name, []).append(value)
+    report = {
+        'runs': runs,
+        'import_ms': median('import_ms'),
+        'init_ms': median('init_ms'),
+        'components_ms': {name: round(statistics.median(values), 2) for name, values in components.items()},
+        'import_profile_ms': {name: round(value, 2) for name, value in profiled['import_profile'].items()},
+        'modules': profiled['modules'],
+    }
+    report['total_ms'] = round(report['import_ms'] + report['init_ms'], 2)
+    if first_use:
+        report['first_use_ms'] = median('first_use_ms')
+    return report
+
+
+def check_pages(budget: dict) -> List[str]:
+    """
+    Import every page entry point in a fresh process and check that it does not load a forbidden module.
+    :return: Human readable violations; pages whose UI framework is not installed are reported and skipped
+    """
+    violations = []
+    forbidden = budget.get('forbidden_modules', [])
+    for page in budget.get('pages', []):
+        result = run_page(page, budget.get('page_frameworks', []))
+        if 'missing' in result:
+            print(f"  {page}: skipped, {result['missing']} is not installed")
+            continue
+        loaded = set(result['modules'])
+        found = [module for module in forbidden if module in loaded]
+        print(f"  {page}: {len(loaded)} modules" + (f", forbidden: {', '.join(found)}" if found else ''))
+        violations.extend(f"{module} is imported by the page {page}" for module in found)
+    return violations
+
+
+def check_budget(report: dict, budget: dict) -> List[str]:
+    """:return: Human readable budget violations"""
+    violations = []
+    for key in ('import_ms', 'init_ms', 'total_ms', 'first_use_ms'):
+        limit = budget.get(key)
+        if limit is not None and report.get(key) is not None and report[key] > limit:
+            violations.append(f"{key}: {report[key]} ms > budget {limit} ms")
+    loaded = set(report['modules'])
+    for module in budget.get('forbidden_modules', []):
+        if module in loaded:
+            violations.append(f"{module} is imported on the startup path")
+    return violations
+
+
+def print_report(report: dict, top: int):
+    print(f"cold start over {report['runs']} fresh processes (median):  import={report['import_ms']} ms  "
+          f"init={report['init_ms']} ms  total={report['total_ms']} ms"
+          + (f"  first_use={report['first_use_ms']} ms" if 'first_use_ms' in report else ''))
+    print(f"\n  {'component init':<36}{'ms':>10}")
+    for name, value in sorted(report['components_ms'].items(), key=lambda item: -item[1]):
+        print(f"  {name:<36}{value:>10}")
+    print(f"\n  {'module import (self time)':<36}{'ms':>10}")
+    for name, value in list(report['import_profile_ms'].items())[:top]:
+        print(f"  {name:<36}{value:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile import and init time of the chat service in fresh processes and check the cold-start budget')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help='Benchmark config yaml (cold_start section)')
+    parser.add_argument('--service-config', help='aws config used to construct the service (default: aws_config of the benchmark config)')
+    parser.add_argument('--runs', type=int, help='Fresh processes to measure (overrides the config)')
+    parser.add_argument('--first-use', action='store_true', help='Also create every client (warm_up) and report its time')
+    parser.add_argument('--top', type=int, default=15, help='Modules shown in the import profile')
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        config = yaml.load(file, Loader=SafeLoader)
+    budget = config.get('cold_start', {})
+    report = measure(args.service_config or config['aws_config'], args.runs or budget.get('runs', 5), args.first_use)
+
+    print_report(report, args.top)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    print(f"\n  page entry points")
+    violations = check_budget(report, budget) + check_pages(budget)
+    if violations:
+        print('\nCold-start budget exceeded:')
+        for violation in violations:
+            print(f'  {violation}')
+        sys.exit(1)
+    print('\nWithin the cold-start budget.')
+
+
+# 使用示例: python -m benchmark.cold_start --runs 5
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import yaml
+from yaml.loader import SafeLoader
+
+from benchmark.stubs import Latency, StubEmbeddings, StubBedrockLLMClient, SlowGraphDB, SlowVectorDao
+from core.chat_service import ChatService
+from utils.logging import getLogger
+
+logger = getLogger()
+
+DEFAULT_CONFIG_PATH = 'benchmark/benchmark_config.yaml'
+PERCENTILES = (50, 95, 99)
+
+
+def load_workload(path) -> List[dict]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def build_service(config: dict, workload: List[dict], work_dir: str) -> ChatService:
+    """
+    ChatService over local stand-in backends: LocalGraphDB and LocalVectorDao wrapped with injected
+    latency, and stub Bedrock / Titan clients. Nothing here needs AWS credentials or network access.
+    """
+    with open(config['aws_config']) as file:
+        aws_config = yaml.load(file, Loader=SafeLoader)
+    aws_config.setdefault('service_info', {}).update(graph_backend='local', vector_backend='local', warm_up=False)
+    aws_config.setdefault('local_vector_info', {})['data_dir'] = os.path.join(work_dir, 'vector_index')
+    aws_config.setdefault('embedding_cache_info', {})['enabled'] = False
+    config_path = os.path.join(work_dir, 'aws_config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(aws_config, file, allow_unicode=True)
+
+    latency, seed = config.get('latency', {}), config.get('seed', 0)
+    chat_service = ChatService(config_path)
+    chat_service.slow_request_seconds = None
+    chat_service.titan_embeddings = StubEmbeddings(Latency.from_config(latency.get('titan'), seed + 1))
+    chat_service.bedrock_llm_client = StubBedrockLLMClient(
+        Latency.from_config(latency.get('bedrock'), seed + 2),
+        Latency.from_config(latency.get('bedrock_token'), seed + 3),
+        cypher_by_question={record['question']: record['cypher'] for record in workload if record.get('cypher')},
+        answer_tokens=config.get('answer_tokens', 100)
+    )
+
+    documents = config.get('vector_documents', 1000)
+    chat_service.opensearch_dao.add_samples('text_neptune', [
+        ('profile1', f'sample question {i}', f'sample answer {i}', StubEmbeddings.embed(f'sample question {i}', 256))
+        for i in range(documents)
+    ])
+    chat_service.opensearch_dao = SlowVectorDao(chat_service.opensearch_dao, Latency.from_config(latency.get('opensearch'), seed + 4))
+    chat_service.neptune_db = SlowGraphDB(chat_service.neptune_db, Latency.from_config(latency.get('neptune'), seed + 5))
+    if chat_service.entity_router is not None:
+        chat_service.entity_router.graph_db = chat_service.neptune_db
+        chat_service.entity_router.reload()
+    if chat_service.ranking_router is not None:
+        chat_service.ranking_router.graph_db = chat_service.neptune_db
+        chat_service.ranking_router.reload()
+    return chat_service
+
+
+def clear_caches(chat_service: ChatService):
+    if chat_service.cypher_cache is not None:
+        chat_service.cypher_cache.clear()
+    if chat_service.neptune_db.result_cache is not None:
+        chat_service.neptune_db.result_cache.clear()
+
+
+def run_question(chat_service: ChatService, record: dict, stream: bool) -> dict:
+    trace = chat_service.new_trace(record.get('id'))
+    started = time.perf_counter()
+    first_token = None
+    if stream:
+        for _ in chat_service.execute_chat_stream(record['question'], trace):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+    else:
+        chat_service.execute_chat(record['question'], trace)
+    result = trace.to_json()
+    # 只统计失败的请求; 各阶段内已被处理的错误 (如向量检索失败后继续回答) 不计入
+    result['error'] = result['status'] != 'ok'
+    result['ttft_ms'] = first_token * 1000 if first_token is not None else None
+    return result
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    summary = {f'p{p}': round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+    summary['mean'] = round(float(np.mean(values)), 2)
+    return summary
+
+
+def run_level(chat_service: ChatService, workload: List[dict], concurrency: int, stream: bool) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda record: run_question(chat_service, record, stream), workload))
+    elapsed = time.perf_counter() - started
+
+    stages: Dict[str, List[float]] = {}
+    for result in results:
+        for span in result['spans']:
+            stages.setdefault(span['stage'], []).append(span['duration_ms'])
+    report = {
+        'requests': len(results),
+        'errors': sum(result['error'] for result in results),
+        'throughput_qps': round(len(results) / elapsed, 3),
+        'end_to_end_ms': summarize([result['duration_ms'] for result in results]),
+        'stages_ms': {stage: summarize(durations) for stage, durations in sorted(stages.items())}
+    }
+    if stream:
+        report['ttft_ms'] = summarize([result['ttft_ms'] for result in results if result['ttft_ms'] is not None])
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_ms: float) -> List[str]:
+    """:return: Human readable regressions of report against baseline"""
+    regressions = []
+
+    def check_latency(name, current, previous):
+        for key, value in current.items():
+            old = previous.get(key)
+            if old is not None and value > old * (1 + tolerance) and value - old > min_ms:
+                regressions.append(f'{name} {key}: {old} -> {value} ms (+{(value / old - 1) * 100 if old else float("inf"):.1f}%)')
+
+    for level, current in report['levels'].items():
+        previous = baseline.get('levels', {}).get(level)
+        if previous is None:
+            continue
+        prefix = f'concurrency={level}'
+        check_latency(f'{prefix} end_to_end', current['end_to_end_ms'], previous['end_to_end_ms'])
+        for stage, summary in current['stages_ms'].items():
+            check_latency(f'{prefix} {stage}', summary, previous['stages_ms'].get(stage, {}))
+        if current['throughput_qps'] < previous['throughput_qps'] * (1 - tolerance):
+            regressions.append(f"{prefix} throughput: {previous['throughput_qps']} -> {current['throughput_qps']} qps")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{prefix} errors: {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(report: dict):
+    for level, result in report['levels'].items():
+        e2e = result['end_to_end_ms']
+        print(f"\nconcurrency={level}  requests={result['requests']}  errors={result['errors']}  "
+              f"throughput={result['throughput_qps']} qps")
+        print(f"  {'stage':<20}{'p50':>10}{'p95':>10}{'p99':>10}")
+        print(f"  {'end_to_end':<20}{e2e['p50']:>10}{e2e['p95']:>10}{e2e['p99']:>10}")
+        if 'ttft_ms' in result:
+            ttft = result['ttft_ms']
+            print(f"  {'time_to_first_token':<20}{ttft['p50']:>10}{ttft['p95']:>10}{ttft['p99']:>10}")
+        for stage, summary in result['stages_ms'].items():
+            print(f"  {stage:<20}{summary['p50']:>10}{summary['p95']:>10}{summary['p99']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a question workload against stubbed backends and report latency percentiles')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help='Benchmark config yaml')
+    parser.add_argument('--workload', help='Workload JSONL with {"id", "question", "cypher"?} lines (overrides the config)')
+    parser.add_argument('--concurrency', type=int, nargs='+', help='Concurrency levels (overrides the config)')
+    parser.add_argument('--repeat', type=int, help='Replay the workload this many times per level')
+    parser.add_argument('--stream', action='store_true', help='Use execute_chat_stream and report time to first token')
+    parser.add_argument('--output', help='Write the report as JSON, e.g. to use it as a baseline later')
+    parser.add_argument('--baseline', help='Compare against a previous report and exit 1 on regressions')
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        config = yaml.load(file, Loader=SafeLoader)
+    workload = load_workload(args.workload or config['workload'])
+    levels = args.concurrency or config.get('concurrency', [1, 4, 16])
+    repeat = args.repeat or config.get('repeat', 1)
+    stream = args.stream or config.get('stream', False)
+
+    # 压测期间只保留警告以上的日志, 避免逐请求日志影响耗时
+    logger.setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as work_dir:
+        chat_service = build_service(config, workload, work_dir)
+        report = {'config': {key: config.get(key) for key in ('latency', 'answer_tokens', 'vector_documents')},
+                  'workload': len(workload), 'repeat': repeat, 'stream': stream, 'levels': {}}
+        for concurrency in levels:
+            if config.get('clear_caches', True):
+                clear_caches(chat_service)
+            report['levels'][str(concurrency)] = run_level(chat_service, workload * repeat, concurrency, stream)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, config.get('regression_tolerance', 0.1), config.get('regression_min_ms', 5))
+        if regressions:
+            print('\nRegressions against baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+
+if __name__ == "__main__":
+    main()
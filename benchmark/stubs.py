@@ -0,0 +1,154 @@
+import re
+import time
+import random
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CYPHER = "MATCH (m:FundManager)-[:manage]->(f:Fund) RETURN m, f LIMIT 30"
+
+_QUESTION = re.compile(r'Question: (.*?)\n\nAmazon Neptune flavor Query', re.S)
+
+
+class Latency:
+    """
+    Injected latency: a gaussian around mean_ms with jitter_ms standard deviation, never negative.
+    Every stub draws from its own seeded generator so runs are reproducible.
+    """
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], seed: int = 0) -> 'Latency':
+        config = config or {}
+        return cls(config.get('mean_ms', 0.0), config.get('jitter_ms', 0.0), seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            return max(0.0, self._random.gauss(self.mean_ms, self.jitter_ms)) / 1000
+
+    def sleep(self, scale: float = 1.0):
+        delay = self.sample() * scale
+        if delay > 0:
+            time.sleep(delay)
+
+
+class StubEmbeddings:
+    """TitanEmbeddings stand-in: a deterministic unit vector per text, computed locally."""
+
+    def __init__(self, latency: Latency, model_id: str = 'stub-embedding'):
+        self.latency = latency
+        self.model_id = model_id
+        self.cache = None
+
+    @staticmethod
+    def embed(text: str, dimensions: int) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'big')
+        vector = np.random.default_rng(seed).normal(size=dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def __call__(self, text: str, dimensions: int, normalize: bool = True) -> List[float]:
+        self.latency.sleep()
+        return self.embed(text, dimensions)
+
+    def embed_many(self, texts: List[str], dimensions: int, normalize: bool = True, max_workers: Optional[int] = None):
+        return [self(text, dimensions, normalize) for text in texts]
+
+
+class StubBedrockLLMClient:
+    """
+    BedrockLLMClient stand-in. Cypher generation prompts return the Cypher given for the question in the
+    workload (or DEFAULT_CYPHER); answer prompts return a fixed text whose length sets the streamed tokens.
+    Generation time is latency per call plus token_latency per output token.
+    """
+
+    def __init__(self, latency: Latency, token_latency: Latency, cypher_by_question: Dict[str, str] = None,
+                 answer_tokens: int = 200):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.cypher_by_question = cypher_by_question or {}
+        self.answer_tokens = answer_tokens
+
+    def get_bedrock_client(self):
+        return self
+
+    def _generation(self, user_prompt) -> List[str]:
+        match = _QUESTION.search(user_prompt)
+        if match:
+            cypher = self.cypher_by_question.get(match.group(1).strip(), DEFAULT_CYPHER)
+            return [cypher]
+        return ['token '] * self.answer_tokens
+
+    def invoke_llama_70b(self, model_id, system_prompt, user_prompt, max_tokens=2048, with_response_stream=False):
+        tokens = self._generation(user_prompt)
+        self.latency.sleep()
+        self.token_latency.sleep(scale=len(tokens))
+        return {'generation': ''.join(tokens)}
+
+    def stream_llama_70b(self, model_id, system_prompt, user_prompt, max_tokens=2048):
+        tokens = self._generation(user_prompt)
+        self.latency.sleep()
+        for token in tokens:
+            self.token_latency.sleep()
+            yield token
+
+
+class SlowGraphDB:
+    """Wraps a graph backend (e.g. LocalGraphDB) and adds the injected latency to every query."""
+
+    def __init__(self, graph_db, latency: Latency):
+        self.graph_db = graph_db
+        self.latency = latency
+
+    @property
+    def data_version(self):
+        return self.graph_db.data_version
+
+    @property
+    def result_cache(self):
+        return getattr(self.graph_db, 'result_cache', None)
+
+    def execute_opencypher_query(self, query, parameters: dict = None):
+        self.latency.sleep()
+        return self.graph_db.execute_opencypher_query(query, parameters)
+
+    def execute_opencypher_batch(self, queries, max_workers=None):
+        return [self.execute_opencypher_query(*((q, None) if isinstance(q, str) else q)) for q in queries]
+
+    def bump_data_version(self, data_version=None):
+        self.graph_db.bump_data_version(data_version)
+
+
+class SlowVectorDao:
+    """Wraps a vector backend (e.g. LocalVectorDao) and adds the injected latency to every search."""
+
+    def __init__(self, vector_dao, latency: Latency):
+        self.vector_dao = vector_dao
+        self.latency = latency
+
+    def ping(self):
+        return True
+
+    def check_index(self, index_name):
+        return self.vector_dao.check_index(index_name)
+
+    def search_sample_with_embedding(self, profile_name, top_k, index_name, query_embedding):
+        self.latency.sleep()
+        return self.vector_dao.search_sample_with_embedding(profile_name, top_k, index_name, query_embedding)
+
+    def hybrid_search(self, *args, **kwargs):
+        self.latency.sleep()
+        return self.vector_dao.hybrid_search(*args, **kwargs)
+
+    def get_samples(self, *args, **kwargs):
+        self.latency.sleep()
+        return self.vector_dao.get_samples(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.vector_dao, name)
@@ -63,4 +63,21 @@ graph_result: {graph_result}
 embedding_result: {embedding_result}
 Question: {user_input}
 
-Final Response: '''
\ No newline at end of file
+Final Response: '''
+
+CYPHER_REPAIR_PROMPT = '''The following **Amazon Neptune flavor Cypher query** was generated for the question below, but it failed validation against the graph schema.
+Rewrite the query so that it fixes every listed problem and still answers the question. Only use the labels, relationship directions and properties of the schema, match the relationship from left to right as declared, and put a limit of 30 results in the query.
+Only return the plain text query, no explanation, apologies, or other text.
+---
+Schema:
+{schema}
+---
+Previous query:
+{cypher}
+
+Problems:
+{errors}
+---
+Question: {user_input}
+
+Amazon Neptune flavor Query:'''
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Set
+
+from core.chat_service import ChatService, get_chat_service, DEFAULT_CONFIG_PATH
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+def iter_questions(path) -> Iterator[dict]:
+    """
+    Stream questions from a JSONL file; each line has a question and an optional id
+    (the line number is used when the id is missing).
+    """
+    with open(path, encoding='utf-8-sig') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.setdefault('id', str(line_number))
+            yield record
+
+
+def completed_ids(path) -> Set[str]:
+    """Ids already answered successfully in an output file; failed answers are retried on resume."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # 中断时最后一行可能只写了一半
+                continue
+            if result.get('status') == 'ok':
+                done.add(str(result['id']))
+    return done
+
+
+def drop_partial_line(path, chunk_size=65536):
+    """Truncate an output file after its last complete line, so appended answers start on a line of their own."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r+b') as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b'\n')
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            # 中断时写了一半的最后一行
+            logger.warning(f"Dropping {end - position} bytes of a partial line at the end of {path}")
+            file.truncate(position)
+
+
+class RateLimiter:
+    """Spaces out question starts so that at most rate_per_minute questions start per minute."""
+
+    def __init__(self, rate_per_minute: Optional[float]):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self.next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class BatchQA:
+    """
+    Answer a JSONL file of questions without the UI.
+
+    At most `concurrency` questions run through the pipeline at a time and question starts are paced by
+    questions_per_minute, which keeps the Bedrock calls (up to two LLM calls and one embedding per question)
+    under the account quota. Each answer is appended to the output as soon as it is ready, with its stage
+    timings and Cypher, so a rerun on the same output skips the ids that already succeeded.
+    """
+
+    def __init__(self, chat_service: ChatService, concurrency: int = 4, questions_per_minute: Optional[float] = None):
+        self.chat_service = chat_service
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(questions_per_minute)
+
+    def answer(self, record: dict) -> dict:
+        self.rate_limiter.acquire()
+        trace = self.chat_service.new_trace(str(record['id']))
+        answer = self.chat_service.execute_chat(record['question'], trace)
+        result = trace.to_json()
+        return {
+            'id': record['id'],
+            'question': record['question'],
+            'answer': answer,
+            'status': result['status'],
+            'cypher': result['attributes'].get('cypher'),
+            'route': result['attributes'].get('route'),
+            'duration_ms': result['duration_ms'],
+            'stages_ms': trace.stage_timings(),
+            'request_id': trace.request_id
+        }
+
+    def run(self, input_path, output_path):
+        """
+        :param input_path: JSONL file of {"id", "question"} lines
+        :param output_path: JSONL file the answers are appended to; existing successful ids are skipped
+        :return: (answered, failed, skipped) question counts of this run
+        """
+        done = completed_ids(output_path)
+        drop_partial_line(output_path)
+        counts = {'ok': 0, 'error': 0, 'skipped': 0}
+        write_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+        start_time = time.time()
+
+        with open(output_path, 'a', encoding='utf-8') as output:
+            def process(record):
+                try:
+                    result = self.answer(record)
+                except Exception as e:
+                    result = {'id': record['id'], 'question': record['question'], 'status': 'error', 'error': str(e)}
+                finally:
+                    in_flight.release()
+                with write_lock:
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    output.flush()
+                    counts['ok' if result['status'] == 'ok' else 'error'] += 1
+                    finished = counts['ok'] + counts['error']
+                if finished % 100 == 0:
+                    logger.info(f"Answered {finished} questions, {finished / max(time.time() - start_time, 1e-9):.2f} q/s")
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for record in iter_questions(input_path):
+                    if str(record['id']) in done:
+                        counts['skipped'] += 1
+                        continue
+                    # 限制已提交但未完成的问题数, 输入文件再大也不会整体读入内存
+                    in_flight.acquire()
+                    executor.submit(process, record)
+
+        logger.info(f"Batch finished: {counts['ok']} answered, {counts['error']} failed, {counts['skipped']} skipped, "
+                    f"{time.time() - start_time:.1f}s")
+        return counts['ok'], counts['error'], counts['skipped']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer a JSONL file of questions in batch')
+    parser.add_argument('--input', required=True, help='JSONL file with {"id", "question"} lines')
+    parser.add_argument('--output', required=True, help='JSONL file the answers are appended to')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--concurrency', type=int, default=4, help='Questions processed at the same time')
+    parser.add_argument('--questions-per-minute', type=float, default=None,
+                        help='Maximum question starts per minute, to stay under the Bedrock quota')
+    args = parser.parse_args()
+
+    batch = BatchQA(get_chat_service(args.config, warm_up=True), args.concurrency, args.questions_per_minute)
+    batch.run(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,197 @@
 import yaml
 import json
+import threading
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from yaml.loader import SafeLoader
 from database.neptune import NeptuneGraphDB
+from database.local_graph import LocalGraphDB
+from database.result_cache import QueryResultCache
 from database.opensearch import OpenSearchDao
+from database.quantization import VectorQuantizer
+from database.profile_materializer import profile_doc_ids
+from database.local_vector import LocalVectorDao
 from llm.embedding import TitanEmbeddings
+from llm.embedding_cache import EmbeddingCache
 from llm.llm import BedrockLLMClient
+from llm.bedrock_gateway import BedrockGateway
+from core.cypher_cache import CypherCache
+from core.entity_router import EntityRouter
+from core.ranking_router import RankingRouter, format_ranking
+from core.result_shaper import ResultShaper
+from core.cypher_validator import CypherValidator, record_validation
+from utils.startup import timed
+from utils.tracing import RequestTrace, get_registry, span, count, current_trace, use_trace, submit_with_context
 from config_files.llm_prompt import *
 
+DEFAULT_CONFIG_PATH = 'config_files/aws_config.yaml'
+
+_chat_service = None
+_chat_service_lock = threading.Lock()
+
+
 class ChatService:
-    def __init__(self):
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH):
+        # Clients connect on first use; construction only reads the config and wires the components,
+        # timed per component in utils.startup (see benchmark.cold_start)
         try:
-            self.aws_config = self.load_aws_config('config_files/aws_config.yaml')
-            self.neptune_db = NeptuneGraphDB(self.aws_config['neptune_info']['neptune_endpoint'])
-            self.opensearch_dao = OpenSearchDao(
-                host=self.aws_config['opensearch_info']["host"],
-                port=self.aws_config['opensearch_info']["port"],
-                opensearch_user=self.aws_config['opensearch_info']["username"],
-                opensearch_password=self.aws_config['opensearch_info']["password"]
-            )
-            self.titan_embeddings = TitanEmbeddings()
-            self.bedrock_llm_client = BedrockLLMClient()
+            self.aws_config = self.load_aws_config(config_path)
+            service_info = self.aws_config.get('service_info', {})
+            max_pool_connections = service_info.get('max_pool_connections', 10)
+
+            with timed('graph_db'):
+                self.neptune_db = self.create_graph_db(self.aws_config, max_pool_connections)
+            with timed('vector_dao'):
+                self.opensearch_dao = self.create_vector_dao(self.aws_config, max_pool_connections)
+            # One gateway shared by the LLM and embedding clients: rate limits, backoff and request coalescing
+            gateway_info = self.aws_config.get('bedrock_gateway_info', {})
+            self.bedrock_gateway = BedrockGateway.from_config(gateway_info) if gateway_info.get('enabled', False) else None
+            embedding_cache_info = self.aws_config.get('embedding_cache_info', {})
+            with timed('embeddings'):
+                self.titan_embeddings = TitanEmbeddings(
+                    max_pool_connections=max_pool_connections,
+                    cache=EmbeddingCache(embedding_cache_info.get('cache_dir', '.cache/embeddings'))
+                    if embedding_cache_info.get('enabled', False) else None,
+                    gateway=self.bedrock_gateway
+                )
+            self.bedrock_llm_client = BedrockLLMClient(max_pool_connections=max_pool_connections, gateway=self.bedrock_gateway)
+
+            cache_info = self.aws_config.get('cypher_cache_info', {})
+            self.cypher_cache = CypherCache(
+                max_entries=cache_info.get('max_entries', 1000),
+                ttl_seconds=cache_info.get('ttl_seconds', 3600),
+                similarity_threshold=cache_info.get('similarity_threshold', 0.95)
+            ) if cache_info.get('enabled', True) else None
+
+            router_info = self.aws_config.get('entity_router_info', {})
+            self.entity_router = EntityRouter(
+                self.neptune_db,
+                min_name_length=router_info.get('min_name_length', 2),
+                page_size=router_info.get('page_size', 5000),
+                reload_seconds=router_info.get('reload_seconds')
+            ) if router_info.get('enabled', False) else None
+
+            ranking_info = self.aws_config.get('fund_metrics_info', {})
+            self.ranking_router = RankingRouter(
+                self.neptune_db,
+                default_limit=ranking_info.get('default_limit', 10),
+                max_limit=ranking_info.get('max_limit', 30),
+                page_size=ranking_info.get('page_size', 5000),
+                reload_seconds=ranking_info.get('reload_seconds')
+            ) if ranking_info.get('enabled', False) else None
+
+            shaping_info = self.aws_config.get('result_shaping_info', {})
+            self.result_shaper = ResultShaper(
+                token_budget=shaping_info.get('token_budget', 1500),
+                max_rows=shaping_info.get('max_rows', 30)
+            ) if shaping_info.get('enabled', True) else None
+
+            validation_info = self.aws_config.get('cypher_validation_info', {})
+            self.cypher_validator = CypherValidator(
+                max_limit=validation_info.get('max_limit', 30)
+            ) if validation_info.get('enabled', True) else None
+            self.max_cypher_repairs = validation_info.get('max_repairs', 1)
+
+            self.vector_search_info = self.aws_config.get('vector_search_info', {})
+            profile_info = self.aws_config.get('entity_profile_info', {})
+            self.entity_profile_info = profile_info if profile_info.get('enabled', False) else None
+
+            tracing_info = self.aws_config.get('tracing_info', {})
+            self.slow_request_seconds = tracing_info.get('slow_request_ms', 5000) / 1000
+            self.register_metrics()
         except Exception as e:
             print(f"Error initializing ChatService: {e}")
             raise
 
+    @staticmethod
+    def create_graph_db(aws_config: dict, max_pool_connections: int):
+        # service_info.graph_backend selects the graph backend: neptune (default) or local (in-process store)
+        if aws_config.get('service_info', {}).get('graph_backend', 'neptune') == 'local':
+            local_graph_info = aws_config.get('local_graph_info', {})
+            return LocalGraphDB(local_graph_info.get('vertex_files', []), local_graph_info.get('edge_files', []))
+
+        neptune_info = aws_config['neptune_info']
+        result_cache_info = neptune_info.get('result_cache', {})
+        return NeptuneGraphDB(
+            neptune_info['neptune_endpoint'],
+            result_cache=QueryResultCache(
+                max_entries=result_cache_info.get('max_entries', 512),
+                max_bytes=result_cache_info.get('max_bytes', 64 * 1024 * 1024),
+                ttl_seconds=result_cache_info.get('ttl_seconds', 600)
+            ) if result_cache_info.get('enabled', False) else None,
+            pool_maxsize=max_pool_connections,
+            connect_timeout=neptune_info.get('connect_timeout', 3.05),
+            read_timeout=neptune_info.get('read_timeout', 30)
+        )
+
+    @staticmethod
+    def create_vector_dao(aws_config: dict, max_pool_connections: int):
+        # service_info.vector_backend selects the vector backend: opensearch (default) or local (NumPy index)
+        if aws_config.get('service_info', {}).get('vector_backend', 'opensearch') == 'local':
+            local_vector_info = aws_config.get('local_vector_info', {})
+            return LocalVectorDao(
+                local_vector_info.get('data_dir', '.cache/vector_index'),
+                mode=local_vector_info.get('mode', 'exact'),
+                nlist=local_vector_info.get('nlist', 64),
+                nprobe=local_vector_info.get('nprobe', 8)
+            )
+
+        opensearch_info = aws_config['opensearch_info']
+        quantization_info = opensearch_info.get('vector_quantization', {})
+        return OpenSearchDao(
+            host=opensearch_info["host"],
+            port=opensearch_info["port"],
+            opensearch_user=opensearch_info["username"],
+            opensearch_password=opensearch_info["password"],
+            pool_maxsize=max_pool_connections,
+            quantizer=VectorQuantizer.from_config(quantization_info),
+            oversample=quantization_info.get('oversample', 4)
+        )
+
+    def warm_up(self):
+        """
+        Open the Bedrock and OpenSearch connections and build the entity dictionary and the fund metrics
+        store ahead of the first question so that client creation, TLS handshakes and the graph scans are
+        not paid by the first user.
+        Failures are reported but never raised: the service still works cold.
+        """
+        try:
+            self.bedrock_llm_client.get_bedrock_client()
+            self.opensearch_dao.ping()
+            # 旧映射的索引仍能返回结果, 但检索效果会大幅下降, 启动时即记录警告
+            self.opensearch_dao.check_index(self.vector_search_info.get('index_name', 'text_neptune'))
+            self.titan_embeddings.bedrock_boto3
+        except Exception as e:
+            print(f"Error warming up ChatService: {e}")
+        # Build the entity dictionary here instead of inside the first question
+        if self.entity_router is not None:
+            try:
+                with timed('entity_router'):
+                    self.entity_router.ensure_built()
+            except Exception as e:
+                print(f"Error building the entity dictionary: {e}")
+        if self.ranking_router is not None:
+            try:
+                with timed('ranking_router'):
+                    self.ranking_router.ensure_built()
+            except Exception as e:
+                print(f"Error building the fund metrics store: {e}")
+
+    def register_metrics(self):
+        # Cache and router counters are read from their stats() at export time
+        metrics = get_registry()
+        if self.cypher_cache is not None:
+            metrics.register_collector('cypher_cache', self.cypher_cache.stats)
+        if getattr(self.neptune_db, 'result_cache', None) is not None:
+            metrics.register_collector('neptune_result_cache', self.neptune_db.result_cache.stats)
+        if self.entity_router is not None:
+            metrics.register_collector('entity_router', self.entity_router.stats)
+        if self.ranking_router is not None:
+            metrics.register_collector('ranking_router', self.ranking_router.stats)
+
+    def new_trace(self, request_id: str = None) -> RequestTrace:
+        return RequestTrace(request_id, slow_threshold_seconds=self.slow_request_seconds)
+
     @staticmethod
     def load_aws_config(file_path: str) -> dict:
         try:
@@ -43,38 +211,272 @@ class ChatService:
             print(f"Error generating LLM response: {e}")
             raise
 
-    def execute_chat(self, user_input: str) -> str:
-        try:
-            model_id = self.aws_config['bedrock_info']["llama_model_id"]
+    def generate_cypher(self, model_id: str, user_input: str, embedding_future=None) -> str:
+        """
+        Return the Cypher query for the question, from the cache when possible.
+        The exact-match lookup runs immediately; the similarity lookup waits for the
+        question embedding computed by the vector branch.
+        """
+        if self.cypher_cache is not None:
+            cypher_query = self.cypher_cache.get_exact(user_input)
+            if cypher_query is not None:
+                count('cypher_source_total', 'Source of the Cypher query', source='exact_cache')
+                return cypher_query
 
-            # Generate Cypher query using LLM
+        input_embedding = embedding_future.result() if embedding_future is not None else None
+        if self.cypher_cache is not None:
+            cypher_query = self.cypher_cache.get_similar(user_input, input_embedding)
+            if cypher_query is not None:
+                count('cypher_source_total', 'Source of the Cypher query', source='semantic_cache')
+                return cypher_query
+
+        with span('cypher_generation'):
             cypher_query = self.generate_llm_response(
                 model_id=model_id,
                 system_prompt=SYSTEM_PROMPT,
                 user_prompt=CYPHER_GENERATION_PROMPT.format_map({'user_input':user_input})
             )
-            graph_result = self.neptune_db.execute_opencypher_query(cypher_query)
-            formatted_graph_result = json.dumps(graph_result, indent=2)
+        count('cypher_source_total', 'Source of the Cypher query', source='llm')
+        cypher_query = self.validate_cypher(model_id, user_input, cypher_query)
+        # Only queries that passed validation are cached
+        if self.cypher_cache is not None and cypher_query is not None:
+            self.cypher_cache.put(user_input, cypher_query, input_embedding)
+        return cypher_query
 
-            # Generate embedding and search using OpenSearch
-            input_embedding = self.titan_embeddings(user_input, dimensions=256)
-            embedding_result = self.opensearch_dao.search_sample_with_embedding('profile1', 1, 'text_neptune', input_embedding)[0]['_source']['answer']
+    def validate_cypher(self, model_id: str, user_input: str, cypher_query: str):
+        """
+        Check generated Cypher against the graph schema before it reaches Neptune. Mechanical problems
+        are fixed in place; other problems are sent back to the LLM with the error list, up to
+        max_cypher_repairs times.
+        :return: The query to run, or None when it is still invalid and must not be run
+        """
+        if self.cypher_validator is None:
+            return cypher_query
+        result = self.cypher_validator.validate(cypher_query)
+        repairs = 0
+        while not result.valid and repairs < self.max_cypher_repairs:
+            repairs += 1
+            with span('cypher_repair'):
+                cypher_query = self.generate_llm_response(
+                    model_id=model_id,
+                    system_prompt=SYSTEM_PROMPT,
+                    user_prompt=CYPHER_REPAIR_PROMPT.format_map({
+                        'schema': self.cypher_validator.describe_schema(),
+                        'cypher': result.query,
+                        'errors': '\n'.join(f'- {error}' for error in result.errors),
+                        'user_input': user_input
+                    })
+                )
+            result = self.cypher_validator.validate(cypher_query)
 
-            # Generate final response using LLM
-            response = self.generate_llm_response(
-                model_id=model_id,
-                system_prompt=SYSTEM_PROMPT,
-                user_prompt=RESULT_GENERSTION_PROMPT.format_map({'graph_result': formatted_graph_result, 'embedding_result': embedding_result, 'user_input':user_input})
+        if not result.valid:
+            record_validation('blocked')
+            print(f"Blocked generated Cypher {result.query!r}: {result.errors}")
+            trace = current_trace()
+            if trace is not None:
+                trace.set('cypher_blocked', result.errors)
+            return None
+        record_validation('repaired' if repairs else 'fixed' if result.fixes else 'valid')
+        return result.query
+
+    def route_question(self, user_input: str):
+        # Questions naming known entities use a precompiled template and skip the LLM
+        with span('entity_routing'):
+            return self.entity_router.route(user_input) if self.entity_router is not None else None
+
+    def profile_retrieval(self, route):
+        """
+        Pre-formatted profile documents of the entities named in the question, written at ingest time by
+        database.profile_materializer.
+        :return: The profiles joined as text, or None when profiles are disabled or one is missing
+        """
+        if self.entity_profile_info is None or route is None:
+            return None
+        intent, _, parameters = route
+        doc_ids = profile_doc_ids(intent, parameters)
+        if not doc_ids:
+            return None
+        with span('profile_lookup') as trace:
+            try:
+                hits = self.opensearch_dao.get_samples(self.entity_profile_info.get('index_name', 'text_neptune'), doc_ids)
+            except Exception as e:
+                print(f"Error fetching entity profiles: {e}")
+                return None
+            found = len(hits) == len(doc_ids)
+            count('entity_profile_lookups_total', 'Lookups of materialized entity profiles', result='hit' if found else 'miss')
+            if not found:
+                return None
+            trace.set('route', f'{intent}:profile')
+        return '\n\n'.join(hit['_source']['answer'] for hit in hits)
+
+    def ranking_retrieval(self, user_input: str):
+        """
+        Ranking and filter questions over fund metrics, answered from the in-memory columnar store.
+        :return: The selected funds as a table, or None when the question is not a ranking question
+        """
+        if self.ranking_router is None:
+            return None
+        with span('metric_query') as trace:
+            query = self.ranking_router.route(user_input)
+            if query is None:
+                return None
+            rows = self.ranking_router.answer(query)
+            trace.set('route', 'ranking')
+            trace.set('metric_query', query.describe())
+            count('ranking_queries_total', 'Questions answered from the fund metrics store')
+        return format_ranking(query, rows)
+
+    def graph_retrieval(self, model_id: str, user_input: str, embedding_future=None, route=None):
+        if route is not None:
+            intent, cypher_query, parameters = route
+            count('cypher_source_total', 'Source of the Cypher query', source='entity_router')
+        else:
+            # Generate Cypher query (cached or by LLM), then run it against Neptune
+            intent, parameters = None, None
+            cypher_query = self.generate_cypher(model_id, user_input, embedding_future)
+            if cypher_query is None:
+                # Blocked by validation: answer from the vector results only
+                return {'results': []}
+
+        with span('graph_query') as trace:
+            trace.set('cypher', cypher_query)
+            if intent is not None:
+                trace.set('route', intent)
+            return self.neptune_db.execute_opencypher_query(cypher_query, parameters)
+
+    def embed_question(self, user_input: str):
+        with span('embedding'):
+            return self.titan_embeddings(user_input, dimensions=256)
+
+    def vector_retrieval(self, user_input: str, embedding_future) -> str:
+        # Hybrid search: BM25 on the question text and kNN on its embedding in one round trip, fused by rank
+        input_embedding = embedding_future.result()
+        info = self.vector_search_info
+        with span('vector_search'):
+            hits = self.opensearch_dao.hybrid_search(
+                info.get('profile', 'profile1'),
+                info.get('index_name', 'text_neptune'),
+                user_input,
+                input_embedding,
+                top_n=info.get('top_n', 3),
+                k=info.get('k', 20),
+                rank_constant=info.get('rank_constant', 60)
             )
+        answers = list(dict.fromkeys(hit['_source']['answer'] for hit in hits))
+        return '\n\n'.join(answers)
+
+    def retrieve(self, model_id: str, user_input: str, route=None):
+        """
+        Run the graph branch (Cypher generation + Neptune) and the vector branch
+        (Titan embedding + OpenSearch hybrid search) concurrently and wait for both.
+        The embedding is shared with the graph branch for the Cypher cache lookup.
+        :return: (graph_result, embedding_result)
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            embedding_future = submit_with_context(executor, self.embed_question, user_input)
+            graph_future = submit_with_context(executor, self.graph_retrieval, model_id, user_input, embedding_future, route)
+            vector_future = submit_with_context(executor, self.vector_retrieval, user_input, embedding_future)
+            return graph_future.result(), vector_future.result()
+
+    def build_result_prompt(self, model_id: str, user_input: str) -> str:
+        route = self.route_question(user_input)
+        profiles = self.profile_retrieval(route)
+        if profiles is not None:
+            # One document lookup replaces the graph query and the vector search
+            return RESULT_GENERSTION_PROMPT.format_map({'graph_result': profiles, 'embedding_result': '', 'user_input': user_input})
+        # Questions naming an entity stay on the graph path, the metrics store only ranks across all funds
+        ranking = self.ranking_retrieval(user_input) if route is None else None
+        if ranking is not None:
+            return RESULT_GENERSTION_PROMPT.format_map({'graph_result': ranking, 'embedding_result': '', 'user_input': user_input})
+
+        graph_result, embedding_result = self.retrieve(model_id, user_input, route)
+        with span('result_shaping'):
+            if self.result_shaper is not None:
+                formatted_graph_result = self.result_shaper.shape(graph_result, user_input)
+            else:
+                formatted_graph_result = json.dumps(graph_result, indent=2)
+        return RESULT_GENERSTION_PROMPT.format_map({'graph_result': formatted_graph_result, 'embedding_result': embedding_result, 'user_input':user_input})
+
+    def execute_chat(self, user_input: str, trace: RequestTrace = None) -> str:
+        """
+        :param trace: Trace receiving the stage timings and the Cypher query (default: a new one)
+        """
+        trace = trace or self.new_trace()
+        status = 'ok'
+        try:
+            model_id = self.aws_config['bedrock_info']["llama_model_id"]
+
+            with use_trace(trace):
+                user_prompt = self.build_result_prompt(model_id, user_input)
+
+                # Generate final response using LLM
+                with span('final_generation'):
+                    response = self.generate_llm_response(
+                        model_id=model_id,
+                        system_prompt=SYSTEM_PROMPT,
+                        user_prompt=user_prompt
+                    )
 
             return response
         except Exception as e:
-            print(f"Error executing chat: {e}")
+            status = 'error'
+            print(f"Error executing chat [{trace.request_id}]: {e}")
             return "An error occurred while processing your request."
+        finally:
+            trace.finish(status)
+
+    def execute_chat_stream(self, user_input: str, trace: RequestTrace = None) -> Iterator[str]:
+        """
+        Same pipeline as execute_chat, but the final generation is streamed:
+        yields text deltas as soon as Bedrock produces them.
+        """
+        trace = trace or self.new_trace()
+        status = 'ok'
+        try:
+            model_id = self.aws_config['bedrock_info']["llama_model_id"]
+            with use_trace(trace):
+                user_prompt = self.build_result_prompt(model_id, user_input)
+
+            # The trace is not made current here: the caller's code runs between the yields
+            with trace.span('final_generation'):
+                yield from self.bedrock_llm_client.stream_llama_70b(
+                    model_id=model_id,
+                    system_prompt=SYSTEM_PROMPT,
+                    user_prompt=user_prompt
+                )
+        except Exception as e:
+            status = 'error'
+            print(f"Error executing chat [{trace.request_id}]: {e}")
+            yield "An error occurred while processing your request."
+        finally:
+            trace.finish(status)
+
+def get_chat_service(config_path: str = DEFAULT_CONFIG_PATH, warm_up: bool = None) -> ChatService:
+    """
+    Return the process-wide ChatService, creating it on first use.
+    The service and its clients are thread-safe, so one instance is shared by every session.
+    :param config_path: Path of the aws config yaml used on first creation
+    :param warm_up: Warm up the clients after creation (default: service_info.warm_up in the config)
+    """
+    global _chat_service
+    if _chat_service is not None:
+        return _chat_service
+
+    with _chat_service_lock:
+        if _chat_service is None:
+            with timed('chat_service'):
+                chat_service = ChatService(config_path)
+            if warm_up is None:
+                warm_up = chat_service.aws_config.get('service_info', {}).get('warm_up', False)
+            if warm_up:
+                with timed('warm_up'):
+                    chat_service.warm_up()
+            _chat_service = chat_service
+    return _chat_service
 
 # Example usage
 if __name__ == "__main__":
-    chat_service = ChatService()
+    chat_service = get_chat_service()
     user_input = "介绍一下张坤和他管理的基金都有哪些?"
     response = chat_service.execute_chat(user_input)
     print("Chat response:", response)
@@ -0,0 +1,156 @@
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+# Cypher 中的字符串字面量 (实体名、属性值)
+_STRING_LITERAL = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+# Cypher 中的数值字面量; LIMIT/SKIP 的行数不算 (校验时可能被补上或改写)
+_NUMBER_LITERAL = re.compile(r'\b(LIMIT|SKIP)\s+\d+|(?<![\w.$])(\d+(?:\.\d+)?)(?![\w.])', re.IGNORECASE)
+# 问题中的数字; 中文数字按原样比较 ("十" 与 "10" 视为不同, 只会少一次复用)
+_QUESTION_NUMBER = re.compile(r'\d+(?:\.\d+)?|[零一二两三四五六七八九十百千]+')
+
+
+class CypherCache:
+    """
+    Cache of LLM generated Cypher queries keyed by the user question.
+
+    A lookup first tries an exact match on the normalized question, then falls back to
+    the most similar cached question by cosine similarity of the Titan embeddings. A similar question
+    only reuses a query whose string and numeric literals (entity names, property values, thresholds)
+    all appear in the new question, and only when both questions contain the same numbers, so
+    "张坤管理的基金" never answers "刘彦春管理的基金" and "风险等级4" never answers "风险等级5".
+    Entries are evicted least-recently-used beyond max_entries and expire after ttl_seconds.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # normalized question -> (cypher, embedding, created_at, string literals, numeric literals, question numbers)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Normalize a question for exact matching: NFKC fold full-width characters,
+        lowercase, and drop whitespace and punctuation.
+        """
+        text = unicodedata.normalize('NFKC', question).lower()
+        return ''.join(ch for ch in text if unicodedata.category(ch)[0] not in ('P', 'Z', 'C'))
+
+    @staticmethod
+    def _to_unit_vector(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    @classmethod
+    def literals(cls, cypher: str) -> List[str]:
+        """:return: The normalized string literals of a Cypher query"""
+        values = (single or double for single, double in _STRING_LITERAL.findall(cypher))
+        return [literal for literal in (cls.normalize(value) for value in values) if literal]
+
+    @staticmethod
+    def _number(text: str) -> str:
+        return f'{float(text):g}' if text[0].isdigit() else text
+
+    @classmethod
+    def numeric_literals(cls, cypher: str) -> frozenset:
+        """:return: The numbers compared against in a Cypher query, outside string literals and LIMIT/SKIP"""
+        code = _STRING_LITERAL.sub("''", cypher)
+        return frozenset(cls._number(match.group(2)) for match in _NUMBER_LITERAL.finditer(code) if match.group(2))
+
+    @classmethod
+    def question_numbers(cls, question: str) -> frozenset:
+        return frozenset(cls._number(number) for number in _QUESTION_NUMBER.findall(cls.normalize(question)))
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if self._is_expired(entry[2], now)]
+        for key in expired:
+            del self._entries[key]
+
+    def get_exact(self, question: str) -> Optional[str]:
+        """
+        Return the cached Cypher for an exact (normalized) question match, or None.
+        Does not count a miss, so it can be followed by get_similar.
+        """
+        key = self.normalize(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry[2], now):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, question: str, embedding: Optional[List[float]]) -> Optional[str]:
+        """
+        Return the Cypher of the most similar cached question if its similarity reaches
+        the threshold, otherwise count a miss and return None.
+        :param question: The new question; cached queries naming values it does not contain are skipped
+        """
+        query_vector = self._to_unit_vector(embedding)
+        text, numbers = self.normalize(question), self.question_numbers(question)
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            # 只复用实体、属性值和数值条件都出现在新问题中的查询; 只差一个数字的问题向量几乎相同
+            candidates = [(key, entry) for key, entry in self._entries.items()
+                          if entry[1] is not None and entry[1].shape == getattr(query_vector, 'shape', None)
+                          and all(literal in text for literal in entry[3]) and entry[4] <= numbers and entry[5] == numbers]
+            if query_vector is None or not candidates:
+                self.misses += 1
+                return None
+
+            similarities = np.stack([entry[1] for _, entry in candidates]) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return entry[0]
+
+    def put(self, question: str, cypher: str, embedding: Optional[List[float]] = None):
+        key = self.normalize(question)
+        with self._lock:
+            self._entries[key] = (cypher, self._to_unit_vector(embedding), time.time(), self.literals(cypher),
+                                  self.numeric_literals(cypher), self.question_numbers(question))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,253 @@
+import re
+from typing import Dict, List, Optional
+
+from database.cypher_parser import CypherSyntaxError, children, parse_query
+from database.result_cache import is_read_only
+from utils.tracing import count
+
+# Declared graph schema: vertex labels with their properties, and relationship types with their direction
+GRAPH_SCHEMA = {
+    'labels': {
+        'FundManager': ['background', 'chinesename', 'company', 'etl_timestamp', 'experiencetime', 'keywords', 'personalcode'],
+        'Fund': ['acc_fans', 'annual_return_base', 'briefintro', 'establish_date', 'etl_timestamp', 'fifth_classification',
+                 'fourth_classification', 'fproperty', 'fund_2_type', 'fund_code', 'fund_full_name', 'fund_name', 'fund_type',
+                 'hot_value', 'is_30d_buy_back_0_rate', 'is_taurus_fund', 'keywords', 'max_draw_down_base', 'nav_grw_base',
+                 'nav_grw_p1y', 'nav_grw_p2y', 'nav_grw_p3y', 'nav_grw_r1m', 'nav_grw_r1w', 'nav_grw_r1y', 'nav_grw_r3m',
+                 'nav_grw_r3y', 'nav_grw_r5y', 'nav_grw_td', 'nav_grw_ty', 'primary_classification', 'rating_star',
+                 'risk_eva_level', 'secondary_classification', 'symbol', 'symbol_type', 'third_classification', 'totshare',
+                 'trustee_name', 'unit_nav'],
+    },
+    'relationships': {
+        'manage': {'from': 'FundManager', 'to': 'Fund', 'properties': ['etl_timestamp', 'manage_time_from', 'manage_time_to']},
+    },
+}
+
+_CODE_FENCE = re.compile(r'^\s*```[a-zA-Z]*\s*|\s*```\s*$')
+_LIMIT = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+_UNION = re.compile(r'\s+(UNION(?:\s+ALL)?)\s+', re.IGNORECASE)
+# 注释 (字符串与反引号名称中的 // 和 /* 不算)
+_COMMENT = re.compile(r'(\'(?:[^\'\\]|\\.)*\'|"(?:[^"\\]|\\.)*"|`[^`]*`)|//[^\n]*|/\*.*?(?:\*/|$)', re.DOTALL)
+
+
+def strip_comments(query: str) -> str:
+    return _COMMENT.sub(lambda match: match.group(1) or ' ', query)
+
+
+class ValidationResult:
+    def __init__(self, query: str, errors: List[str], fixes: List[str]):
+        self.query = query
+        self.errors = errors
+        self.fixes = fixes
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+class CypherValidator:
+    """
+    Preflight checks for LLM-generated Cypher, run before the query reaches Neptune.
+
+    Problems that can be fixed mechanically are fixed (code fences, comments, a missing or too large LIMIT).
+    Problems that need the model to rewrite the query are reported as errors: write clauses, syntax errors,
+    unknown labels, relationship types or properties, a relationship used against its declared direction,
+    unbounded patterns (variable-length relationships, a path without any label or id constraint, or
+    disconnected patterns that form a cartesian product) and clauses the checks cannot see through (WITH,
+    OPTIONAL MATCH, ...). The parts of a UNION are checked, and limited, one by one.
+    """
+
+    def __init__(self, schema: dict = None, max_limit: int = 30):
+        self.schema = schema or GRAPH_SCHEMA
+        self.max_limit = max_limit
+        self.labels: Dict[str, set] = {label: set(props) for label, props in self.schema['labels'].items()}
+        self.relationships = self.schema['relationships']
+
+    def describe_schema(self) -> str:
+        lines = [f"Vertex {label}: {', '.join(sorted(props))}" for label, props in self.labels.items()]
+        lines += [f"Rel: ({rel['from']})-[:{rel_type}]->({rel['to']}) properties: {', '.join(rel.get('properties', []))}"
+                  for rel_type, rel in self.relationships.items()]
+        return '\n'.join(lines)
+
+    def enforce_limit(self, query: str, limit) -> (str, Optional[str]):
+        if limit is None:
+            return query.rstrip().rstrip(';').rstrip() + f' LIMIT {self.max_limit}', f'LIMIT {self.max_limit} added'
+        if limit[0] != 'lit' or not isinstance(limit[1], int) or limit[1] <= self.max_limit:
+            return query, None
+        # LIMIT 是查询的最后一个子句, 改写最后一次出现的位置
+        match = list(_LIMIT.finditer(query))[-1]
+        return query[:match.start()] + f'LIMIT {self.max_limit}' + query[match.end():], f'LIMIT lowered to {self.max_limit}'
+
+    def validate(self, query: str) -> ValidationResult:
+        fixes = []
+        stripped = _CODE_FENCE.sub('', query).strip()
+        if stripped != query.strip():
+            fixes.append('code fence removed')
+        # 去掉注释, 否则追加的 LIMIT 可能落在行尾注释里
+        uncommented = strip_comments(stripped).strip()
+        if uncommented != stripped:
+            fixes.append('comments removed')
+        query = uncommented
+
+        if not is_read_only(query):
+            return ValidationResult(query, ['only read-only queries are allowed'], fixes)
+        # UNION 的每一部分单独校验并限制行数
+        parts = _UNION.split(query)
+        errors, checked = [], []
+        for i, part in enumerate(parts):
+            if i % 2:
+                checked.append(f' {part.upper()} ')
+                continue
+            part, part_errors, part_fixes = self._validate_part(part)
+            checked.append(part)
+            errors.extend(part_errors)
+            fixes.extend(part_fixes)
+        return ValidationResult(''.join(checked), list(dict.fromkeys(errors)), fixes)
+
+    def _validate_part(self, query: str):
+        try:
+            parsed = parse_query(query)
+        except CypherSyntaxError as e:
+            message = str(e)
+            if 'variable length' in message:
+                return query, ['variable-length relationships are unbounded, use a single hop'], []
+            if 'not supported' in message or 'unsupported' in message:
+                # 无法解析的子句中的模式、方向和 LIMIT 都无法校验, 交给修复提示改写
+                return query, [f'{message.split(" at position")[0]}: rewrite it as a single MATCH ... WHERE ... RETURN query'], []
+            return query, [f'syntax error: {message}'], []
+
+        errors = self._check_patterns(parsed) + self._check_properties(parsed)
+        if parsed.limit is not None and parsed.limit[0] not in ('lit', 'param'):
+            errors.append('LIMIT must be a number')
+        if errors:
+            return query, errors, []
+        query, fix = self.enforce_limit(query, parsed.limit)
+        return query, [], [fix] if fix else []
+
+    def _variable_labels(self, parsed):
+        node_labels, rel_types = {}, {}
+        for path in parsed.paths:
+            for node in path.nodes:
+                node_labels.setdefault(node.var, set()).update(node.labels)
+            for rel in path.rels:
+                rel_types.setdefault(rel.var, set()).update(rel.types)
+        return node_labels, rel_types
+
+    @staticmethod
+    def _id_bound_vars(expr) -> set:
+        """Variables constrained by id(v) = ... or id(v) IN ... in the WHERE clause."""
+        if expr is None:
+            return set()
+        bound = set()
+        if expr[0] in ('cmp', 'in'):
+            operands = expr[2:] if expr[0] == 'cmp' else expr[1:]
+            if expr[0] == 'in' or expr[1] == '=':
+                for operand in operands:
+                    if operand[0] == 'call' and operand[1] == 'id' and operand[3] and operand[3][0][0] == 'var':
+                        bound.add(operand[3][0][1])
+        if expr[0] == 'and':
+            bound |= CypherValidator._id_bound_vars(expr[1]) | CypherValidator._id_bound_vars(expr[2])
+        return bound
+
+    def _check_patterns(self, parsed) -> List[str]:
+        errors = []
+        node_labels, _ = self._variable_labels(parsed)
+        id_bound = self._id_bound_vars(parsed.where)
+        if self._components(parsed.paths) > 1:
+            errors.append('disconnected patterns form a cartesian product, connect them with a relationship')
+        for path in parsed.paths:
+            for node in path.nodes:
+                errors.extend(f'unknown label {label}' for label in node.labels if label not in self.labels)
+            if not any(node_labels[node.var] or node.props or node.var in id_bound for node in path.nodes):
+                errors.append('pattern without any label or id constraint scans the whole graph')
+
+            for left, rel, right in zip(path.nodes, path.rels, path.nodes[1:]):
+                unknown = [rel_type for rel_type in rel.types if rel_type not in self.relationships]
+                errors.extend(f'unknown relationship type {rel_type}' for rel_type in unknown)
+                if unknown or rel.direction == 'both':
+                    continue
+                source, target = (left, right) if rel.direction == 'out' else (right, left)
+                for rel_type in rel.types:
+                    declared = self.relationships[rel_type]
+                    source_labels, target_labels = node_labels[source.var], node_labels[target.var]
+                    if (source_labels and declared['from'] not in source_labels) or (target_labels and declared['to'] not in target_labels):
+                        errors.append(f"relationship {rel_type} goes from {declared['from']} to {declared['to']}: "
+                                      f"use ({declared['from']})-[:{rel_type}]->({declared['to']})")
+        return errors
+
+    @staticmethod
+    def _components(paths) -> int:
+        """Number of groups of comma-separated paths connected through shared node variables."""
+        groups: List[set] = []
+        for path in paths:
+            variables = {node.var for node in path.nodes}
+            connected = [group for group in groups if group & variables]
+            for group in connected:
+                variables |= group
+                groups.remove(group)
+            groups.append(variables)
+        return len(groups)
+
+    def _check_properties(self, parsed) -> List[str]:
+        node_labels, rel_types = self._variable_labels(parsed)
+        errors = []
+
+        def allowed(var):
+            if node_labels.get(var):
+                return set().union(*(self.labels.get(label, set()) for label in node_labels[var]))
+            if rel_types.get(var):
+                return set().union(*(set(self.relationships.get(t, {}).get('properties', [])) for t in rel_types[var]))
+            return None  # 无标签的变量无法校验属性
+
+        def check(var, name):
+            names = allowed(var)
+            if names is not None and name not in names:
+                owner = '/'.join(sorted(node_labels.get(var) or rel_types.get(var)))
+                errors.append(f'{owner} has no property {name}')
+
+        def walk(expr):
+            if expr[0] == 'prop' and expr[1][0] == 'var':
+                check(expr[1][1], expr[2])
+            for child in children(expr):
+                walk(child)
+
+        for path in parsed.paths:
+            for pattern in list(path.nodes) + list(path.rels):
+                for name, value in pattern.props:
+                    check(pattern.var, name)
+                    walk(value)
+        expressions = [item.expr for item in parsed.items] + [item.expr for item in parsed.order_by]
+        if parsed.where is not None:
+            expressions.append(parsed.where)
+        for expr in expressions:
+            walk(expr)
+        return list(dict.fromkeys(errors))
+
+
+def record_validation(outcome: str):
+    count('cypher_validation_total', 'Preflight outcome of generated Cypher (valid, fixed, repaired, blocked)', outcome=outcome)
+
+
+if __name__ == "__main__":
+    validator = CypherValidator()
+    for cypher in [
+        "MATCH (n1) RETURN n1",
+        "MATCH (n1) WITH n1 RETURN n1",
+        "MATCH (m:FundManager), (f:Fund) RETURN m, f",
+        "MATCH (m:FundManager)-[:manage]->(f:Fund) RETURN f LIMIT 5 UNION MATCH (f:Fund) RETURN f LIMIT 1000",
+        "MATCH (f:Fund)-[:manage]->(m:FundManager) RETURN m, f",
+        "MATCH (m:FundManager)-[:manage]->(f:Fund) WHERE m.name = '张坤' RETURN f LIMIT 100",
+        "```cypher\nMATCH (m:FundManager)-[:manage]->(f:Fund) WHERE m.chinesename = '张坤' RETURN f\n```",
+    ]:
+        result = validator.validate(cypher)
+        print(result.valid, result.query, result.errors, result.fixes)
+
+    # 行尾注释中不能吞掉追加的 LIMIT
+    for cypher, expected in [
+        ("MATCH (m:FundManager)-[:manage]->(f:Fund) RETURN f // all funds",
+         "MATCH (m:FundManager)-[:manage]->(f:Fund) RETURN f LIMIT 30"),
+        ("MATCH (f:Fund) /* funds */ WHERE f.fund_name = 'a//b' RETURN f LIMIT 100 /* top */",
+         "MATCH (f:Fund)   WHERE f.fund_name = 'a//b' RETURN f LIMIT 30"),
+    ]:
+        result = validator.validate(cypher)
+        assert result.valid and result.query == expected, (cypher, result.query, result.errors)
+    print('comment checks passed')
@@ -0,0 +1,210 @@
+import re
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, List, Optional
+
+from core.graph_snapshot import GraphSnapshot
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# Precompiled, parameterized Cypher templates. The query text never changes, so Neptune can reuse
+# the plan and only the $ids parameter differs between questions.
+CYPHER_TEMPLATES = {
+    'manager_profile': "MATCH (m:FundManager) WHERE id(m) IN $manager_ids RETURN m LIMIT 30",
+    'manager_funds': "MATCH (m:FundManager)-[:manage]->(f:Fund) WHERE id(m) IN $manager_ids RETURN m, f LIMIT 30",
+    'fund_profile': "MATCH (f:Fund) WHERE id(f) IN $fund_ids RETURN f LIMIT 30",
+    'fund_managers': "MATCH (m:FundManager)-[:manage]->(f:Fund) WHERE id(f) IN $fund_ids RETURN f, m LIMIT 30",
+    'manager_fund_relation': ("MATCH (m:FundManager)-[:manage]->(f:Fund) "
+                              "WHERE id(m) IN $manager_ids OR id(f) IN $fund_ids RETURN m, f LIMIT 30"),
+}
+
+# Graph properties whose values are entity names, per vertex label
+NAME_PROPERTIES = {
+    'FundManager': ['chinesename'],
+    'Fund': ['fund_name', 'fund_full_name'],
+}
+
+FUND_KEYWORDS = ('基金', '产品', '管理', '业绩', '收益')
+MANAGER_KEYWORDS = ('基金经理', '经理', '谁管理', '管理人')
+
+_FUND_NAME_SUFFIX = re.compile(r'(\(.*?\)|[a-z])$|(混合型?|股票型?|债券型?|指数型?|证券投资基金|投资基金|基金)$')
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize('NFKC', text).lower().replace(' ', '')
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: one pass over the text finds every occurrence of every pattern.
+    """
+
+    def __init__(self, patterns: Dict[str, object]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[tuple]] = [[]]  # state -> [(pattern length, payload)]
+        for pattern, payload in patterns.items():
+            self._add(pattern, payload)
+        self._build_fail_links()
+
+    def _add(self, pattern, payload):
+        state = 0
+        for ch in pattern:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append((len(pattern), payload))
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text: str):
+        """Yield (start, end, payload) for every match."""
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, payload in self.output[state]:
+                yield position + 1 - length, position + 1, payload
+
+    def find_longest(self, text: str):
+        """Leftmost-longest, non-overlapping matches: [(start, end, payload)]."""
+        matches = sorted(self.find_all(text), key=lambda match: (match[0], -(match[1] - match[0])))
+        selected, covered_until = [], 0
+        for start, end, payload in matches:
+            if start >= covered_until:
+                selected.append((start, end, payload))
+                covered_until = end
+        return selected
+
+
+class EntityRouter(GraphSnapshot):
+    """
+    LLM-free fast path for questions that name a fund manager or a fund.
+
+    Entity names are loaded from the graph into an Aho-Corasick automaton. A question with at least
+    one recognized entity is mapped to a precompiled Cypher template plus parameters; other questions
+    return None and go through LLM Cypher generation. The dictionary is read page by page and kept up to
+    date as described in GraphSnapshot.
+    """
+
+    def __init__(self, graph_db, name_properties: Dict[str, List[str]] = None, min_name_length: int = 2,
+                 page_size: int = 5000, reload_seconds: Optional[float] = None):
+        super().__init__(graph_db, reload_seconds)
+        self.name_properties = name_properties or NAME_PROPERTIES
+        self.min_name_length = min_name_length
+        self.page_size = page_size
+        self.automaton: Optional[AhoCorasick] = None
+        self.entity_count = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch_names(self):
+        """Yield (label, id, name) for every entity name in the graph."""
+        for label, properties in self.name_properties.items():
+            returns = ', '.join(f'n.{prop} AS {prop}' for prop in properties)
+            query = f"MATCH (n:{label}) RETURN id(n) AS id, {returns} ORDER BY id(n) SKIP $skip LIMIT $limit"
+            for row in self.paged_rows(self.graph_db, query, self.page_size):
+                for prop in properties:
+                    if isinstance(row.get(prop), str):
+                        yield label, row['id'], row[prop]
+
+    def _aliases(self, label, name):
+        name = normalize_text(name)
+        aliases = {name}
+        if label == 'Fund':
+            # 去掉 "(QDII)"、"混合" 等后缀, 以匹配口语化的简称
+            shortened = name
+            while True:
+                stripped = _FUND_NAME_SUFFIX.sub('', shortened)
+                if stripped == shortened or len(stripped) < self.min_name_length:
+                    break
+                shortened = stripped
+                aliases.add(shortened)
+        return [alias for alias in aliases if len(alias) >= self.min_name_length]
+
+    def rebuild(self):
+        patterns: Dict[str, set] = {}
+        entities = set()
+        for label, entity_id, name in self._fetch_names():
+            entities.add((label, entity_id))
+            for alias in self._aliases(label, name):
+                patterns.setdefault(alias, set()).add((label, entity_id))
+        automaton = AhoCorasick({alias: frozenset(payload) for alias, payload in patterns.items()})
+        with self._lock:
+            self.automaton = automaton
+            self.entity_count = len(entities)
+        logger.info(f"Entity dictionary built: {len(entities)} entities, {len(patterns)} names")
+
+    def clear(self):
+        with self._lock:
+            self.automaton = AhoCorasick({})
+            self.entity_count = 0
+
+    def match_entities(self, question: str) -> Dict[str, List[str]]:
+        """:return: {'FundManager': [ids], 'Fund': [ids]} of the entities named in the question"""
+        self.ensure_built()
+        found: Dict[str, List[str]] = {}
+        for _, _, payload in self.automaton.find_longest(normalize_text(question)):
+            for label, entity_id in sorted(payload):
+                ids = found.setdefault(label, [])
+                if entity_id not in ids:
+                    ids.append(entity_id)
+        return found
+
+    def route(self, question: str):
+        """
+        :return: (intent, cypher, parameters) when the question names known entities, otherwise None
+        """
+        try:
+            entities = self.match_entities(question)
+        except Exception as e:
+            # An empty dictionary stays in place until the next data version or reload
+            logger.error(f"Error building entity dictionary: {e}")
+            entities = {}
+
+        manager_ids, fund_ids = entities.get('FundManager', []), entities.get('Fund', [])
+        if manager_ids and fund_ids:
+            intent, parameters = 'manager_fund_relation', {'manager_ids': manager_ids, 'fund_ids': fund_ids}
+        elif manager_ids:
+            intent = 'manager_funds' if any(keyword in question for keyword in FUND_KEYWORDS) else 'manager_profile'
+            parameters = {'manager_ids': manager_ids}
+        elif fund_ids:
+            intent = 'fund_managers' if any(keyword in question for keyword in MANAGER_KEYWORDS) else 'fund_profile'
+            parameters = {'fund_ids': fund_ids}
+        else:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return intent, CYPHER_TEMPLATES[intent], parameters
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entities': self.entity_count,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
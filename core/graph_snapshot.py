@@ -0,0 +1,82 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+class GraphSnapshot(ABC):
+    """
+    In-memory structure built from the graph (the entity dictionary, the fund metrics store).
+
+    The first build runs in ChatService.warm_up, or on the first question when the service is not warmed
+    up, and is serialized so concurrent requests wait for one build instead of each running it. Later the
+    snapshot is rebuilt in a background thread when the graph backend's data_version changes or
+    reload_seconds have passed, while questions keep using the previous snapshot. reload() rebuilds at once.
+    """
+
+    def __init__(self, graph_db, reload_seconds: Optional[float] = None):
+        self.graph_db = graph_db
+        self.reload_seconds = reload_seconds
+        self.built_version = object()
+        self.built_at: Optional[float] = None
+        self._build_lock = threading.Lock()
+
+    @abstractmethod
+    def rebuild(self):
+        """Read the graph and install the new snapshot."""
+
+    @abstractmethod
+    def clear(self):
+        """Install an empty snapshot after a failed first build."""
+
+    def _build(self):
+        version = getattr(self.graph_db, 'data_version', None)
+        try:
+            self.rebuild()
+        finally:
+            # 失败时也记录版本和时间, 直到数据版本变化或到达 reload_seconds 才重试, 不在每个问题上重试
+            self.built_version, self.built_at = version, time.monotonic()
+
+    def reload(self):
+        with self._build_lock:
+            self._build()
+
+    def _stale(self) -> bool:
+        if getattr(self.graph_db, 'data_version', None) != self.built_version:
+            return True
+        return self.reload_seconds is not None and time.monotonic() - self.built_at >= self.reload_seconds
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    try:
+                        self._build()
+                    except Exception:
+                        self.clear()
+                        raise
+        elif self._stale() and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh, name=f'{type(self).__name__}-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self._build()
+        except Exception as e:
+            logger.error(f"Failed to refresh {type(self).__name__}, keeping the previous snapshot: {e}")
+        finally:
+            self._build_lock.release()
+
+    @staticmethod
+    def paged_rows(graph_db, query: str, page_size: int):
+        """Yield the rows of a query ending in SKIP $skip LIMIT $limit, one page per request."""
+        skip = 0
+        while True:
+            rows = graph_db.execute_opencypher_query(query, {'skip': skip, 'limit': page_size}).get('results', [])
+            yield from rows
+            if len(rows) < page_size:
+                return
+            skip += page_size
@@ -0,0 +1,256 @@
+import re
+import threading
+from typing import Dict, List, Optional
+
+from core.entity_router import AhoCorasick, normalize_text
+from core.graph_snapshot import GraphSnapshot
+from database.fund_metrics import FundMetricsStore, CATEGORICAL_COLUMNS
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# Chinese names of the metrics, per column. Period words alone ("近一年") refer to the return over that period.
+METRIC_ALIASES = {
+    'nav_grw_r1w': ['近一周', '近1周', '最近一周'],
+    'nav_grw_r1m': ['近一个月', '近一月', '近1月', '近1个月', '最近一个月'],
+    'nav_grw_r3m': ['近三个月', '近三月', '近3月', '近3个月'],
+    'nav_grw_ty': ['今年以来', '今年'],
+    'nav_grw_r1y': ['近一年', '近1年', '最近一年', '过去一年'],
+    'nav_grw_r3y': ['近三年', '近3年', '过去三年'],
+    'nav_grw_r5y': ['近五年', '近5年', '过去五年'],
+    'nav_grw_base': ['成立以来'],
+    'annual_return_base': ['年化收益', '年化回报'],
+    'max_draw_down_base': ['最大回撤', '回撤'],
+    'risk_eva_level': ['风险等级', '风险级别'],
+    'rating_star': ['评级', '星级'],
+    'totshare': ['规模', '份额'],
+    'unit_nav': ['单位净值', '净值'],
+    'hot_value': ['热度', '人气'],
+}
+# Return columns; a question about "收益" without a period uses DEFAULT_RETURN
+RETURN_COLUMNS = ('nav_grw_r1w', 'nav_grw_r1m', 'nav_grw_r3m', 'nav_grw_ty', 'nav_grw_r1y', 'nav_grw_r3y', 'nav_grw_r5y', 'nav_grw_base')
+RETURN_WORDS = ('收益', '涨幅', '回报', '业绩', '表现')
+DEFAULT_RETURN = 'nav_grw_r1y'
+
+# "近一年收益率大于5" 中时间段与比较之间的 "收益率"
+_RETURN_SUFFIX = re.compile(r'^(?:的)?(?:收益|涨幅|回报|业绩|表现)?率?')
+_RETURN_WORD = re.compile(r'(?:收益|涨幅|回报|业绩|表现)率?')
+# 指标存储中没有的时间段: 出现时不走规则路由, 避免用近一年收益代替
+_UNKNOWN_PERIOD = re.compile(r'(?:19|20)\d{2}|去年|前年|上半年|下半年|季度|本月|上月|上个月|本周|上周|'
+                             r'近(?:两|2|四|4|六|6|十|10)年|近半年|近(?:六|6|两|2)个?月')
+
+DESCENDING_WORDS = ('最高', '最好', '最大', '最多', '最强', '最佳', '靠前', '排名前', '最牛')
+ASCENDING_WORDS = ('最低', '最小', '最少', '最差', '靠后')
+
+_COMPARISON = re.compile(r'^\s*(不低于|不少于|不小于|大于等于|>=|不高于|不超过|不大于|小于等于|<=|低于|小于|少于|<|高于|大于|超过|多于|>|等于|为|是|=)?\s*'
+                         r'(-?\d+(?:\.\d+)?)\s*(%|级|星|亿)?')
+_OPERATOR = {
+    '不低于': '>=', '不少于': '>=', '不小于': '>=', '大于等于': '>=', '>=': '>=',
+    '不高于': '<=', '不超过': '<=', '不大于': '<=', '小于等于': '<=', '<=': '<=',
+    '低于': '<', '小于': '<', '少于': '<', '<': '<',
+    '高于': '>', '大于': '>', '超过': '>', '多于': '>', '>': '>',
+    '等于': '=', '为': '=', '是': '=', '=': '=', None: '=',
+}
+_LEVEL_BEFORE = re.compile(r'(\d)\s*级\s*风险')
+_TOP_N = re.compile(r'(?:前|top\s*)(\d+|[一二两三四五六七八九十]+)|(\d+|[一二两三四五六七八九十]+)\s*(?:只|个|支)')
+_CHINESE_DIGITS = {'一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+
+def _chinese_number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    if text == '十':
+        return 10
+    if text.startswith('十'):
+        return 10 + _CHINESE_DIGITS.get(text[1:], 0)
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return _CHINESE_DIGITS.get(tens, 1) * 10 + _CHINESE_DIGITS.get(ones, 0)
+    return _CHINESE_DIGITS.get(text, 0)
+
+
+class MetricQuery:
+    def __init__(self, filters: List[tuple], order_by: Optional[str], descending: bool, limit: int):
+        self.filters = filters
+        self.order_by = order_by
+        self.descending = descending
+        self.limit = limit
+
+    def describe(self) -> str:
+        conditions = ' AND '.join(f"{column} {operator} {value}" for column, operator, value in self.filters) or 'none'
+        order = f"{self.order_by} {'DESC' if self.descending else 'ASC'}" if self.order_by else 'none'
+        return f"filters: {conditions}; order by: {order}; limit: {self.limit}"
+
+
+class RankingRouter(GraphSnapshot):
+    """
+    LLM-free fast path for ranking and filter questions over fund metrics ("近一年收益最高的主动偏股基金",
+    "风险等级4且最大回撤低于50的基金").
+
+    Metric names, comparisons, sort direction, top-N and categorical values (matched against the store's
+    dictionaries) are extracted with rules; a question qualifies when it sorts by a metric or compares one
+    with a number; questions about a period the store does not hold (a calendar year, 近两年, ...) do not.
+    The columnar store is read from the graph page by page and kept up to date as described in GraphSnapshot.
+    """
+
+    def __init__(self, graph_db, default_limit: int = 10, max_limit: int = 30, page_size: int = 5000,
+                 reload_seconds: Optional[float] = None):
+        super().__init__(graph_db, reload_seconds)
+        self.page_size = page_size
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.store: Optional[FundMetricsStore] = None
+        self.categories: Optional[AhoCorasick] = None
+        self.metrics = AhoCorasick({alias: column for column, aliases in METRIC_ALIASES.items() for alias in aliases})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rebuild(self):
+        store = FundMetricsStore.from_graph(self.graph_db, self.page_size)
+        patterns = {}
+        for column in CATEGORICAL_COLUMNS:
+            for value in store.dictionaries[column]:
+                if len(value) >= 2:
+                    patterns.setdefault(normalize_text(value), []).append((column, value))
+        with self._lock:
+            self.store = store
+            self.categories = AhoCorasick(patterns)
+        logger.info(f"Fund metrics store built: {len(store)} funds")
+
+    def clear(self):
+        with self._lock:
+            self.store = FundMetricsStore()
+            self.categories = AhoCorasick({})
+
+    def _comparison(self, following: str):
+        match = _COMPARISON.match(_RETURN_SUFFIX.sub('', following, count=1))
+        return match if match and match.group(1) else None
+
+    def parse(self, question: str) -> Optional[MetricQuery]:
+        text = normalize_text(question)
+        if _UNKNOWN_PERIOD.search(text):
+            return None
+        filters, order_by, mentioned = [], None, []
+
+        matches = self.metrics.find_longest(text)
+        remainder = text
+        for start, end, column in matches:
+            following = text[end:]
+            # "近一年最大回撤" 中的时间段修饰后面的指标, 不单独表示收益
+            if column in RETURN_COLUMNS and any(following.startswith(alias) for alias in METRIC_ALIASES['max_draw_down_base']):
+                continue
+            mentioned.append(column)
+            comparison = self._comparison(following) or (_COMPARISON.match(following) if column == 'risk_eva_level' else None)
+            if comparison:
+                filters.append((column, _OPERATOR[comparison.group(1)], float(comparison.group(2))))
+            remainder = remainder.replace(text[start:end], ' ')
+        level = _LEVEL_BEFORE.search(text)
+        if level and 'risk_eva_level' not in [f[0] for f in filters]:
+            filters.append(('risk_eva_level', '=', float(level.group(1))))
+        if not mentioned and any(word in text for word in RETURN_WORDS):
+            mentioned.append(DEFAULT_RETURN)
+            # "收益超过10%的基金": 没有时间段时比较的是默认收益
+            for word in _RETURN_WORD.finditer(text):
+                comparison = self._comparison(text[word.end():])
+                if comparison:
+                    filters.append((DEFAULT_RETURN, _OPERATOR[comparison.group(1)], float(comparison.group(2))))
+                    break
+
+        # 指标名已从 remainder 中去掉, "最大回撤" 不会被当成 "最大"
+        descending = any(word in remainder for word in DESCENDING_WORDS)
+        ascending = any(word in remainder for word in ASCENDING_WORDS)
+        compared = {f[0] for f in filters}
+        candidates = [column for column in mentioned if column not in compared] or mentioned
+        if (descending or ascending) and candidates:
+            order_by = candidates[0]
+        elif filters:
+            # 只有筛选条件时, 按第一个比较条件排序: "低于" 升序, 其他降序
+            column, operator, _ = next((f for f in filters if f[1] != '='), filters[0])
+            order_by = column
+            ascending = operator in ('<', '<=')
+        else:
+            return None
+
+        for values in self._category_filters(text).values():
+            column = values[0][0]
+            names = [value for _, value in values]
+            filters.append((column, '=', names[0]) if len(names) == 1 else (column, 'in', names))
+
+        limit = self.default_limit
+        top_n = _TOP_N.search(text)
+        if top_n:
+            limit = _chinese_number(top_n.group(1) or top_n.group(2)) or self.default_limit
+        return MetricQuery(filters, order_by, not ascending, min(limit, self.max_limit))
+
+    def _category_filters(self, text) -> Dict[str, List[tuple]]:
+        found: Dict[str, List[tuple]] = {}
+        for _, _, candidates in self.categories.find_longest(text):
+            # 同一个词出现在多个分类列时, 取最细的分类 (列表中靠后的列)
+            column, value = candidates[-1]
+            if (column, value) not in found.setdefault(column, []):
+                found[column].append((column, value))
+        return found
+
+    def route(self, question: str) -> Optional[MetricQuery]:
+        try:
+            self.ensure_built()
+            query = self.parse(question)
+        except Exception as e:
+            logger.error(f"Error routing ranking question: {e}")
+            query = None
+        with self._lock:
+            if query is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return query
+
+    def answer(self, query: MetricQuery) -> List[dict]:
+        return self.store.select(query.filters, query.order_by, query.descending, query.limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'funds': len(self.store) if self.store is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+def format_ranking(query: MetricQuery, rows: List[dict]) -> str:
+    """Pipe table of the selected funds, preceded by the query, for the final prompt."""
+    lines = [f"[fund ranking] {query.describe()}; {len(rows)} funds"]
+    if rows:
+        columns = [column for column in rows[0] if column != 'id']
+        lines.append('|'.join(columns))
+        for row in rows:
+            lines.append('|'.join('' if row[column] is None else str(row[column]) for column in columns))
+    return '\n'.join(lines)
+
+
+# 使用示例: python -m core.ranking_router (末尾的检查在解析规则变化时失败)
+if __name__ == "__main__":
+    from database.local_graph import LocalGraphDB
+    router = RankingRouter(LocalGraphDB(['data_example/vertex.csv'], ['data_example/edge.csv']))
+    for question in ["近一年收益最高的主动偏股基金", "风险等级4且最大回撤低于57.5的基金", "前两只近三年收益最低的基金", "介绍一下张坤"]:
+        query = router.route(question)
+        print(question, '->', query.describe() if query else None)
+        if query:
+            print(format_ranking(query, router.answer(query)))
+
+    expected = {
+        '近一年收益超过10%的基金': [('nav_grw_r1y', '>', 10.0)],
+        '近一年收益率大于5的基金有哪些': [('nav_grw_r1y', '>', 5.0)],
+        '近三年的收益低于-20的基金': [('nav_grw_r3y', '<', -20.0)],
+        '收益超过10%的基金': [('nav_grw_r1y', '>', 10.0)],
+        '年化收益率不低于3的基金': [('annual_return_base', '>=', 3.0)],
+    }
+    for question, filters in expected.items():
+        query = router.parse(question)
+        assert query is not None and query.filters == filters, (question, query and query.describe())
+    for question in ['哪只基金2023年收益最高', '去年收益最高的基金', '近两年收益最高的基金', '介绍一下张坤']:
+        assert router.parse(question) is None, question
+    print('parse checks passed')
@@ -0,0 +1,168 @@
+import re
+import json
+import math
+from collections import OrderedDict
+from typing import Dict, List
+
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# Properties always kept per label, in output order
+DEFAULT_PROPERTIES = {
+    'FundManager': ['chinesename', 'experiencetime', 'background'],
+    'Fund': ['fund_code', 'fund_name', 'fund_type', 'secondary_classification', 'nav_grw_r1y', 'risk_eva_level'],
+}
+
+# Extra properties projected when the question mentions one of the keywords
+KEYWORD_PROPERTIES = [
+    (('收益', '回报', '涨', '跌', '业绩', '表现'), ['nav_grw_r1m', 'nav_grw_r3m', 'nav_grw_r1y', 'nav_grw_r3y', 'nav_grw_r5y',
+                                         'nav_grw_ty', 'nav_grw_p1y', 'annual_return_base']),
+    (('风险', '回撤', '稳健'), ['risk_eva_level', 'max_draw_down_base']),
+    (('规模', '份额'), ['totshare']),
+    (('净值',), ['unit_nav']),
+    (('成立', '历史'), ['establish_date']),
+    (('托管',), ['trustee_name']),
+    (('介绍', '简介', '背景', '经历', '是谁'), ['background', 'briefintro', 'fund_full_name']),
+    (('分类', '类型'), ['primary_classification', 'secondary_classification', 'fund_2_type']),
+]
+
+# Long text fields in the order they are shortened when the prompt is over budget
+TRUNCATION_PRIORITY = ['briefintro', 'background']
+TRUNCATION_STEPS = [300, 150, 60, 0]
+
+_CJK = re.compile('[　-鿿＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Llama 3 token estimate: one token per CJK character, four other characters per token."""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class ResultShaper:
+    """
+    Turn a raw openCypher response into a compact prompt section: entities are deduplicated by id,
+    only the properties relevant to the question are kept, funds are rendered as one table, lists of
+    plain values stay in their row (capped at the row limit), and long text fields are truncated by
+    priority until the text fits the token budget.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_rows: int = 30):
+        self.token_budget = token_budget
+        self.max_rows = max_rows
+
+    @staticmethod
+    def select_properties(label: str, question: str) -> List[str]:
+        properties = list(DEFAULT_PROPERTIES.get(label, []))
+        for keywords, extra in KEYWORD_PROPERTIES:
+            if any(keyword in question for keyword in keywords):
+                properties.extend(name for name in extra if name not in properties)
+        return properties
+
+    def _collect(self, graph_result):
+        nodes: Dict[str, OrderedDict] = OrderedDict()  # label -> {id: properties}
+        relations, scalar_rows = OrderedDict(), []
+
+        def visit(value):
+            if isinstance(value, list):
+                # 节点与关系并入实体表, collect() 得到的普通值保留为该行的值
+                values = [item for item in (visit(item) for item in value) if item is not None]
+                return values if values else None
+            if isinstance(value, dict) and value.get('~entityType') == 'node':
+                label = (value.get('~labels') or ['Node'])[0]
+                nodes.setdefault(label, OrderedDict()).setdefault(value['~id'], value.get('~properties', {}))
+                return None
+            if isinstance(value, dict) and value.get('~entityType') == 'relationship':
+                relations[value['~id']] = (value['~start'], value['~type'], value['~end'])
+                return None
+            return value
+
+        for row in (graph_result or {}).get('results', []):
+            scalars = OrderedDict()
+            for key, value in row.items():
+                value = visit(value)
+                if value is not None:
+                    scalars[key] = value
+            if scalars:
+                scalar_rows.append(scalars)
+        return nodes, relations, scalar_rows
+
+    @staticmethod
+    def _format_value(value, max_chars, max_items=None):
+        if isinstance(value, float):
+            value = round(value, 2)
+        if isinstance(value, list):
+            shown = value if max_items is None else value[:max_items]
+            text = ', '.join(ResultShaper._format_value(item, None) for item in shown)
+            if len(shown) < len(value):
+                text += f' …(+{len(value) - len(shown)})'
+            value = text
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        text = text.replace('\n', ' ').replace('|', '/')
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars] + '…' if max_chars > 0 else ''
+        return text
+
+    def _render(self, nodes, relations, scalar_rows, question, limits, max_rows):
+        sections = []
+        names = {}
+        for label, entities in nodes.items():
+            properties = self.select_properties(label, question)
+            if not properties:
+                properties = sorted({name for props in entities.values() for name in props})
+            rows = list(entities.items())[:max_rows]
+            for entity_id, props in rows:
+                names[entity_id] = props.get('chinesename') or props.get('fund_name') or entity_id
+            # 长文本字段单独成行, 其余字段组成表格
+            text_fields = [name for name in properties if name in TRUNCATION_PRIORITY]
+            table_fields = [name for name in properties if name not in TRUNCATION_PRIORITY
+                            and any(props.get(name) is not None for _, props in rows)]
+            lines = [f'[{label}] ' + '|'.join(['id'] + table_fields)]
+            for entity_id, props in rows:
+                lines.append('|'.join([entity_id] + [self._format_value(props.get(name, ''), None) for name in table_fields]))
+            for entity_id, props in rows:
+                for name in text_fields:
+                    text = self._format_value(props.get(name, ''), limits.get(name))
+                    if text:
+                        lines.append(f'{entity_id}.{name}: {text}')
+            sections.append('\n'.join(lines))
+
+        if relations:
+            sections.append('[relations]\n' + '\n'.join(
+                f'{names.get(start, start)} -{rel_type}-> {names.get(end, end)}' for start, rel_type, end in list(relations.values())[:max_rows * 2]))
+
+        if scalar_rows:
+            columns = list(OrderedDict.fromkeys(key for row in scalar_rows for key in row))
+            lines = ['[rows] ' + '|'.join(columns)]
+            for row in scalar_rows[:max_rows]:
+                lines.append('|'.join(self._format_value(row.get(column, ''), limits.get(column.rsplit('.', 1)[-1]), max_rows)
+                                      for column in columns))
+            sections.append('\n'.join(lines))
+        return '\n'.join(sections) if sections else 'No graph data found.'
+
+    def shape(self, graph_result, question: str) -> str:
+        """
+        :param graph_result: openCypher response {'results': [...]}
+        :param question: User question, used to select the relevant properties
+        :return: Compact text for the graph_result slot of RESULT_GENERSTION_PROMPT
+        """
+        nodes, relations, scalar_rows = self._collect(graph_result)
+        limits = {}
+        max_rows = self.max_rows
+        text = self._render(nodes, relations, scalar_rows, question, limits, max_rows)
+        steps = [(name, step) for name in TRUNCATION_PRIORITY for step in TRUNCATION_STEPS]
+        while estimate_tokens(text) > self.token_budget:
+            if steps:
+                name, step = steps.pop(0)
+                limits[name] = step
+            elif max_rows > 1:
+                max_rows = max(1, max_rows // 2)
+            else:
+                break
+            text = self._render(nodes, relations, scalar_rows, question, limits, max_rows)
+
+        raw_tokens = estimate_tokens(json.dumps(graph_result, indent=2))
+        shaped_tokens = estimate_tokens(text)
+        logger.info(f"Graph result shaped from ~{raw_tokens} to ~{shaped_tokens} tokens (saved ~{raw_tokens - shaped_tokens})")
+        return text
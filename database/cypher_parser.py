@@ -0,0 +1,403 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# 查询 AST
+Query = namedtuple('Query', 'paths where distinct items order_by skip limit')
+Path = namedtuple('Path', 'nodes rels')
+NodePattern = namedtuple('NodePattern', 'var labels props')
+RelPattern = namedtuple('RelPattern', 'var types props direction')  # direction: 'out' | 'in' | 'both'
+ReturnItem = namedtuple('ReturnItem', 'expr name')
+SortItem = namedtuple('SortItem', 'expr text descending')
+Token = namedtuple('Token', 'kind value start end')
+
+AGGREGATE_FUNCTIONS = ('count', 'collect', 'sum', 'avg', 'min', 'max')
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|//[^\n]*)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d+|\d+)
+  | (?P<qident>`[^`]+`)
+  | (?P<ident>[^\W\d]\w*)
+  | (?P<param>\$\w+)
+  | (?P<op><>|<=|>=|->|<-|=~|[()\[\]{}:,.\-<>=*+/%|;])
+""", re.VERBOSE)
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+# 本模块不支持的子句, 遇到时报错而不是静默忽略
+_UNSUPPORTED_CLAUSES = ('OPTIONAL', 'WITH', 'UNWIND', 'CREATE', 'MERGE', 'DELETE', 'DETACH', 'SET', 'REMOVE', 'CALL', 'UNION', 'FOREACH', 'LOAD')
+
+
+class CypherSyntaxError(Exception):
+    pass
+
+
+def tokenize(query: str):
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None:
+            raise CypherSyntaxError(f"Unexpected character {query[position]!r} at {position}")
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'string':
+            text = re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), text[1:-1])
+        elif kind == 'number':
+            text = float(text) if '.' in text else int(text)
+        elif kind == 'qident':
+            kind, text = 'ident', text[1:-1]
+        elif kind == 'param':
+            text = text[1:]
+        if kind != 'space':
+            tokens.append(Token(kind, text, match.start(), match.end()))
+        position = match.end()
+    tokens.append(Token('eof', None, len(query), len(query)))
+    return tokens
+
+
+class CypherParser:
+    """
+    Recursive-descent parser for the read-only openCypher subset produced by CYPHER_GENERATION_PROMPT:
+    MATCH patterns with directed relationships, WHERE, RETURN [DISTINCT] with aggregates, ORDER BY, SKIP, LIMIT.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.position = 0
+        self._anonymous = 0
+
+    # token helpers
+    def peek(self, offset=0) -> Token:
+        return self.tokens[min(self.position + offset, len(self.tokens) - 1)]
+
+    def next(self) -> Token:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def is_kw(self, word, offset=0):
+        token = self.peek(offset)
+        return token.kind == 'ident' and isinstance(token.value, str) and token.value.upper() == word
+
+    def accept_kw(self, *words):
+        if all(self.is_kw(word, i) for i, word in enumerate(words)):
+            self.position += len(words)
+            return True
+        return False
+
+    def expect_kw(self, *words):
+        if not self.accept_kw(*words):
+            self.error(f"expected {' '.join(words)}")
+
+    def is_op(self, op, offset=0):
+        token = self.peek(offset)
+        return token.kind == 'op' and token.value == op
+
+    def accept_op(self, op):
+        if self.is_op(op):
+            self.position += 1
+            return True
+        return False
+
+    def expect_op(self, op):
+        if not self.accept_op(op):
+            self.error(f"expected '{op}'")
+
+    def expect_ident(self):
+        token = self.next()
+        if token.kind != 'ident':
+            self.position -= 1
+            self.error('expected identifier')
+        return token.value
+
+    def error(self, message):
+        token = self.peek()
+        raise CypherSyntaxError(f"{message} at position {token.start}: {self.query[token.start:token.start + 30]!r}")
+
+    def anonymous_var(self):
+        self._anonymous += 1
+        return f'  anon{self._anonymous}'
+
+    # clauses
+    def parse(self) -> Query:
+        paths, conditions = [], []
+        self._check_supported()
+        if not self.is_kw('MATCH'):
+            self.error('expected MATCH')
+        while self.accept_kw('MATCH'):
+            paths.extend(self.parse_pattern_list())
+            if self.accept_kw('WHERE'):
+                conditions.append(self.parse_expression())
+            self._check_supported()
+
+        self.expect_kw('RETURN')
+        distinct = self.accept_kw('DISTINCT')
+        items = [self.parse_return_item()]
+        while self.accept_op(','):
+            items.append(self.parse_return_item())
+
+        order_by = []
+        if self.accept_kw('ORDER', 'BY'):
+            order_by.append(self.parse_sort_item())
+            while self.accept_op(','):
+                order_by.append(self.parse_sort_item())
+        skip = self.parse_expression() if self.accept_kw('SKIP') else None
+        limit = self.parse_expression() if self.accept_kw('LIMIT') else None
+        self.accept_op(';')
+        if self.peek().kind != 'eof':
+            self._check_supported()
+            self.error('unexpected token')
+
+        where = None
+        for condition in conditions:
+            where = condition if where is None else ('and', where, condition)
+        return Query(paths, where, distinct, items, order_by, skip, limit)
+
+    def _check_supported(self):
+        for clause in _UNSUPPORTED_CLAUSES:
+            if self.is_kw(clause):
+                self.error(f'unsupported clause {clause}')
+
+    def parse_pattern_list(self):
+        paths = [self.parse_path()]
+        while self.accept_op(','):
+            paths.append(self.parse_path())
+        return paths
+
+    def parse_path(self):
+        if self.peek().kind == 'ident' and self.is_op('=', 1):
+            self.error('named paths are not supported')
+        nodes, rels = [self.parse_node()], []
+        while self.is_op('-') or self.is_op('<-'):
+            rels.append(self.parse_rel())
+            nodes.append(self.parse_node())
+        return Path(nodes, rels)
+
+    def parse_node(self):
+        self.expect_op('(')
+        var = self.expect_ident() if self.peek().kind == 'ident' else self.anonymous_var()
+        labels = []
+        while self.accept_op(':'):
+            labels.append(self.expect_ident())
+        props = self.parse_map() if self.is_op('{') else ()
+        self.expect_op(')')
+        return NodePattern(var, tuple(labels), props)
+
+    def parse_rel(self):
+        incoming = self.accept_op('<-')
+        if not incoming:
+            self.expect_op('-')
+        var, types, props = self.anonymous_var(), (), ()
+        if self.accept_op('['):
+            if self.peek().kind == 'ident':
+                var = self.expect_ident()
+            if self.accept_op(':'):
+                types = [self.expect_ident()]
+                while self.accept_op('|'):
+                    self.accept_op(':')
+                    types.append(self.expect_ident())
+                types = tuple(types)
+            if self.is_op('*'):
+                self.error('variable length relationships are not supported')
+            props = self.parse_map() if self.is_op('{') else ()
+            self.expect_op(']')
+        if self.accept_op('->'):
+            if incoming:
+                self.error('relationship cannot point both ways')
+            direction = 'out'
+        else:
+            self.expect_op('-')
+            direction = 'in' if incoming else 'both'
+        return RelPattern(var, types, props, direction)
+
+    def parse_map(self):
+        self.expect_op('{')
+        entries = []
+        if not self.is_op('}'):
+            while True:
+                key = self.expect_ident()
+                self.expect_op(':')
+                entries.append((key, self.parse_expression()))
+                if not self.accept_op(','):
+                    break
+        self.expect_op('}')
+        return tuple(entries)
+
+    def parse_return_item(self):
+        start = self.peek().start
+        expr = self.parse_expression()
+        end = self.tokens[self.position - 1].end
+        name = self.expect_ident() if self.accept_kw('AS') else self.query[start:end]
+        return ReturnItem(expr, name)
+
+    def parse_sort_item(self):
+        start = self.peek().start
+        expr = self.parse_expression()
+        text = self.query[start:self.tokens[self.position - 1].end]
+        descending = False
+        if self.accept_kw('DESC') or self.accept_kw('DESCENDING'):
+            descending = True
+        elif not self.accept_kw('ASC'):
+            self.accept_kw('ASCENDING')
+        return SortItem(expr, text, descending)
+
+    # expressions
+    def parse_expression(self):
+        expr = self.parse_and()
+        while self.accept_kw('OR'):
+            expr = ('or', expr, self.parse_and())
+        return expr
+
+    def parse_and(self):
+        expr = self.parse_not()
+        while self.accept_kw('AND'):
+            expr = ('and', expr, self.parse_not())
+        return expr
+
+    def parse_not(self):
+        if self.accept_kw('NOT'):
+            return ('not', self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        expr = self.parse_additive()
+        while True:
+            token = self.peek()
+            if token.kind == 'op' and token.value in ('=', '<>', '<', '>', '<=', '>=', '=~'):
+                self.next()
+                expr = ('cmp', token.value, expr, self.parse_additive())
+            elif self.accept_kw('IN'):
+                expr = ('in', expr, self.parse_additive())
+            elif self.accept_kw('CONTAINS'):
+                expr = ('strop', 'contains', expr, self.parse_additive())
+            elif self.accept_kw('STARTS', 'WITH'):
+                expr = ('strop', 'starts', expr, self.parse_additive())
+            elif self.accept_kw('ENDS', 'WITH'):
+                expr = ('strop', 'ends', expr, self.parse_additive())
+            elif self.accept_kw('IS', 'NOT', 'NULL'):
+                expr = ('isnull', expr, True)
+            elif self.accept_kw('IS', 'NULL'):
+                expr = ('isnull', expr, False)
+            else:
+                return expr
+
+    def parse_additive(self):
+        expr = self.parse_multiplicative()
+        while self.is_op('+') or self.is_op('-'):
+            expr = ('arith', self.next().value, expr, self.parse_multiplicative())
+        return expr
+
+    def parse_multiplicative(self):
+        expr = self.parse_unary()
+        while self.is_op('*') or self.is_op('/') or self.is_op('%'):
+            expr = ('arith', self.next().value, expr, self.parse_unary())
+        return expr
+
+    def parse_unary(self):
+        if self.accept_op('-'):
+            return ('neg', self.parse_unary())
+        expr = self.parse_atom()
+        while True:
+            if self.accept_op('.'):
+                expr = ('prop', expr, self.expect_ident())
+            elif self.accept_op('['):
+                index = self.parse_expression()
+                self.expect_op(']')
+                expr = ('index', expr, index)
+            else:
+                return expr
+
+    def parse_atom(self):
+        token = self.peek()
+        if token.kind in ('string', 'number'):
+            self.next()
+            return ('lit', token.value)
+        if token.kind == 'param':
+            self.next()
+            return ('param', token.value)
+        if self.accept_op('('):
+            expr = self.parse_expression()
+            self.expect_op(')')
+            return expr
+        if self.accept_op('['):
+            items = []
+            if not self.is_op(']'):
+                items.append(self.parse_expression())
+                while self.accept_op(','):
+                    items.append(self.parse_expression())
+            self.expect_op(']')
+            return ('list', tuple(items))
+        if self.is_op('{'):
+            return ('map', self.parse_map())
+        if token.kind == 'ident':
+            upper = token.value.upper()
+            if upper in ('TRUE', 'FALSE', 'NULL') and not self.is_op('(', 1):
+                self.next()
+                return ('lit', {'TRUE': True, 'FALSE': False, 'NULL': None}[upper])
+            if upper in ('CASE', 'EXISTS'):
+                self.error(f'unsupported expression {upper}')
+            self.next()
+            if self.accept_op('('):
+                return self.parse_call(token.value.lower())
+            return ('var', token.value)
+        self.error('expected expression')
+
+    def parse_call(self, name):
+        if self.accept_op('*'):
+            self.expect_op(')')
+            if name != 'count':
+                self.error('only count(*) accepts *')
+            return ('call', name, False, None)
+        distinct = self.accept_kw('DISTINCT')
+        args = []
+        if not self.is_op(')'):
+            args.append(self.parse_expression())
+            while self.accept_op(','):
+                args.append(self.parse_expression())
+        self.expect_op(')')
+        return ('call', name, distinct, tuple(args))
+
+
+@lru_cache(maxsize=512)
+def parse_query(query: str) -> Query:
+    """Parse a read-only openCypher query; the AST is cached per query text and must not be mutated."""
+    return CypherParser(query).parse()
+
+
+def children(expr):
+    """Direct sub-expressions of an expression."""
+    kind = expr[0]
+    if kind in ('lit', 'param', 'var'):
+        return ()
+    if kind == 'list':
+        return expr[1]
+    if kind == 'map':
+        return tuple(value for _, value in expr[1])
+    if kind == 'call':
+        return expr[3] or ()
+    if kind in ('prop', 'not', 'neg', 'isnull'):
+        return (expr[1],)
+    if kind in ('cmp', 'strop', 'arith'):
+        return (expr[2], expr[3])
+    return (expr[1], expr[2])  # and, or, in, index
+
+
+def is_aggregate(expr) -> bool:
+    return expr[0] == 'call' and expr[1] in AGGREGATE_FUNCTIONS
+
+
+def contains_aggregate(expr) -> bool:
+    return is_aggregate(expr) or any(contains_aggregate(child) for child in children(expr))
+
+
+def expression_vars(expr) -> set:
+    """Variables referenced by an expression."""
+    if expr[0] == 'var':
+        return {expr[1]}
+    names = set()
+    for child in children(expr):
+        names |= expression_vars(child)
+    return names
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from typing import Callable, Dict, Iterable, List
+
+import yaml
+from yaml.loader import SafeLoader
+
+from database.graph_export import iter_vertices, iter_edges
+from database.neptune_loader import NeptuneBulkLoader
+from utils.logging import getLogger
+
+logger = getLogger()
+
+MANIFEST_VERSION = 1
+
+
+def _timestamp(properties: dict):
+    try:
+        return int(float(properties.get('etl_timestamp')))
+    except (TypeError, ValueError):
+        return None
+
+
+def record_fingerprint(record: dict) -> str:
+    """Hash of everything a record writes to the graph except etl_timestamp, which moves on every export."""
+    content = {key: value for key, value in record['properties'].items() if key != 'etl_timestamp'}
+    source = [record['label'], record.get('src'), record.get('dst'), content]
+    return hashlib.sha1(json.dumps(source, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class SyncManifest:
+    """
+    State of the last applied export: for every vertex, edge and Q&A sample its content hash, its label
+    and its etl_timestamp, as {section: {id: [hash, label, etl_timestamp]}}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sections: Dict[str, Dict[str, list]] = {}
+        if path and os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            if state.get('version') == MANIFEST_VERSION:
+                self.sections = state.get('sections', {})
+
+    def section(self, name) -> Dict[str, list]:
+        return self.sections.get(name, {})
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': MANIFEST_VERSION, 'saved_at': int(time.time()), 'sections': self.sections}, file)
+        os.replace(tmp_path, self.path)
+
+
+class Delta:
+    def __init__(self, name):
+        self.name = name
+        self.inserts: List[dict] = []
+        self.updates: List[dict] = []
+        self.deletes: List[dict] = []  # {'id', 'label'}
+        self.unchanged = 0
+        self.stale = 0
+        self.entries: Dict[str, list] = {}  # 应用成功后写入清单的新状态
+
+    @property
+    def changed(self) -> int:
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def summary(self) -> dict:
+        return {'inserts': len(self.inserts), 'updates': len(self.updates), 'deletes': len(self.deletes),
+                'unchanged': self.unchanged, 'stale': self.stale}
+
+
+def compute_delta(name, records: Iterable[dict], previous: Dict[str, list],
+                  fingerprint: Callable[[dict], str] = record_fingerprint) -> Delta:
+    """
+    Compare a full export with the manifest of the last sync
+    :param records: Every record of the new export, each with 'id', 'label' and 'properties'
+    :param previous: Manifest section of the last sync {id: [hash, label, etl_timestamp]}
+    :return: Delta holding only the changed records. A record whose etl_timestamp is older than the one
+             already applied is stale and skipped, so an out-of-order export never overwrites newer data.
+    """
+    delta = Delta(name)
+    for record in records:
+        record_id = record['id']
+        if record_id in delta.entries:
+            continue  # 同一导出中的重复行, 以第一次出现为准
+        timestamp = _timestamp(record['properties'])
+        entry = [fingerprint(record), record['label'], timestamp]
+        old = previous.get(record_id)
+        if old is None:
+            delta.inserts.append(record)
+        elif old[2] is not None and timestamp is not None and timestamp < old[2]:
+            delta.stale += 1
+            entry = old
+        elif old[0] != entry[0] or old[1] != entry[1]:
+            delta.updates.append(record)
+        else:
+            delta.unchanged += 1
+        delta.entries[record_id] = entry
+    delta.deletes = [{'id': record_id, 'label': old[1]} for record_id, old in previous.items() if record_id not in delta.entries]
+    return delta
+
+
+class DeltaSync:
+    """
+    Incremental refresh of the graph and vector stores from full vertex/edge (and Q&A sample) exports.
+
+    The new export is streamed once and compared with the manifest of the last sync by content hash, so
+    only inserted, updated and deleted records are written: batched UNWIND upserts and deletes to Neptune,
+    and re-embedding of the changed samples only. Profile documents (database.profile_materializer) are
+    rebuilt afterwards for the entities whose source rows changed. The manifest advances only for the
+    parts that were applied without failures, so an interrupted or failed sync is simply re-run.
+    """
+
+    def __init__(self, loader: NeptuneBulkLoader, manifest_path, indexer=None, materializer=None):
+        """
+        :param loader: Bulk loader bound to the Neptune writer endpoint
+        :param indexer: OpenSearchIndexer for the Q&A samples, required to sync samples
+        :param materializer: ProfileMaterializer, run after the graph changed
+        """
+        self.loader = loader
+        self.manifest = SyncManifest(manifest_path)
+        self.indexer = indexer
+        self.materializer = materializer
+
+    def plan(self, vertex_paths=(), edge_paths=(), samples_path=None) -> Dict[str, Delta]:
+        deltas = {}
+        if vertex_paths:
+            deltas['vertices'] = compute_delta('vertices', (v for path in vertex_paths for v in iter_vertices(path)),
+                                               self.manifest.section('vertices'))
+        if edge_paths:
+            deltas['edges'] = compute_delta('edges', (e for path in edge_paths for e in iter_edges(path)),
+                                            self.manifest.section('edges'))
+        if samples_path:
+            from database.opensearch_indexer import iter_records, make_doc_id
+            samples = (dict(record, id=make_doc_id(record), label=record['profile'], properties={'answer': record['answer']})
+                       for record in iter_records(samples_path))
+            deltas['samples'] = compute_delta('samples', samples, self.manifest.section('samples'))
+        for name, delta in deltas.items():
+            logger.info(f"Delta {name}: {delta.summary()}")
+        return deltas
+
+    @staticmethod
+    def _applied(*reports) -> bool:
+        return all(report.failed_rows == 0 for report in reports)
+
+    def _apply_graph(self, deltas) -> Dict[str, bool]:
+        applied = {}
+        vertices, edges = deltas.get('vertices'), deltas.get('edges')
+        # 顺序: 先写顶点, 边依赖两端顶点; 删除时 DETACH DELETE 会一并删除顶点上的边
+        if vertices is not None:
+            applied['vertices'] = self._applied(
+                self.loader.upsert_vertices(vertices.inserts, name='inserted vertices'),
+                self.loader.upsert_vertices(vertices.updates, replace=True, name='updated vertices'))
+        if edges is not None:
+            applied['edges'] = self._applied(
+                self.loader.upsert_edges(edges.inserts, name='inserted edges'),
+                self.loader.upsert_edges(edges.updates, replace=True, name='updated edges'),
+                self.loader.delete_edges(edges.deletes))
+        if vertices is not None:
+            applied['vertices'] = self._applied(self.loader.delete_vertices(vertices.deletes)) and applied['vertices']
+        return applied
+
+    def _apply_samples(self, delta) -> bool:
+        indexed, failed = 0, 0
+        changed = delta.inserts + delta.updates
+        batch_size = self.indexer.batch_size
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            try:
+                # 空文本与向量化失败的记录都计为失败, 同步结果不标记为成功
+                count, _ = self.indexer._index_batch(batch)
+            except Exception as e:
+                logger.error(f"Sample batch at {start} failed: {e}")
+                count = 0
+            indexed += count
+            failed += len(batch) - count
+        for record in delta.deletes:
+            try:
+                self.indexer.opensearch_dao.delete_sample(self.indexer.index_name, record['id'])
+            except Exception as e:
+                logger.error(f"Failed to delete sample {record['id']}: {e}")
+                failed += 1
+        logger.info(f"Samples: {indexed} re-embedded, {len(delta.deletes)} deleted, {failed} failed")
+        return failed == 0
+
+    def run(self, vertex_paths=(), edge_paths=(), samples_path=None, dry_run=False) -> Dict[str, dict]:
+        """
+        :param dry_run: Only compute and report the delta
+        :return: {section: delta summary plus 'applied'}
+        """
+        start_time = time.time()
+        deltas = self.plan(vertex_paths, edge_paths, samples_path)
+        if dry_run:
+            return {name: delta.summary() for name, delta in deltas.items()}
+
+        applied = self._apply_graph(deltas)
+        if 'samples' in deltas:
+            if self.indexer is None:
+                raise Exception("Syncing samples needs an OpenSearchIndexer")
+            applied['samples'] = self._apply_samples(deltas['samples'])
+
+        for name, delta in deltas.items():
+            if applied[name]:
+                self.manifest.sections[name] = delta.entries
+            else:
+                logger.error(f"Delta {name} had failures, the manifest keeps the previous state; re-run the sync")
+        self.manifest.save()
+
+        graph_changed = any(deltas[name].changed for name in ('vertices', 'edges') if name in deltas)
+        if graph_changed and self.materializer is not None:
+            self.materializer.run()
+
+        logger.info(f"Delta sync finished in {time.time() - start_time:.1f}s")
+        return {name: dict(delta.summary(), applied=applied[name]) for name, delta in deltas.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply only the changes of a new export to Neptune and OpenSearch')
+    parser.add_argument('--vertices', nargs='*', default=[], help='Full vertex export files (vid, attributes)')
+    parser.add_argument('--edges', nargs='*', default=[], help='Full edge export files (type, srcId, dstId, rank, attributes)')
+    parser.add_argument('--samples', help='Full Q&A sample file (JSONL or CSV with text, answer, profile)')
+    parser.add_argument('--endpoint', help='Neptune writer endpoint, required when vertices or edges change')
+    parser.add_argument('--port', type=int, default=8182)
+    parser.add_argument('--manifest', default='.cache/sync_manifest.json', help='State of the last applied export')
+    parser.add_argument('--config', default='config_files/aws_config.yaml')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows per UNWIND statement')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent requests to Neptune')
+    parser.add_argument('--profiles', action='store_true', help='Rebuild changed entity profile documents afterwards')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the delta')
+    args = parser.parse_args()
+
+    from database.neptune import NeptuneGraphDB
+    if (args.vertices or args.edges or args.profiles) and not args.endpoint and not args.dry_run:
+        parser.error('--endpoint is required to sync vertices, edges or profiles')
+    neptune_db = NeptuneGraphDB(args.endpoint, args.port, pool_maxsize=args.workers, read_timeout=300) if args.endpoint else None
+    loader = NeptuneBulkLoader(neptune_db, batch_size=args.batch_size, workers=args.workers)
+
+    indexer, materializer = None, None
+    if args.samples or args.profiles:
+        from core.chat_service import ChatService
+        from database.opensearch_indexer import OpenSearchIndexer
+        from database.profile_materializer import ProfileMaterializer
+        from llm.embedding import TitanEmbeddings
+        from llm.embedding_cache import EmbeddingCache
+
+        with open(args.config) as file:
+            aws_config = yaml.load(file, Loader=SafeLoader)
+        embedding_cache_info = aws_config.get('embedding_cache_info', {})
+        titan_embeddings = TitanEmbeddings(
+            cache=EmbeddingCache(embedding_cache_info.get('cache_dir', '.cache/embeddings'))
+            if embedding_cache_info.get('enabled', False) else None
+        )
+        vector_dao = ChatService.create_vector_dao(aws_config, 4)
+        dimensions = aws_config.get('opensearch_info', {}).get('embedding_dimension', 256)
+        indexer = OpenSearchIndexer(vector_dao, titan_embeddings, dimensions=dimensions)
+        if args.profiles:
+            profile_info = aws_config.get('entity_profile_info', {})
+            materializer = ProfileMaterializer(
+                neptune_db, vector_dao, titan_embeddings,
+                index_name=profile_info.get('index_name', 'text_neptune'), dimensions=dimensions,
+                manifest_path=profile_info.get('manifest_path', '.cache/entity_profiles.json')
+            )
+
+    result = DeltaSync(loader, args.manifest, indexer, materializer).run(args.vertices, args.edges, args.samples, args.dry_run)
+    logger.info(f"Delta sync: {result}")
+
+
+# 使用示例: python -m database.delta_sync --vertices export/vertex.csv --edges export/edge.csv --endpoint <writer-endpoint> --profiles
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from database.graph_export import iter_vertices
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# 数值列 (导出中多为字符串), 缺失值为 NaN
+NUMERIC_COLUMNS = [
+    'nav_grw_r1w', 'nav_grw_r1m', 'nav_grw_r3m', 'nav_grw_ty', 'nav_grw_r1y', 'nav_grw_r3y', 'nav_grw_r5y',
+    'nav_grw_td', 'nav_grw_base', 'nav_grw_p1y', 'nav_grw_p2y', 'nav_grw_p3y', 'annual_return_base',
+    'max_draw_down_base', 'risk_eva_level', 'rating_star', 'totshare', 'unit_nav', 'hot_value',
+]
+# 字典编码的分类列
+CATEGORICAL_COLUMNS = [
+    'fund_type', 'fund_2_type', 'fproperty', 'primary_classification', 'secondary_classification',
+    'third_classification', 'fourth_classification', 'trustee_name',
+]
+# 原样保存、只用于输出的列
+LABEL_COLUMNS = ['fund_name', 'fund_code']
+
+FUND_PAGE_QUERY = "MATCH (f:Fund) RETURN f ORDER BY id(f) SKIP $skip LIMIT $limit"
+
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'in')
+
+
+def _number(value) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) else math.nan
+
+
+class FundMetricsStore:
+    """
+    Typed, columnar snapshot of the Fund vertices: float64 arrays for the metrics and int32 codes plus a
+    dictionary for the categorical fields. filter / sort / top-k / aggregate run as vectorized NumPy
+    operations over all funds, so ranking questions need no graph round trip.
+    """
+
+    def __init__(self, records: Iterable[Tuple[str, dict]] = ()):
+        """:param records: (fund id, Fund properties) pairs"""
+        ids = []
+        numeric = {column: [] for column in NUMERIC_COLUMNS}
+        codes = {column: [] for column in CATEGORICAL_COLUMNS}
+        labels = {column: [] for column in LABEL_COLUMNS}
+        self.dictionaries: Dict[str, List[str]] = {column: [] for column in CATEGORICAL_COLUMNS}
+        lookups: Dict[str, Dict[str, int]] = {column: {} for column in CATEGORICAL_COLUMNS}
+        for fund_id, properties in records:
+            ids.append(fund_id)
+            for column in NUMERIC_COLUMNS:
+                numeric[column].append(_number(properties.get(column)))
+            for column in CATEGORICAL_COLUMNS:
+                value = properties.get(column)
+                if value is None or value == '':
+                    codes[column].append(-1)
+                    continue
+                lookup = lookups[column]
+                if value not in lookup:
+                    lookup[value] = len(self.dictionaries[column])
+                    self.dictionaries[column].append(str(value))
+                codes[column].append(lookup[value])
+            for column in LABEL_COLUMNS:
+                labels[column].append(properties.get(column))
+
+        self.ids = np.asarray(ids, dtype=object)
+        self.numeric = {column: np.asarray(values, dtype=np.float64) for column, values in numeric.items()}
+        self.codes = {column: np.asarray(values, dtype=np.int32) for column, values in codes.items()}
+        self.labels = {column: np.asarray(values, dtype=object) for column, values in labels.items()}
+        self._lookups = lookups
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_exports(cls, vertex_paths: Sequence[str]) -> 'FundMetricsStore':
+        return cls((v['id'], v['properties']) for path in vertex_paths for v in iter_vertices(path) if v['label'] == 'Fund')
+
+    @classmethod
+    def from_graph(cls, graph_db, page_size=5000) -> 'FundMetricsStore':
+        def records():
+            skip = 0
+            while True:
+                rows = graph_db.execute_opencypher_query(FUND_PAGE_QUERY, {'skip': skip, 'limit': page_size}).get('results', [])
+                for row in rows:
+                    yield row['f']['~id'], row['f'].get('~properties', {})
+                if len(rows) < page_size:
+                    return
+                skip += page_size
+        return cls(records())
+
+    def columns(self) -> List[str]:
+        return NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + LABEL_COLUMNS
+
+    def values(self, column) -> np.ndarray:
+        """Decoded column values (categoricals as strings, None when missing)."""
+        if column in self.numeric:
+            return self.numeric[column]
+        if column in self.codes:
+            dictionary = np.asarray(self.dictionaries[column] + [None], dtype=object)
+            return dictionary[self.codes[column]]  # 缺失值编码为 -1, 对应末尾的 None
+        if column in self.labels:
+            return self.labels[column]
+        if column == 'id':
+            return self.ids
+        raise KeyError(f"Unknown fund metric column {column}")
+
+    def mask(self, filters: Optional[List[tuple]] = None) -> np.ndarray:
+        """
+        :param filters: [(column, operator, value)], combined with AND; operators are =, !=, <, <=, >, >=, in.
+                        Categorical columns support = , != and in; comparisons with a missing value are false.
+        """
+        selected = np.ones(len(self.ids), dtype=bool)
+        for column, operator, value in filters or []:
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator {operator}")
+            if column in self.codes:
+                lookup = self._lookups[column]
+                wanted = value if operator == 'in' else [value]
+                # 在字典中查出编码后比较整数, 不逐行比较字符串
+                matches = np.isin(self.codes[column], [lookup[v] for v in wanted if v in lookup])
+                if operator in ('=', 'in'):
+                    selected &= matches
+                elif operator == '!=':
+                    selected &= ~matches & (self.codes[column] >= 0)
+                else:
+                    raise ValueError(f"Operator {operator} is not supported on categorical column {column}")
+                continue
+            values = self.numeric[column]
+            if operator == 'in':
+                selected &= np.isin(values, [_number(v) for v in value])
+            else:
+                number = _number(value)
+                selected &= {
+                    '=': values == number, '!=': (values != number) & ~np.isnan(values),
+                    '<': values < number, '<=': values <= number, '>': values > number, '>=': values >= number,
+                }[operator]
+        return selected
+
+    def top_k(self, order_by: str, descending=True, limit=10, filters=None) -> np.ndarray:
+        """
+        :return: Row indexes of the best `limit` filtered funds by order_by, best first; funds missing the
+                 value are never ranked
+        """
+        rows = np.flatnonzero(self.mask(filters) & ~np.isnan(self.numeric[order_by]))
+        keys = self.numeric[order_by][rows]
+        keys = -keys if descending else keys
+        if limit is not None and limit < len(rows):
+            partition = np.argpartition(keys, limit - 1)[:limit]
+            rows, keys = rows[partition], keys[partition]
+        return rows[np.argsort(keys, kind='stable')]
+
+    def select(self, filters=None, order_by=None, descending=True, limit=10, columns=None) -> List[dict]:
+        """
+        :param columns: Columns to return (default: name, code and every column used by the query)
+        :return: One dict per fund, including its 'id'
+        """
+        if order_by is not None:
+            rows = self.top_k(order_by, descending, limit, filters)
+        else:
+            rows = np.flatnonzero(self.mask(filters))[:limit]
+        if columns is None:
+            columns = list(dict.fromkeys(LABEL_COLUMNS + ([order_by] if order_by else []) + [f[0] for f in filters or []]))
+        decoded = {column: self.values(column)[rows] for column in columns}
+        results = []
+        for i, row in enumerate(rows):
+            result = {'id': self.ids[row]}
+            for column in columns:
+                value = decoded[column][i]
+                if isinstance(value, np.generic):
+                    value = value.item()
+                result[column] = None if isinstance(value, float) and math.isnan(value) else value
+            results.append(result)
+        return results
+
+    def aggregate(self, column, function='mean', filters=None, group_by=None):
+        """
+        :param function: count, mean, min, max, sum or median over the non-missing values
+        :param group_by: Categorical column; the result is then {group value: aggregate}
+        """
+        reducers = {'count': len, 'mean': np.mean, 'min': np.min, 'max': np.max, 'sum': np.sum, 'median': np.median}
+        reducer = reducers[function]
+        selected = self.mask(filters) & ~np.isnan(self.numeric[column])
+
+        def reduce(rows_mask):
+            values = self.numeric[column][rows_mask]
+            return float(reducer(values)) if len(values) else None
+
+        if group_by is None:
+            return reduce(selected)
+        codes = self.codes[group_by]
+        return {value: reduce(selected & (codes == code)) for code, value in enumerate(self.dictionaries[group_by])
+                if np.any(selected & (codes == code))}
+
+
+if __name__ == "__main__":
+    store = FundMetricsStore.from_exports(['data_example/vertex.csv'])
+    logger.info(f"{len(store)} funds")
+    logger.info(store.select([('secondary_classification', '=', '主动偏股')], order_by='nav_grw_r1y', limit=3))
+    logger.info(store.select([('risk_eva_level', '=', 4), ('max_draw_down_base', '<', 57.5)], order_by='max_draw_down_base', descending=False))
+    logger.info(store.aggregate('nav_grw_r1y', 'mean', group_by='fund_2_type'))
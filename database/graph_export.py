@@ -0,0 +1,129 @@
+import re
+import csv
+import sys
+import json
+from typing import Dict, Iterator
+
+# 导出文件中属性前缀与图数据库中顶点标签的对应关系
+LABEL_BY_PREFIX = {
+    'funds_manager': 'FundManager',
+    'funds_outside': 'Fund',
+}
+
+# 导出时以字符串保存的数值属性
+PROPERTY_TYPES = {
+    'experiencetime': float,
+}
+
+NULL_VALUES = ('NULL', '__NULL__', '')
+
+# properties(VERTEX) 格式的导出没有 vid 列和属性前缀: 以这些属性作为顶点 ID 并确定标签
+ID_PROPERTIES = {
+    'personalcode': 'FundManager',
+    'symbol': 'Fund',
+}
+
+# properties(VERTEX) 列中的 {key: value, ...}: 值为带引号的字符串、数字或 __NULL__ 等标识符
+_MAP_ENTRY = re.compile(r'\s*([A-Za-z_][\w.]*)\s*:\s*("(?:[^"\\]|\\.)*"|[^,}]*?)\s*(?:,|(?=}))')
+
+csv.field_size_limit(sys.maxsize)
+
+
+def _typed(key, value):
+    if isinstance(value, str) and value in NULL_VALUES:
+        return None
+    cast = PROPERTY_TYPES.get(key)
+    if cast is not None:
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return value
+    return value
+
+
+def flatten_attributes(attributes: str, label_by_prefix: Dict[str, str] = None):
+    """
+    Flatten the JSON attributes column of an export row
+    :param attributes: JSON object with optionally prefixed keys, e.g. {"funds_outside.nav_grw_p1y": -9.09}
+    :param label_by_prefix: Mapping from key prefix to vertex label
+    :return: (label, properties) with prefixes stripped and NULL values dropped; label is None for unprefixed keys
+    """
+    label_by_prefix = label_by_prefix or LABEL_BY_PREFIX
+    label = None
+    properties = {}
+    for key, value in json.loads(attributes).items():
+        prefix, _, name = key.rpartition('.')
+        if prefix:
+            label = label_by_prefix.get(prefix, prefix)
+        value = _typed(name, value)
+        if value is not None:
+            properties[name] = value
+    return label, properties
+
+
+def parse_properties(text: str) -> Dict[str, object]:
+    """
+    Parse the properties(VERTEX) column of a console export
+    :param text: Map literal, e.g. {chinesename: "张雪松", experiencetime: "6.0", company: __NULL__}
+    :return: Properties with NULL values dropped
+    """
+    body = text.strip()
+    if not (body.startswith('{') and body.endswith('}')):
+        raise ValueError(f"Not a properties map: {text[:80]}")
+    properties, position = {}, 1
+    while position < len(body) - 1:
+        match = _MAP_ENTRY.match(body, position)
+        if match is None:
+            raise ValueError(f"Cannot parse properties at {body[position:position + 80]!r}")
+        key, raw = match.group(1), match.group(2)
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw  # __NULL__ 等标识符
+        value = _typed(key, value)
+        if value is not None:
+            properties[key] = value
+        position = match.end()
+    return properties
+
+
+def iter_vertices(path: str, label_by_prefix: Dict[str, str] = None) -> Iterator[dict]:
+    """
+    Stream vertices from a vertex export. Two layouts are read: (vid, attributes) with prefixed JSON attributes,
+    and a single properties(VERTEX) column, whose id and label come from the ID_PROPERTIES property
+    :return: Iterator of {'id', 'label', 'properties'}
+    """
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        rows = csv.DictReader(file)
+        columns = rows.fieldnames or []
+        if 'vid' in columns and 'attributes' in columns:
+            for row in rows:
+                label, properties = flatten_attributes(row['attributes'], label_by_prefix)
+                yield {'id': row['vid'], 'label': label, 'properties': properties}
+        elif 'properties(VERTEX)' in columns:
+            for line_number, row in enumerate(rows, 2):
+                properties = parse_properties(row['properties(VERTEX)'])
+                id_property = next((name for name in ID_PROPERTIES if name in properties), None)
+                if id_property is None:
+                    raise ValueError(f"{path}:{line_number}: vertex has none of the id properties {list(ID_PROPERTIES)}")
+                yield {'id': str(properties[id_property]), 'label': ID_PROPERTIES[id_property], 'properties': properties}
+        else:
+            raise ValueError(f"{path}: unsupported vertex export columns {columns}, "
+                             f"expected (vid, attributes) or (properties(VERTEX))")
+
+
+def iter_edges(path: str) -> Iterator[dict]:
+    """
+    Stream edges from an edge export (columns: type, srcId, dstId, rank, attributes)
+    :return: Iterator of {'id', 'label', 'src', 'dst', 'properties'}
+    """
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        for row in csv.DictReader(file):
+            _, properties = flatten_attributes(row['attributes'])
+            yield {
+                'id': f"{row['type']}:{row['srcId']}:{row['dstId']}:{row['rank']}",
+                'label': row['type'],
+                'src': row['srcId'],
+                'dst': row['dstId'],
+                'properties': properties
+            }
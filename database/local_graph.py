@@ -0,0 +1,670 @@
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from database.cypher_parser import parse_query, is_aggregate, contains_aggregate, expression_vars
+from database.graph_export import iter_vertices, iter_edges
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+class NodeRef:
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, NodeRef) and other.index == self.index
+
+    def __hash__(self):
+        return hash(('node', self.index))
+
+
+class RelRef:
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, RelRef) and other.index == self.index
+
+    def __hash__(self):
+        return hash(('rel', self.index))
+
+
+class GraphData:
+    """
+    Immutable, array-backed graph snapshot.
+
+    Nodes and edges are dense integers. Labels and relationship types are interned into small
+    integer codes, properties are stored column-wise (one list per property name, None when absent),
+    and adjacency is kept in CSR form for both directions: the edges leaving node i are
+    out_edges[out_offsets[i]:out_offsets[i + 1]].
+    """
+
+    def __init__(self, vertices, edges):
+        self.node_ids: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        self.label_names: List[str] = []
+        self.node_properties: Dict[str, list] = {}
+        node_labels = []
+
+        label_codes = {}
+        for vertex in vertices:
+            if vertex['id'] in self.node_index:
+                continue
+            node = len(self.node_ids)
+            self.node_index[vertex['id']] = node
+            self.node_ids.append(sys.intern(vertex['id']))
+            node_labels.append(label_codes.setdefault(vertex['label'], len(label_codes)))
+            self._append_properties(self.node_properties, node, vertex['properties'])
+        self.label_names = [label for label, _ in sorted(label_codes.items(), key=lambda item: item[1])]
+        self.node_labels = np.asarray(node_labels, dtype=np.int16)
+        self.nodes_by_label = {code: np.flatnonzero(self.node_labels == code) for code in range(len(self.label_names))}
+
+        self.edge_ids: List[str] = []
+        self.edge_properties: Dict[str, list] = {}
+        type_codes = {}
+        edge_src, edge_dst, edge_types = [], [], []
+        skipped = 0
+        for edge in edges:
+            src, dst = self.node_index.get(edge['src']), self.node_index.get(edge['dst'])
+            if src is None or dst is None:
+                skipped += 1
+                continue
+            index = len(self.edge_ids)
+            self.edge_ids.append(edge['id'])
+            edge_src.append(src)
+            edge_dst.append(dst)
+            edge_types.append(type_codes.setdefault(edge['label'], len(type_codes)))
+            self._append_properties(self.edge_properties, index, edge['properties'])
+        if skipped:
+            logger.warning(f"Skipped {skipped} edges with unknown endpoints")
+        self.type_names = [name for name, _ in sorted(type_codes.items(), key=lambda item: item[1])]
+        self.edge_src = np.asarray(edge_src, dtype=np.int32)
+        self.edge_dst = np.asarray(edge_dst, dtype=np.int32)
+        self.edge_types = np.asarray(edge_types, dtype=np.int16)
+
+        node_count = len(self.node_ids)
+        self.out_offsets, self.out_edges = self._csr(self.edge_src, node_count)
+        self.in_offsets, self.in_edges = self._csr(self.edge_dst, node_count)
+
+        self._property_indexes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _append_properties(columns, row, properties):
+        for column in columns.values():
+            column.append(None)
+        for name, value in properties.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = [None] * (row + 1)
+            column[row] = sys.intern(value) if isinstance(value, str) and len(value) < 64 else value
+
+    @staticmethod
+    def _csr(keys, node_count):
+        order = np.argsort(keys, kind='stable').astype(np.int32)
+        counts = np.bincount(keys, minlength=node_count) if len(keys) else np.zeros(node_count, dtype=np.int64)
+        offsets = np.zeros(node_count + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, order
+
+    def label_code(self, label):
+        try:
+            return self.label_names.index(label)
+        except ValueError:
+            return None
+
+    def type_code(self, name):
+        try:
+            return self.type_names.index(name)
+        except ValueError:
+            return None
+
+    def node_property(self, node, name):
+        if name == '~id':
+            return self.node_ids[node]
+        column = self.node_properties.get(name)
+        return column[node] if column is not None else None
+
+    def edge_property(self, edge, name):
+        if name == '~id':
+            return self.edge_ids[edge]
+        column = self.edge_properties.get(name)
+        return column[edge] if column is not None else None
+
+    def nodes_with_property(self, name, value):
+        """Nodes whose property equals value, through a hash index built on first use."""
+        if name == '~id':
+            node = self.node_index.get(value) if isinstance(value, str) else None
+            return [node] if node is not None else []
+        index = self._property_indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._property_indexes.get(name)
+                if index is None:
+                    index = {}
+                    for node, item in enumerate(self.node_properties.get(name, ())):
+                        if item is not None and not isinstance(item, (list, dict)):
+                            index.setdefault(item, []).append(node)
+                    self._property_indexes[name] = index
+        try:
+            return index.get(value, [])
+        except TypeError:
+            return []
+
+    def adjacent(self, node, direction):
+        """Yield (edge, other node) pairs for the edges of node in the given direction."""
+        if direction in ('out', 'both'):
+            edges = self.out_edges[self.out_offsets[node]:self.out_offsets[node + 1]].tolist()
+            for edge, other in zip(edges, self.edge_dst[edges].tolist()):
+                yield edge, other
+        if direction in ('in', 'both'):
+            edges = self.in_edges[self.in_offsets[node]:self.in_offsets[node + 1]].tolist()
+            for edge, other in zip(edges, self.edge_src[edges].tolist()):
+                if direction == 'both' and other == node and self.edge_dst[edge] == node:
+                    continue  # self loop already yielded as outgoing
+                yield edge, other
+
+    def node_to_result(self, node):
+        properties = {name: column[node] for name, column in self.node_properties.items() if column[node] is not None}
+        return {'~id': self.node_ids[node], '~entityType': 'node',
+                '~labels': [self.label_names[self.node_labels[node]]], '~properties': properties}
+
+    def edge_to_result(self, edge):
+        properties = {name: column[edge] for name, column in self.edge_properties.items() if column[edge] is not None}
+        return {'~id': self.edge_ids[edge], '~entityType': 'relationship',
+                '~start': self.node_ids[self.edge_src[edge]], '~end': self.node_ids[self.edge_dst[edge]],
+                '~type': self.type_names[self.edge_types[edge]], '~properties': properties}
+
+
+class _Executor:
+    def __init__(self, graph: GraphData, query, parameters):
+        self.graph = graph
+        self.query = query
+        self.parameters = parameters or {}
+
+    # expression evaluation
+    def evaluate(self, expr, binding):
+        kind = expr[0]
+        if kind == 'lit':
+            return expr[1]
+        if kind == 'param':
+            if expr[1] not in self.parameters:
+                raise Exception(f"Missing parameter ${expr[1]}")
+            return self.parameters[expr[1]]
+        if kind == 'var':
+            if expr[1] not in binding:
+                raise Exception(f"Variable {expr[1]} not defined")
+            return binding[expr[1]]
+        if kind == 'prop':
+            target = self.evaluate(expr[1], binding)
+            if isinstance(target, NodeRef):
+                return self.graph.node_property(target.index, expr[2])
+            if isinstance(target, RelRef):
+                return self.graph.edge_property(target.index, expr[2])
+            if isinstance(target, dict):
+                return target.get(expr[2])
+            return None
+        if kind == 'and':
+            left = self.evaluate(expr[1], binding)
+            if left is False:
+                return False
+            right = self.evaluate(expr[2], binding)
+            if right is False:
+                return False
+            return None if left is None or right is None else True
+        if kind == 'or':
+            left = self.evaluate(expr[1], binding)
+            if left is True:
+                return True
+            right = self.evaluate(expr[2], binding)
+            if right is True:
+                return True
+            return None if left is None or right is None else False
+        if kind == 'not':
+            value = self.evaluate(expr[1], binding)
+            return None if value is None else not value
+        if kind == 'cmp':
+            return self._compare(expr[1], self.evaluate(expr[2], binding), self.evaluate(expr[3], binding))
+        if kind == 'in':
+            value, items = self.evaluate(expr[1], binding), self.evaluate(expr[2], binding)
+            if value is None or items is None:
+                return None
+            return value in items
+        if kind == 'strop':
+            value, other = self.evaluate(expr[2], binding), self.evaluate(expr[3], binding)
+            if not isinstance(value, str) or not isinstance(other, str):
+                return None
+            if expr[1] == 'contains':
+                return other in value
+            return value.startswith(other) if expr[1] == 'starts' else value.endswith(other)
+        if kind == 'isnull':
+            value = self.evaluate(expr[1], binding)
+            return (value is not None) if expr[2] else (value is None)
+        if kind == 'arith':
+            left, right = self.evaluate(expr[2], binding), self.evaluate(expr[3], binding)
+            if left is None or right is None:
+                return None
+            if expr[1] == '+':
+                return left + right
+            if expr[1] == '-':
+                return left - right
+            if expr[1] == '*':
+                return left * right
+            if expr[1] == '/':
+                return left // right if isinstance(left, int) and isinstance(right, int) else left / right
+            return left % right
+        if kind == 'neg':
+            value = self.evaluate(expr[1], binding)
+            return None if value is None else -value
+        if kind == 'list':
+            return [self.evaluate(item, binding) for item in expr[1]]
+        if kind == 'map':
+            return {key: self.evaluate(value, binding) for key, value in expr[1]}
+        if kind == 'index':
+            target, index = self.evaluate(expr[1], binding), self.evaluate(expr[2], binding)
+            if target is None or index is None:
+                return None
+            try:
+                return target[index]
+            except (IndexError, KeyError, TypeError):
+                return None
+        if kind == 'call':
+            if is_aggregate(expr):
+                raise Exception(f"Aggregate {expr[1]}() is only supported as a RETURN item")
+            return self._call(expr[1], [self.evaluate(arg, binding) for arg in expr[3]])
+        raise Exception(f"Unsupported expression {kind}")
+
+    @staticmethod
+    def _compare(op, left, right):
+        if left is None or right is None:
+            return None
+        if op == '=~':
+            return isinstance(left, str) and isinstance(right, str) and re.fullmatch(right, left) is not None
+        if op == '=':
+            return left == right
+        if op == '<>':
+            return left != right
+        try:
+            if op == '<':
+                return left < right
+            if op == '>':
+                return left > right
+            if op == '<=':
+                return left <= right
+            return left >= right
+        except TypeError:
+            return None
+
+    def _call(self, name, args):
+        value = args[0] if args else None
+        if name == 'id':
+            if isinstance(value, NodeRef):
+                return self.graph.node_ids[value.index]
+            return self.graph.edge_ids[value.index] if isinstance(value, RelRef) else None
+        if name == 'labels':
+            return [self.graph.label_names[self.graph.node_labels[value.index]]] if isinstance(value, NodeRef) else None
+        if name == 'type':
+            return self.graph.type_names[self.graph.edge_types[value.index]] if isinstance(value, RelRef) else None
+        if name == 'properties':
+            if isinstance(value, NodeRef):
+                return self.graph.node_to_result(value.index)['~properties']
+            return self.graph.edge_to_result(value.index)['~properties'] if isinstance(value, RelRef) else value
+        if name == 'coalesce':
+            return next((arg for arg in args if arg is not None), None)
+        if value is None:
+            return None
+        if name == 'tolower':
+            return str(value).lower()
+        if name == 'toupper':
+            return str(value).upper()
+        if name == 'tostring':
+            return str(value)
+        if name in ('tointeger', 'tofloat'):
+            try:
+                return int(float(value)) if name == 'tointeger' else float(value)
+            except (TypeError, ValueError):
+                return None
+        if name in ('size', 'length'):
+            return len(value)
+        if name == 'trim':
+            return str(value).strip()
+        if name == 'abs':
+            return abs(value)
+        if name == 'round':
+            return float(round(value))
+        raise Exception(f"Unsupported function {name}()")
+
+    # pattern matching
+    def _conjuncts(self, expr):
+        if expr is None:
+            return []
+        if expr[0] == 'and':
+            return self._conjuncts(expr[1]) + self._conjuncts(expr[2])
+        return [expr]
+
+    def _lookup_values(self, node_pattern, conjuncts):
+        """Equality predicates usable for an index lookup on a node: [(property, value expression)]."""
+        lookups = [(key, value) for key, value in node_pattern.props if not expression_vars(value)]
+        for conjunct in conjuncts:
+            if conjunct[0] != 'cmp' or conjunct[1] != '=':
+                continue
+            for target, value in ((conjunct[2], conjunct[3]), (conjunct[3], conjunct[2])):
+                if expression_vars(value):
+                    continue
+                if target[0] == 'prop' and target[1] == ('var', node_pattern.var):
+                    lookups.append((target[2], value))
+                elif target[0] == 'call' and target[1] == 'id' and target[3] == (('var', node_pattern.var),):
+                    lookups.append(('~id', value))
+        return lookups
+
+    def _plan(self):
+        """
+        Flatten the MATCH paths into scan/expand steps. Each path is anchored at the node with the
+        most selective index lookup (or an already bound variable) and expanded in both directions.
+        """
+        conjuncts = self._conjuncts(self.query.where)
+        steps, bound = [], set()
+        for path in self.query.paths:
+            best, best_cost, best_lookup = 0, None, None
+            for position, node_pattern in enumerate(path.nodes):
+                lookup = None
+                if node_pattern.var in bound:
+                    cost = 0
+                else:
+                    cost = self._label_size(node_pattern)
+                    for name, value_expr in self._lookup_values(node_pattern, conjuncts):
+                        candidates = self.graph.nodes_with_property(name, self.evaluate(value_expr, {}))
+                        if len(candidates) < cost:
+                            cost, lookup = len(candidates), candidates
+                if best_cost is None or cost < best_cost:
+                    best, best_cost, best_lookup = position, cost, lookup
+            steps.append(('scan', path.nodes[best], best_lookup))
+            bound.add(path.nodes[best].var)
+            for position in range(best, len(path.nodes) - 1):
+                steps.append(('expand', path.nodes[position].var, path.rels[position], path.rels[position].direction, path.nodes[position + 1]))
+                bound.update((path.rels[position].var, path.nodes[position + 1].var))
+            reverse = {'out': 'in', 'in': 'out', 'both': 'both'}
+            for position in range(best, 0, -1):
+                steps.append(('expand', path.nodes[position].var, path.rels[position - 1], reverse[path.rels[position - 1].direction], path.nodes[position - 1]))
+                bound.update((path.rels[position - 1].var, path.nodes[position - 1].var))
+
+        # 每个 WHERE 条件在其引用的变量全部绑定后立即过滤
+        filters = [[] for _ in steps]
+        bound = set()
+        for position, step in enumerate(steps):
+            if step[0] == 'scan':
+                bound.add(step[1].var)
+            else:
+                bound.update((step[2].var, step[4].var))
+            for conjunct in list(conjuncts):
+                if expression_vars(conjunct) <= bound:
+                    filters[position].append(conjunct)
+                    conjuncts.remove(conjunct)
+        if conjuncts:
+            raise Exception(f"Variables {sorted(set().union(*map(expression_vars, conjuncts)))} not defined")
+        return steps, filters
+
+    def _label_size(self, node_pattern):
+        if not node_pattern.labels:
+            return len(self.graph.node_ids)
+        code = self.graph.label_code(node_pattern.labels[0])
+        return len(self.graph.nodes_by_label[code]) if code is not None else 0
+
+    def _node_matches(self, node, node_pattern, binding):
+        graph = self.graph
+        for label in node_pattern.labels:
+            if graph.label_code(label) != graph.node_labels[node]:
+                return False
+        for key, value in node_pattern.props:
+            if graph.node_property(node, key) != self.evaluate(value, binding):
+                return False
+        return True
+
+    def _rel_matches(self, edge, rel_pattern, binding):
+        graph = self.graph
+        if rel_pattern.types and graph.type_names[graph.edge_types[edge]] not in rel_pattern.types:
+            return False
+        for key, value in rel_pattern.props:
+            if graph.edge_property(edge, key) != self.evaluate(value, binding):
+                return False
+        return True
+
+    def match(self):
+        steps, filters = self._plan()
+
+        def passes(position, binding):
+            return all(self.evaluate(condition, binding) is True for condition in filters[position])
+
+        def run(position, binding, used_edges):
+            if position == len(steps):
+                yield dict(binding)
+                return
+            step = steps[position]
+            if step[0] == 'scan':
+                node_pattern, lookup = step[1], step[2]
+                if node_pattern.var in binding:
+                    candidates = [binding[node_pattern.var].index]
+                elif lookup is not None:
+                    candidates = lookup
+                elif node_pattern.labels:
+                    code = self.graph.label_code(node_pattern.labels[0])
+                    candidates = self.graph.nodes_by_label[code].tolist() if code is not None else []
+                else:
+                    candidates = range(len(self.graph.node_ids))
+                already_bound = node_pattern.var in binding
+                for node in candidates:
+                    if not self._node_matches(node, node_pattern, binding):
+                        continue
+                    binding[node_pattern.var] = NodeRef(node)
+                    if passes(position, binding):
+                        yield from run(position + 1, binding, used_edges)
+                    if not already_bound:
+                        del binding[node_pattern.var]
+                return
+
+            _, from_var, rel_pattern, direction, to_pattern = step
+            bound_target = binding.get(to_pattern.var)
+            for edge, other in self.graph.adjacent(binding[from_var].index, direction):
+                if edge in used_edges or not self._rel_matches(edge, rel_pattern, binding):
+                    continue
+                if bound_target is not None:
+                    if bound_target.index != other:
+                        continue
+                elif not self._node_matches(other, to_pattern, binding):
+                    continue
+                binding[rel_pattern.var] = RelRef(edge)
+                if bound_target is None:
+                    binding[to_pattern.var] = NodeRef(other)
+                used_edges.add(edge)
+                if passes(position, binding):
+                    yield from run(position + 1, binding, used_edges)
+                used_edges.discard(edge)
+                del binding[rel_pattern.var]
+                if bound_target is None:
+                    del binding[to_pattern.var]
+
+        yield from run(0, {}, set())
+
+    # projection
+    def _aggregate(self, expr, bindings):
+        name, distinct, args = expr[1], expr[2], expr[3]
+        if args is None:
+            return len(bindings)
+        values = [self.evaluate(args[0], binding) for binding in bindings]
+        values = [value for value in values if value is not None]
+        if distinct:
+            values = list(OrderedDict((_hashable(value), value) for value in values).values())
+        if name == 'count':
+            return len(values)
+        if name == 'collect':
+            return values
+        if not values:
+            return None
+        if name == 'sum':
+            return sum(values)
+        if name == 'avg':
+            return sum(values) / len(values)
+        return min(values) if name == 'min' else max(values)
+
+    def run(self):
+        query = self.query
+        items = query.items
+        skip = self.evaluate(query.skip, {}) if query.skip is not None else 0
+        limit = self.evaluate(query.limit, {}) if query.limit is not None else None
+        aggregated = any(contains_aggregate(item.expr) for item in items)
+        for item in items:
+            if contains_aggregate(item.expr) and not is_aggregate(item.expr):
+                raise Exception(f"Unsupported expression {item.name}: aggregates must be top-level RETURN items")
+
+        # 无排序/聚合时可以在凑够 SKIP + LIMIT 行后提前结束匹配
+        stop_after = skip + limit if limit is not None and not aggregated and not query.order_by else None
+        rows = []  # (values, binding)
+        if aggregated:
+            groups = OrderedDict()
+            for binding in self.match():
+                key = tuple(_hashable(self.evaluate(item.expr, binding)) for item in items if not is_aggregate(item.expr))
+                groups.setdefault(key, []).append(binding)
+            if not groups and all(is_aggregate(item.expr) for item in items):
+                groups[()] = []
+            for bindings in groups.values():
+                values = [self._aggregate(item.expr, bindings) if is_aggregate(item.expr) else self.evaluate(item.expr, bindings[0])
+                          for item in items]
+                rows.append((values, bindings[0] if bindings else {}))
+        else:
+            seen = set()
+            for binding in self.match():
+                values = [self.evaluate(item.expr, binding) for item in items]
+                if query.distinct:
+                    key = tuple(_hashable(value) for value in values)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                rows.append((values, binding))
+                if stop_after is not None and len(rows) >= stop_after:
+                    break
+
+        if aggregated and query.distinct:
+            seen, unique = set(), []
+            for values, binding in rows:
+                key = tuple(_hashable(value) for value in values)
+                if key not in seen:
+                    seen.add(key)
+                    unique.append((values, binding))
+            rows = unique
+
+        for sort_item in reversed(query.order_by):
+            column = self._sort_column(sort_item)
+            rows.sort(key=lambda row: _sort_key(row[0][column] if column is not None else self.evaluate(sort_item.expr, row[1])),
+                      reverse=sort_item.descending)
+
+        rows = rows[skip:skip + limit] if limit is not None else rows[skip:]
+        names = [item.name for item in items]
+        return {'results': [{name: self._to_result(value) for name, value in zip(names, values)} for values, _ in rows]}
+
+    def _sort_column(self, sort_item):
+        for position, item in enumerate(self.query.items):
+            if sort_item.text == item.name or sort_item.expr == item.expr or sort_item.expr == ('var', item.name):
+                return position
+        if any(contains_aggregate(item.expr) for item in self.query.items):
+            raise Exception(f"ORDER BY {sort_item.text} must refer to a RETURN item when aggregating")
+        return None
+
+    def _to_result(self, value):
+        if isinstance(value, NodeRef):
+            return self.graph.node_to_result(value.index)
+        if isinstance(value, RelRef):
+            return self.graph.edge_to_result(value.index)
+        if isinstance(value, list):
+            return [self._to_result(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._to_result(item) for key, item in value.items()}
+        return value
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    return value
+
+
+def _sort_key(value):
+    # Cypher 排序: null 排在升序末尾; 不同类型之间按类型名分组避免比较出错
+    if value is None:
+        return (1, '', 0)
+    if isinstance(value, bool):
+        return (0, 'bool', value)
+    if isinstance(value, (int, float)):
+        return (0, 'number', value)
+    if isinstance(value, (NodeRef, RelRef)):
+        return (0, type(value).__name__, value.index)
+    return (0, type(value).__name__, value if isinstance(value, str) else str(value))
+
+
+class LocalGraphDB:
+    """
+    In-process graph store with the same query interface as NeptuneGraphDB.
+
+    Loaded from vertex/edge exports (see data_example), it executes the read-only openCypher subset
+    produced by CYPHER_GENERATION_PROMPT without a network hop. reload() swaps in a new snapshot
+    atomically, so queries running on the old snapshot are unaffected.
+    """
+
+    def __init__(self, vertex_files=(), edge_files=()):
+        self.vertex_files = list(vertex_files)
+        self.edge_files = list(edge_files)
+        self.graph = GraphData([], [])
+        self.data_version = None
+        if self.vertex_files:
+            self.reload()
+
+    def reload(self, vertex_files=None, edge_files=None):
+        self.vertex_files = list(vertex_files) if vertex_files is not None else self.vertex_files
+        self.edge_files = list(edge_files) if edge_files is not None else self.edge_files
+        graph = GraphData(
+            (vertex for path in self.vertex_files for vertex in iter_vertices(path)),
+            (edge for path in self.edge_files for edge in iter_edges(path))
+        )
+        self.graph = graph
+        logger.info(f"Loaded local graph: {len(graph.node_ids)} nodes, {len(graph.edge_ids)} edges")
+        self.bump_data_version()
+
+    def execute_opencypher_query(self, query, parameters: dict = None):
+        """
+        Execute a read-only openCypher query
+        :param query: The openCypher query, use $name placeholders for values
+        :param parameters: Values for the $name placeholders
+        :return: The query response, in the Neptune openCypher HTTP format {'results': [...]}
+        """
+        try:
+            return _Executor(self.graph, parse_query(query), parameters).run()
+        except Exception as e:
+            raise Exception(f"Query failed: {e}") from e
+
+    def execute_opencypher_batch(self, queries, max_workers=None):
+        # 本地执行没有网络等待, 顺序执行即可
+        queries = [(q, None) if isinstance(q, str) else q for q in queries]
+        return [self.execute_opencypher_query(*q) for q in queries]
+
+    def bump_data_version(self, data_version=None):
+        self.data_version = data_version if data_version is not None else time.time()
+
+
+# 使用示例
+if __name__ == "__main__":
+    import json
+    local_db = LocalGraphDB(['data_example/vertex.csv'], ['data_example/edge.csv'])
+    cypher_query = "MATCH (m:FundManager)-[:manage]->(f:Fund) WHERE m.chinesename = $name RETURN m.chinesename, f.fund_name LIMIT 30"
+    print(json.dumps(local_db.execute_opencypher_query(cypher_query, {'name': '张坤'}), indent=2, ensure_ascii=False))
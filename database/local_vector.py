@@ -0,0 +1,325 @@
+import os
+import json
+import math
+import uuid
+import threading
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+from database.rank_fusion import reciprocal_rank_fusion, tokenize
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+class LocalVectorIndex:
+    """
+    One vector index stored in a directory:
+    - vectors.f32: contiguous float32 matrix of L2-normalized vectors, appended row by row and read through a memory map
+    - docs.jsonl: one line per row with the document id, text, answer and profile; deletions are appended as tombstones
+
+    Search is exact by default: a single matrix-vector product over the rows of the requested profile and
+    an argpartition for the top k. In 'ivf' mode the rows are clustered with k-means into nlist lists and
+    only the nprobe lists closest to the query are scored.
+    """
+
+    def __init__(self, path, mode='exact', nlist=64, nprobe=8):
+        self.path = path
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.vector_path = os.path.join(path, 'vectors.f32')
+        self.docs_path = os.path.join(path, 'docs.jsonl')
+        self.dimension = None
+        self.docs: List[dict] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.profile_codes: Dict[str, int] = {}
+        self.row_profiles = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.centroids = None
+        self.row_lists = None
+        self.postings = None  # BM25 倒排表, 首次文本检索时构建: token -> {row: term frequency}
+        self.doc_lengths = None
+        self._matrix = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.docs_path):
+            open(self.docs_path, 'w').close()
+            open(self.vector_path, 'wb').close()
+            return
+        profiles, alive = [], []
+        with open(self.docs_path, encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                doc = json.loads(line)
+                if doc.get('deleted'):
+                    row = self.row_by_id.pop(doc['_id'], None)
+                    if row is not None:
+                        alive[row] = False
+                    continue
+                self.dimension = self.dimension or doc.get('dimension')
+                previous = self.row_by_id.get(doc['_id'])
+                if previous is not None:
+                    alive[previous] = False
+                self.row_by_id[doc['_id']] = len(self.docs)
+                self.docs.append({'text': doc['text'], 'answer': doc['answer'], 'profile': doc['profile'], '_id': doc['_id']})
+                profiles.append(self.profile_codes.setdefault(doc['profile'], len(self.profile_codes)))
+                alive.append(True)
+        rows = os.path.getsize(self.vector_path) // (4 * self.dimension) if self.dimension else 0
+        if rows < len(self.docs):
+            raise Exception(f"Vector file {self.vector_path} has {rows} rows, expected {len(self.docs)}")
+        self.row_profiles = np.asarray(profiles, dtype=np.int32)
+        self.alive = np.asarray(alive, dtype=bool)
+        if self.mode == 'ivf':
+            self.build_ivf()
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) < len(self.docs):
+            if not self.docs:
+                return np.zeros((0, self.dimension or 0), dtype=np.float32)
+            self._matrix = np.memmap(self.vector_path, dtype=np.float32, mode='r', shape=(len(self.docs), self.dimension))
+        return self._matrix
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def add(self, samples, doc_ids=None):
+        """
+        Append samples
+        :param samples: Iterable of (profile_name, text, answer, embedding)
+        :param doc_ids: Optional document ids; an existing id is replaced
+        :return: Number of documents added
+        """
+        samples = list(samples)
+        if not samples:
+            return 0
+        vectors = self._normalize(np.asarray([embedding for _, _, _, embedding in samples], dtype=np.float32))
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            if vectors.shape[1] != self.dimension:
+                raise Exception(f"Expected embeddings of dimension {self.dimension}, got {vectors.shape[1]}")
+
+            docs, profiles = [], []
+            for i, (profile_name, text, answer, _) in enumerate(samples):
+                doc_id = doc_ids[i] if doc_ids is not None else uuid.uuid4().hex
+                previous = self.row_by_id.get(doc_id)
+                if previous is not None:
+                    self.alive[previous] = False
+                self.row_by_id[doc_id] = len(self.docs) + len(docs)
+                docs.append({'text': text, 'answer': answer, 'profile': profile_name, '_id': doc_id})
+                profiles.append(self.profile_codes.setdefault(profile_name, len(self.profile_codes)))
+
+            with open(self.vector_path, 'ab') as file:
+                file.write(vectors.tobytes())
+            with open(self.docs_path, 'a', encoding='utf-8') as file:
+                for doc in docs:
+                    file.write(json.dumps(dict(doc, dimension=self.dimension), ensure_ascii=False) + '\n')
+
+            first_row = len(self.docs)
+            self.docs.extend(docs)
+            self.row_profiles = np.concatenate([self.row_profiles, np.asarray(profiles, dtype=np.int32)])
+            self.alive = np.concatenate([self.alive, np.ones(len(docs), dtype=bool)])
+            if self.postings is not None:
+                for offset, doc in enumerate(docs):
+                    self._index_text(first_row + offset, doc['text'])
+            if self.centroids is not None:
+                assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+                for offset, list_id in enumerate(assignments):
+                    self.row_lists[list_id] = np.append(self.row_lists[list_id], first_row + offset)
+        return len(docs)
+
+    def delete(self, doc_id):
+        with self._lock:
+            row = self.row_by_id.pop(doc_id, None)
+            if row is None:
+                return False
+            self.alive[row] = False
+            with open(self.docs_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'_id': doc_id, 'deleted': True}) + '\n')
+            return True
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """Cluster the live rows with spherical k-means into nlist inverted lists."""
+        with self._lock:
+            self.nlist = nlist or self.nlist
+            rows = np.flatnonzero(self.alive)
+            if len(rows) == 0:
+                self.centroids, self.row_lists = None, None
+                return
+            vectors = np.asarray(self.matrix()[rows])
+            nlist = min(self.nlist, len(rows))
+            rng = np.random.default_rng(seed)
+            centroids = vectors[rng.choice(len(rows), nlist, replace=False)]
+            for _ in range(iterations):
+                assignments = np.argmax(vectors @ centroids.T, axis=1)
+                for list_id in range(nlist):
+                    members = vectors[assignments == list_id]
+                    if len(members):
+                        centroids[list_id] = members.sum(axis=0)
+                centroids = self._normalize(centroids)
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            self.centroids = centroids
+            self.row_lists = [rows[assignments == list_id] for list_id in range(nlist)]
+
+    def _index_text(self, row, text):
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[row] = frequency
+        self.doc_lengths.append(sum(terms.values()))
+
+    def text_search(self, profile_name, query_text, top_k, k1=1.2, b=0.75):
+        """
+        BM25 over the text field, tokenized like the OpenSearch standard analyzer
+        :return: [(row, bm25 score)] of the top_k live rows of the profile, best first
+        """
+        code = self.profile_codes.get(profile_name)
+        if code is None or not query_text:
+            return []
+        with self._lock:
+            if self.postings is None:
+                self.postings, self.doc_lengths = {}, []
+                for row, doc in enumerate(self.docs):
+                    self._index_text(row, doc['text'])
+            row_count = len(self.doc_lengths)
+            live = self.alive[:row_count] & (self.row_profiles[:row_count] == code)
+            live_count = int(live.sum())
+            if live_count == 0:
+                return []
+            lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+            average_length = float(lengths[live].mean()) or 1.0
+            scores = np.zeros(row_count, dtype=np.float32)
+            for term in set(tokenize(query_text)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                document_frequency = int(live[rows].sum())
+                idf = math.log(1 + (live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                norm = k1 * (1 - b + b * lengths[rows] / average_length)
+                scores[rows] += idf * frequencies * (k1 + 1) / (frequencies + norm)
+        scores[~live] = 0
+        matched = np.flatnonzero(scores > 0)
+        top = matched[np.argsort(-scores[matched], kind='stable')[:top_k]]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def search(self, profile_name, query_embedding, top_k):
+        """
+        :return: [(row, cosine similarity)] of the top_k live rows of the profile, best first
+        """
+        code = self.profile_codes.get(profile_name)
+        if code is None or not query_embedding or len(self.docs) == 0:
+            return []
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        matrix = self.matrix()
+        row_count = len(matrix)
+
+        if self.centroids is not None and self.mode == 'ivf':
+            probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            candidates = np.concatenate([self.row_lists[list_id] for list_id in probes])
+            candidates = candidates[candidates < row_count]
+        else:
+            candidates = None
+
+        if candidates is None:
+            mask = self.alive[:row_count] & (self.row_profiles[:row_count] == code)
+            scores = matrix @ query
+            scores[~mask] = -np.inf
+            rows = np.arange(row_count)
+        else:
+            candidates = candidates[self.alive[candidates] & (self.row_profiles[candidates] == code)]
+            scores = matrix[candidates] @ query
+            rows = candidates
+
+        k = min(top_k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+class LocalVectorDao:
+    """
+    Local vector store with the same interface as OpenSearchDao: add_sample, retrieve_samples, get_samples,
+    delete_sample and search_sample_with_embedding return data in the OpenSearch hit format.
+    Each index name is a sub directory of data_dir.
+    """
+
+    def __init__(self, data_dir, mode='exact', nlist=64, nprobe=8):
+        self.data_dir = data_dir
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.indexes: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, index_name) -> LocalVectorIndex:
+        with self._lock:
+            if index_name not in self.indexes:
+                self.indexes[index_name] = LocalVectorIndex(os.path.join(self.data_dir, index_name), self.mode, self.nlist, self.nprobe)
+            return self.indexes[index_name]
+
+    def ping(self):
+        return True
+
+    def check_index(self, index_name):
+        return []
+
+    @staticmethod
+    def _hit(index, row, score=1.0, includes=None):
+        doc = index.docs[row]
+        source = {key: doc[key] for key in (includes or ('text', 'answer', 'profile'))}
+        # 与 OpenSearch cosinesimil 空间的打分方式一致: 1 / (2 - cos)
+        return {'_index': os.path.basename(index.path), '_id': doc['_id'], '_score': 1.0 / (2.0 - score), '_source': source}
+
+    def retrieve_samples(self, index_name, profile_name):
+        index = self.get_index(index_name)
+        return [self._hit(index, row, includes=('text', 'answer'))
+                for row, doc in enumerate(index.docs) if index.alive[row] and doc['profile'] == profile_name]
+
+    def add_sample(self, index_name, profile_name, text, answer, embedding):
+        return self.add_samples(index_name, [(profile_name, text, answer, embedding)]) == 1
+
+    def add_samples(self, index_name, samples, doc_ids=None):
+        return self.get_index(index_name).add(samples, doc_ids)
+
+    def get_samples(self, index_name, doc_ids, source_includes=('text', 'answer')):
+        index = self.get_index(index_name)
+        rows = [index.row_by_id.get(doc_id) for doc_id in doc_ids]
+        return [self._hit(index, row, includes=source_includes) for row in rows if row is not None]
+
+    def delete_sample(self, index_name, doc_id):
+        return {'result': 'deleted' if self.get_index(index_name).delete(doc_id) else 'not_found'}
+
+    def search_sample_with_embedding(self, profile_name, top_k, index_name, query_embedding):
+        index = self.get_index(index_name)
+        return [self._hit(index, row, score) for row, score in index.search(profile_name, query_embedding, top_k)]
+
+    def hybrid_search(self, profile_name, index_name, query_text, query_embedding, top_n=3, k=20,
+                      rank_constant=60, source_includes=('answer',)):
+        """Same contract as OpenSearchDao.hybrid_search: BM25 and kNN candidates fused with RRF."""
+        index = self.get_index(index_name)
+        result_lists = [
+            [{'_id': index.docs[row]['_id'], '_source': {key: index.docs[row][key] for key in source_includes}, '_score': score}
+             for row, score in index.text_search(profile_name, query_text, k)],
+            [self._hit(index, row, score, source_includes) for row, score in index.search(profile_name, query_embedding, k)]
+        ]
+        return reciprocal_rank_fusion(result_lists, rank_constant, top_n)
+
+
+if __name__ == "__main__":
+    dao = LocalVectorDao('.cache/vector_index')
+    rng = np.random.default_rng(0)
+    dao.add_samples('text_neptune', [('profile1', f'text {i}', f'answer {i}', rng.normal(size=256).tolist()) for i in range(1000)])
+    query = rng.normal(size=256).tolist()
+    logger.info(dao.search_sample_with_embedding('profile1', 3, 'text_neptune', query))
@@ -1,21 +1,103 @@
-import requests
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database.result_cache import QueryResultCache, is_read_only
+from utils.startup import timed
 
 class NeptuneGraphDB:
-    def __init__(self, endpoint, port=8182):
+    def __init__(self, endpoint, port=8182, result_cache: QueryResultCache = None,
+                 pool_maxsize=20, connect_timeout=3.05, read_timeout=30, max_retries=3, backoff_factor=0.2):
         self.endpoint = endpoint
         self.port = port
         self.url = f'https://{self.endpoint}:{self.port}/openCypher'  # 使用 HTTPS 和指定的路径
+        self.result_cache = result_cache  # 只读查询结果缓存, None 表示不缓存
+        self.data_version = None
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._lock = threading.Lock()
 
-    def execute_opencypher_query(self, query):
-        headers = {
+    @property
+    def session(self):
+        # 会话在第一次查询时创建, requests 的导入也不在启动路径上
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    with timed('neptune_session'):
+                        self._session = self._create_session(self.pool_maxsize, self.max_retries, self.backoff_factor)
+        return self._session
+
+    @staticmethod
+    def _create_session(pool_maxsize, max_retries, backoff_factor):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # 长连接会话: 连接池复用 TLS 连接, 对连接错误和 429/5xx 做指数退避重试
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.headers.update({
             'Content-Type': 'application/x-www-form-urlencoded'  # 设置内容类型为表单
-        }
+        })
+        session.verify = False  # verify=False 用于忽略 SSL 证书验证
+        return session
+
+    def execute_opencypher_query(self, query, parameters: dict = None):
+        """
+        Execute an openCypher query
+        :param query: The openCypher query, use $name placeholders for values
+        :param parameters: Values for the $name placeholders, so Neptune can reuse the query plan
+        :return: The query response
+        """
+        if self.result_cache is None or not is_read_only(query):
+            return self._post_query(query, parameters)
+
+        key = self.result_cache.make_key(query, parameters)
+        result = self.result_cache.get(key)
+        if result is None:
+            result = self._post_query(query, parameters)
+            self.result_cache.put(key, result)
+        return result
+
+    def execute_opencypher_batch(self, queries, max_workers=None):
+        """
+        Execute many queries concurrently over the connection pool
+        :param queries: Iterable of query strings or (query, parameters) tuples
+        :param max_workers: Number of concurrent requests (default: the pool size)
+        :return: The query responses, in the same order as the queries
+        """
+        queries = [(q, None) if isinstance(q, str) else q for q in queries]
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_maxsize) as executor:
+            return list(executor.map(lambda q: self.execute_opencypher_query(*q), queries))
+
+    def bump_data_version(self, data_version=None):
+        # 数据导入后调用, 使之前缓存的查询结果全部失效
+        self.data_version = data_version if data_version is not None else int(time.time())
+        if self.result_cache is not None:
+            self.result_cache.bump_data_version(self.data_version)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def _post_query(self, query, parameters=None):
         payload = {
             'query': query  # 使用表单数据格式发送查询
         }
-        
-        response = requests.post(self.url, headers=headers, data=payload, verify=False)  # verify=False 用于忽略 SSL 证书验证
+        if parameters:
+            payload['parameters'] = json.dumps(parameters, ensure_ascii=False)
+
+        response = self.session.post(self.url, data=payload, timeout=self.timeout)
 
         if response.status_code == 200:
             return response.json()
@@ -26,10 +108,13 @@ class NeptuneGraphDB:
 if __name__ == "__main__":
     neptune_endpoint = 'db-neptune-1.cluster-ro-c54gq640s2vk.us-east-1.neptune.amazonaws.com'  # 示例端点
     neptune_db = NeptuneGraphDB(neptune_endpoint)
-    cypher_query = "MATCH (n1) RETURN n1;"  # 替换为您的 OpenCypher 查询
+    cypher_query = "MATCH (m:FundManager)-[:manage]->(f:Fund) WHERE m.chinesename = $name RETURN m, f LIMIT 30"  # 替换为您的 OpenCypher 查询
 
     try:
-        result = neptune_db.execute_opencypher_query(cypher_query)
+        result = neptune_db.execute_opencypher_query(cypher_query, parameters={'name': '张坤'})
         print("Query Result:", json.dumps(result, indent=2))
+
+        results = neptune_db.execute_opencypher_batch([(cypher_query, {'name': name}) for name in ['张坤', '张雪松']])
+        print("Batch Results:", json.dumps(results, indent=2))
     except Exception as e:
         print("Error:", e)
@@ -1,16 +1,23 @@
-import boto3
-from opensearchpy import OpenSearch
-from opensearchpy.helpers import bulk
+import threading
+from typing import List
+from database.rank_fusion import reciprocal_rank_fusion
+from database.quantization import VectorQuantizer, rescore
 from utils.logging import getLogger
+from utils.startup import timed
 
 logger = getLogger()
 
+# 支持在 kNN 检索过程中过滤的引擎; 旧索引的 nmslib 不支持 knn 内的 filter
+FILTERING_ENGINES = ('lucene', 'faiss')
+
+
 class OpenSearchInitializer:
     def __init__(self, opensearch_info):
         self.opensearch_info = opensearch_info
         self.client = self._create_client()
 
     def _create_client(self):
+        from opensearchpy import OpenSearch
         auth = (self.opensearch_info["username"], self.opensearch_info["password"])
         host = self.opensearch_info["host"]
         port = self.opensearch_info["port"]
@@ -36,6 +43,24 @@ class OpenSearchInitializer:
                 return True
         return False
 
+    def migrate_index(self, source, target):
+        """
+        Copy an index into a new index created with the current mapping (lucene engine, analyzed text) using the
+        _reindex API. Documents keep their ids; the source index is left untouched.
+        :return: Number of documents copied
+        """
+        if VectorQuantizer.from_config(self.opensearch_info.get('vector_quantization')) is not None:
+            raise Exception("Quantized vectors cannot be copied with _reindex, re-run database.opensearch_indexer into the new index")
+        if self._check_index_exists(target):
+            raise Exception(f"Index {target} already exists")
+        if not (self._create_index(target) and self._create_index_mapping(target, self.opensearch_info['embedding_dimension'])):
+            raise Exception(f"Failed to create index {target}")
+        response = self.client.reindex(body={'source': {'index': source}, 'dest': {'index': target}},
+                                       wait_for_completion=True, refresh=True, request_timeout=3600)
+        if response.get('failures'):
+            raise Exception(f"Reindex {source} -> {target} failed: {response['failures'][:3]}")
+        return response.get('total', 0)
+
     def _check_index_exists(self, index_name):
         return self.client.indices.exists(index=index_name)
 
@@ -52,37 +77,94 @@ class OpenSearchInitializer:
         return bool(response['acknowledged'])
 
     def _create_index_mapping(self, index_name, dimension):
-        response = self.client.indices.put_mapping(
-            index=index_name,
-            body={
-                "properties": {
-                    "vector_field": {
-                        "type": "knn_vector",
-                        "dimension": dimension
-                    },
-                    "text": {
-                        "type": "keyword"
-                    },
-                    "profile": {
-                        "type": "keyword"
-                    }
+        properties = {
+            "vector_field": {
+                "type": "knn_vector",
+                "dimension": dimension,
+                # lucene 引擎支持在 kNN 检索过程中按 profile 过滤 (efficient filtering)
+                "method": {
+                    "name": "hnsw",
+                    "space_type": "cosinesimil",
+                    "engine": "lucene"
                 }
+            },
+            # text 需要分词才能做 BM25 检索, keyword 子字段保留精确匹配
+            "text": {
+                "type": "text",
+                "fields": {"keyword": {"type": "keyword"}}
+            },
+            "profile": {
+                "type": "keyword"
             }
-        )
+        }
+        quantizer = VectorQuantizer.from_config(self.opensearch_info.get('vector_quantization'))
+        if quantizer is not None:
+            # 图索引只保存量化后的向量; 全精度向量只存于 _source, 不建索引, 仅用于重排序
+            properties["vector_field"] = quantizer.knn_mapping(dimension)
+            properties["vector_full"] = {"type": "float", "index": False, "doc_values": False}
+        response = self.client.indices.put_mapping(index=index_name, body={"properties": properties})
         return bool(response['acknowledged'])
 
 
 class OpenSearchDao:
-    def __init__(self, host, port, opensearch_user, opensearch_password):
-        self.client = OpenSearch(
-            hosts=[{'host': host, 'port': port}],
-            http_compress=True,
-            http_auth=(opensearch_user, opensearch_password),
-            use_ssl=True,
-            verify_certs=False,
-            ssl_assert_hostname=False,
-            ssl_show_warn=False
-        )
+    def __init__(self, host, port, opensearch_user, opensearch_password, pool_maxsize=10,
+                 quantizer: VectorQuantizer = None, oversample=4):
+        """
+        :param quantizer: Set when the index stores quantized vectors (opensearch_info.vector_quantization):
+                          embeddings are encoded on write and kNN searches over-fetch oversample times
+                          the candidates, then rescore them with the full-precision vectors
+        """
+        self.quantizer = quantizer
+        self.oversample = oversample
+        self.host = host
+        self.port = port
+        self._auth = (opensearch_user, opensearch_password)
+        self.pool_maxsize = pool_maxsize
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # opensearchpy 的导入和客户端创建推迟到第一次请求
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    with timed('opensearch_client'):
+                        from opensearchpy import OpenSearch
+                        self._client = OpenSearch(
+                            hosts=[{'host': self.host, 'port': self.port}],
+                            http_compress=True,
+                            http_auth=self._auth,
+                            use_ssl=True,
+                            verify_certs=False,
+                            ssl_assert_hostname=False,
+                            ssl_show_warn=False,
+                            pool_maxsize=self.pool_maxsize
+                        )
+        return self._client
+
+    def ping(self):
+        return self.client.ping()
+
+    def check_index(self, index_name) -> List[str]:
+        """
+        Compare an existing index with the mapping hybrid_search expects. Indexes created before the switch to
+        the lucene engine and an analyzed text field still answer, but with an empty kNN branch and exact-match
+        BM25; they have to be migrated (python -m database.opensearch_migrate).
+        :return: The problems found, each also logged as a warning
+        """
+        properties = self.client.indices.get_mapping(index=index_name)[index_name]['mappings'].get('properties', {})
+        problems = []
+        engine = properties.get('vector_field', {}).get('method', {}).get('engine', 'nmslib')
+        if engine not in FILTERING_ENGINES:
+            problems.append(f"vector_field uses the {engine} engine, which cannot filter by profile inside kNN")
+        if properties.get('text', {}).get('type') != 'text':
+            problems.append(f"text is mapped as {properties.get('text', {}).get('type')}, BM25 only matches the exact text")
+        if self.quantizer is not None and 'vector_full' not in properties:
+            problems.append("vector_quantization is enabled but the index has no vector_full field")
+        for problem in problems:
+            logger.warning(f"OpenSearch index {index_name}: {problem}; reindex with python -m database.opensearch_migrate")
+        return problems
 
     def retrieve_samples(self, index_name, profile_name):
         search_query = {
@@ -101,38 +183,150 @@ class OpenSearchDao:
         return response['hits']['hits']
 
     def add_sample(self, index_name, profile_name, text, answer, embedding):
-        record = {
-            '_index': index_name,
-            'text': text,
-            'answer': answer,
-            'profile': profile_name,
-            'vector_field': embedding
-        }
-        success, failed = bulk(self.client, [record])
-        return success == 1
+        return self.add_samples(index_name, [(profile_name, text, answer, embedding)]) == 1
+
+    def add_samples(self, index_name, samples, doc_ids=None):
+        """
+        Index many samples in one bulk request
+        :param samples: Iterable of (profile_name, text, answer, embedding)
+        :param doc_ids: Optional document ids, one per sample, to make re-indexing idempotent
+        :return: Number of documents indexed successfully
+        """
+        records = []
+        for i, (profile_name, text, answer, embedding) in enumerate(samples):
+            record = {
+                '_index': index_name,
+                'text': text,
+                'answer': answer,
+                'profile': profile_name,
+                'vector_field': embedding
+            }
+            if self.quantizer is not None:
+                record['vector_field'] = self.quantizer.encode_one(embedding)
+                record['vector_full'] = embedding
+            if doc_ids is not None:
+                record['_id'] = doc_ids[i]
+            records.append(record)
+        from opensearchpy.helpers import bulk
+        success, failed = bulk(self.client, records, raise_on_error=False)
+        if failed:
+            logger.error(f"Failed to index {len(failed)} samples: {failed[:3]}")
+        return success
+
+    def get_samples(self, index_name, doc_ids, source_includes=('text', 'answer')):
+        """
+        Fetch documents by id in one mget request
+        :return: Hits of the documents that exist, in the order of doc_ids
+        """
+        response = self.client.mget(body={'ids': list(doc_ids)}, index=index_name, _source_includes=list(source_includes))
+        return [{'_index': doc['_index'], '_id': doc['_id'], '_source': doc['_source']}
+                for doc in response['docs'] if doc.get('found')]
 
     def delete_sample(self, index_name, doc_id):
         return self.client.delete(index=index_name, id=doc_id)
 
-    def search_sample_with_embedding(self, profile_name, top_k, index_name, query_embedding):
-        search_query = {
-            "size": top_k,
+    @staticmethod
+    def _knn_query(profile_name, query_embedding, k, source_includes=None, post_filter=False):
+        # 过滤条件放在 knn 内部, 检索时即按 profile 过滤, 而不是先取 k 个结果再后置过滤;
+        # post_filter 用于不支持该写法的旧索引 (nmslib 引擎)
+        if post_filter:
+            query = {
+                "size": k,
+                "query": {
+                    "bool": {
+                        "filter": [{"term": {"profile": profile_name}}],
+                        "must": [{"knn": {"vector_field": {"vector": query_embedding, "k": k}}}]
+                    }
+                }
+            }
+        else:
+            query = {
+                "size": k,
+                "query": {
+                    "knn": {
+                        "vector_field": {
+                            "vector": query_embedding,
+                            "k": k,
+                            "filter": {"term": {"profile": profile_name}}
+                        }
+                    }
+                }
+            }
+        if source_includes is not None:
+            query["_source"] = {"includes": list(source_includes)}
+        return query
+
+    @staticmethod
+    def _text_query(profile_name, query_text, size, source_includes=None):
+        query = {
+            "size": size,
             "query": {
                 "bool": {
-                    "filter": {"match_phrase": {"profile": profile_name}},
-                    "must": [{
-                        "knn": {
-                            "vector_field": {
-                                "vector": query_embedding,
-                                "k": top_k
-                            }
-                        }
-                    }]
+                    "filter": [{"term": {"profile": profile_name}}],
+                    "must": [{"match": {"text": query_text}}]
                 }
             }
         }
+        if source_includes is not None:
+            query["_source"] = {"includes": list(source_includes)}
+        return query
+
+    def _vector_query(self, profile_name, query_embedding, k, source_includes=None, post_filter=False):
+        if self.quantizer is None:
+            return self._knn_query(profile_name, query_embedding, k, source_includes, post_filter)
+        # 第一阶段: 在量化向量上多取 oversample 倍的候选, 并带回全精度向量
+        includes = None if source_includes is None else list(source_includes) + ['vector_full']
+        return self._knn_query(profile_name, self.quantizer.encode_one(query_embedding), k * self.oversample, includes, post_filter)
+
+    def _vector_hits(self, hits, query_embedding, k):
+        if self.quantizer is None:
+            return hits
+        # 第二阶段: 用全精度向量重新打分, 保留前 k 个
+        return rescore(query_embedding, hits, k)
+
+    def search_sample_with_embedding(self, profile_name, top_k, index_name, query_embedding):
+        search_query = self._vector_query(profile_name, query_embedding, top_k)
         response = self.client.search(body=search_query, index=index_name)
-        return response['hits']['hits']
+        return self._vector_hits(response['hits']['hits'], query_embedding, top_k)
+
+    def hybrid_search(self, profile_name, index_name, query_text, query_embedding, top_n=3, k=20,
+                      rank_constant=60, source_includes=('answer',)):
+        """
+        BM25 on text and kNN on vector_field in one msearch round trip, fused with reciprocal-rank fusion
+        :param k: Candidates taken from each of the two searches
+        :param top_n: Number of fused hits returned
+        :param rank_constant: RRF constant
+        :param source_includes: _source fields returned per hit
+        :return: Fused hits, best first
+        """
+        body = []
+        if query_text:
+            body += [{}, self._text_query(profile_name, query_text, k, source_includes)]
+        if query_embedding:
+            body += [{}, self._vector_query(profile_name, query_embedding, k, source_includes)]
+        if not body:
+            return []
+
+        response = self.client.msearch(body=body, index=index_name)
+        result_lists = []
+        for item in response['responses']:
+            if 'error' in item:
+                # 一路检索失败时仍使用另一路的结果
+                logger.error(f"Hybrid search branch failed: {item['error']}")
+                result_lists.append(None)
+                continue
+            result_lists.append(item['hits']['hits'])
+        if query_embedding and result_lists[-1] is None:
+            # kNN 内的 filter 在旧索引上会失败, 改用后置过滤重试一次
+            try:
+                fallback = self._vector_query(profile_name, query_embedding, k, source_includes, post_filter=True)
+                result_lists[-1] = self.client.search(body=fallback, index=index_name)['hits']['hits']
+            except Exception as e:
+                logger.error(f"Post-filtered kNN search failed: {e}")
+        result_lists = [hits or [] for hits in result_lists]
+        if query_embedding:
+            result_lists[-1] = self._vector_hits(result_lists[-1], query_embedding, k)
+        return reciprocal_rank_fusion(result_lists, rank_constant, top_n)
 
 
 if __name__ == "__main__":
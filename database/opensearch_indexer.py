@@ -0,0 +1,232 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from yaml.loader import SafeLoader
+from database.opensearch import OpenSearchDao
+from database.quantization import VectorQuantizer
+from llm.embedding import TitanEmbeddings
+from llm.embedding_cache import EmbeddingCache
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+def iter_records(path):
+    """
+    Stream (text, answer, profile) records from a JSONL or CSV file
+    :return: Iterator of {'text', 'answer', 'profile'}
+    """
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for row in rows:
+            yield {'text': row['text'], 'answer': row['answer'], 'profile': row['profile']}
+
+
+def make_doc_id(record):
+    # 以 profile + text 生成确定性文档 ID, 重复导入同一条记录时覆盖而不是新增
+    return hashlib.sha1(f"{record['profile']}\n{record['text']}".encode('utf-8')).hexdigest()
+
+
+class Checkpoint:
+    """
+    Number of records from the start of the input that are fully indexed.
+    Batches can complete out of order, so the watermark only advances over contiguous completed batches.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.records_done = 0
+        self._pending = {}  # batch start offset -> batch size, completed but not yet contiguous
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            if state.get('source') == source:
+                self.records_done = state.get('records_done', 0)
+
+    def complete(self, start, size):
+        with self._lock:
+            self._pending[start] = size
+            while self.records_done in self._pending:
+                self.records_done += self._pending.pop(self.records_done)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'source': self.source, 'records_done': self.records_done}, file)
+        os.replace(tmp_path, self.path)
+
+
+class OpenSearchIndexer:
+    """
+    Streaming ingestion of Q&A records into OpenSearch: records are read in batches,
+    embedded with one embed_many call per batch and written with one bulk request per batch,
+    with at most max_in_flight batches being processed at a time.
+    """
+
+    def __init__(self, opensearch_dao: OpenSearchDao, titan_embeddings: TitanEmbeddings, index_name='text_neptune',
+                 dimensions=256, batch_size=64, max_in_flight=4):
+        self.opensearch_dao = opensearch_dao
+        self.titan_embeddings = titan_embeddings
+        self.index_name = index_name
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+
+    def _index_batch(self, records):
+        """
+        :return: (indexed document count, positions in the batch of the records rejected for an empty text);
+                 records whose embedding call failed are neither, they count as failed and are retried
+        """
+        # 空文本永远无法向量化; 向量为空的其他记录可能只是 Bedrock 调用失败 (限流、超时), 不能当作拒绝
+        rejected = [position for position, record in enumerate(records) if not (record['text'] or '').strip()]
+        valid = [record for position, record in enumerate(records) if position not in rejected]
+        for position in rejected:
+            logger.error(f"Rejecting record with empty text: {records[position]}")
+        embeddings = self.titan_embeddings.embed_many([r['text'] for r in valid], dimensions=self.dimensions) if valid else []
+        samples, doc_ids = [], []
+        for record, embedding in zip(valid, embeddings):
+            if not embedding:
+                logger.error(f"Embedding failed, record not indexed: {record['text'][:50]}")
+                continue
+            samples.append((record['profile'], record['text'], record['answer'], embedding))
+            doc_ids.append(make_doc_id(record))
+        return self.opensearch_dao.add_samples(self.index_name, samples, doc_ids) if samples else 0, rejected
+
+    def _get_load_settings(self):
+        settings = self.opensearch_dao.client.indices.get_settings(index=self.index_name)[self.index_name]['settings']['index']
+        return {
+            'refresh_interval': settings.get('refresh_interval', '1s'),
+            'number_of_replicas': settings.get('number_of_replicas', '1')
+        }
+
+    def _put_settings(self, settings):
+        self.opensearch_dao.client.indices.put_settings(index=self.index_name, body={'index': settings})
+
+    def run(self, path, checkpoint_path=None, bulk_mode=False, reject_path=None):
+        """
+        Index all records of a file
+        :param path: JSONL or CSV file with text, answer and profile fields
+        :param checkpoint_path: Progress file; an interrupted run resumes after the last indexed record
+        :param bulk_mode: Disable refresh and replicas during the load and restore them afterwards
+        :param reject_path: JSONL file the records with an empty text are appended to (with their offset);
+                            they count as processed so the checkpoint moves past them
+        :return: (indexed, failed) document counts of this run
+        """
+        checkpoint = Checkpoint(checkpoint_path, os.path.abspath(path))
+        if checkpoint.records_done:
+            logger.info(f"Resuming after {checkpoint.records_done} records")
+
+        original_settings = None
+        if bulk_mode:
+            original_settings = self._get_load_settings()
+            self._put_settings({'refresh_interval': '-1', 'number_of_replicas': 0})
+
+        counts = {'indexed': 0, 'failed': 0, 'rejected': 0}
+        counts_lock = threading.Lock()
+        if reject_path and os.path.dirname(reject_path):
+            os.makedirs(os.path.dirname(reject_path), exist_ok=True)
+
+        def write_rejects(start, records, rejected):
+            if not reject_path:
+                return
+            with open(reject_path, 'a', encoding='utf-8') as file:
+                for position in rejected:
+                    file.write(json.dumps({'source': os.path.abspath(path), 'offset': start + position,
+                                           'reason': 'empty text', **records[position]}, ensure_ascii=False) + '\n')
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        start_time = time.time()
+
+        def process(start, records):
+            try:
+                indexed, rejected = self._index_batch(records)
+            except Exception as e:
+                logger.error(f"Batch at record {start} failed: {e}")
+                indexed, rejected = 0, []
+            finally:
+                in_flight.release()
+            with counts_lock:
+                # 空文本的记录重试也不会成功: 写入拒绝文件并视为已处理
+                if rejected:
+                    write_rejects(start, records, rejected)
+                counts['indexed'] += indexed
+                counts['rejected'] += len(rejected)
+                counts['failed'] += len(records) - indexed - len(rejected)
+            # 失败的批次不推进检查点, 重新运行时会从该批次重新导入
+            if indexed + len(rejected) == len(records):
+                checkpoint.complete(start, len(records))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                batch, batch_start = [], checkpoint.records_done
+                for offset, record in enumerate(iter_records(path)):
+                    if offset < checkpoint.records_done:
+                        continue
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        in_flight.acquire()
+                        executor.submit(process, batch_start, batch)
+                        batch, batch_start = [], offset + 1
+                if batch:
+                    in_flight.acquire()
+                    executor.submit(process, batch_start, batch)
+        finally:
+            if original_settings is not None:
+                self._put_settings(original_settings)
+                self.opensearch_dao.client.indices.refresh(index=self.index_name)
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        logger.info(f"Indexed {counts['indexed']} documents, {counts['failed']} failed, "
+                    f"{counts['rejected']} rejected" + (f" (see {reject_path})" if counts['rejected'] and reject_path else '') +
+                    f", {elapsed:.1f}s, {counts['indexed'] / elapsed:.1f} docs/s")
+        return counts['indexed'], counts['failed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index Q&A records into OpenSearch')
+    parser.add_argument('--input', required=True, help='JSONL or CSV file with text, answer and profile fields')
+    parser.add_argument('--config', default='config_files/aws_config.yaml')
+    parser.add_argument('--index', default='text_neptune')
+    parser.add_argument('--batch-size', type=int, default=64, help='Records per embedding batch and bulk request')
+    parser.add_argument('--max-in-flight', type=int, default=4, help='Batches processed concurrently')
+    parser.add_argument('--checkpoint', help='Progress file used to resume an interrupted run')
+    parser.add_argument('--bulk-mode', action='store_true', help='Disable refresh and replicas during the load')
+    parser.add_argument('--reject-file', default='.cache/index_rejects.jsonl', help='JSONL file of the records rejected for an empty text')
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        aws_config = yaml.load(file, Loader=SafeLoader)
+    opensearch_info = aws_config['opensearch_info']
+    embedding_cache_info = aws_config.get('embedding_cache_info', {})
+
+    quantization_info = opensearch_info.get('vector_quantization', {})
+    dao = OpenSearchDao(opensearch_info['host'], opensearch_info['port'], opensearch_info['username'],
+                        opensearch_info['password'], pool_maxsize=args.max_in_flight,
+                        quantizer=VectorQuantizer.from_config(quantization_info),
+                        oversample=quantization_info.get('oversample', 4))
+    titan_embeddings = TitanEmbeddings(
+        max_pool_connections=args.max_in_flight * 4,
+        cache=EmbeddingCache(embedding_cache_info.get('cache_dir', '.cache/embeddings'))
+        if embedding_cache_info.get('enabled', False) else None
+    )
+    indexer = OpenSearchIndexer(dao, titan_embeddings, index_name=args.index, dimensions=opensearch_info['embedding_dimension'],
+                                batch_size=args.batch_size, max_in_flight=args.max_in_flight)
+    indexer.run(args.input, checkpoint_path=args.checkpoint, bulk_mode=args.bulk_mode, reject_path=args.reject_file)
+
+
+# 使用示例: python -m database.opensearch_indexer --input samples.jsonl --checkpoint .cache/index.ckpt --bulk-mode
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+
+import yaml
+from yaml.loader import SafeLoader
+
+from database.opensearch import OpenSearchInitializer, OpenSearchDao
+from utils.logging import getLogger
+
+logger = getLogger()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy an OpenSearch index created with an older mapping into a new index '
+                                                 'with the current one (lucene kNN engine, analyzed text field)')
+    parser.add_argument('--source', default='text_neptune', help='Existing index')
+    parser.add_argument('--target', required=True, help='New index, must not exist yet')
+    parser.add_argument('--config', default='config_files/aws_config.yaml')
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        opensearch_info = yaml.load(file, Loader=SafeLoader)['opensearch_info']
+    dao = OpenSearchDao(opensearch_info['host'], opensearch_info['port'], opensearch_info['username'], opensearch_info['password'])
+    if not dao.check_index(args.source):
+        logger.info(f"Index {args.source} already has the current mapping, nothing to migrate")
+        return
+
+    copied = OpenSearchInitializer(opensearch_info).migrate_index(args.source, args.target)
+    problems = dao.check_index(args.target)
+    if problems:
+        raise SystemExit(f"Index {args.target} still has problems: {problems}")
+    logger.info(f"Copied {copied} documents from {args.source} to {args.target}; set vector_search_info.index_name and "
+                f"entity_profile_info.index_name to {args.target}, then delete {args.source}")
+
+
+# 使用示例: python -m database.opensearch_migrate --source text_neptune --target text_neptune_v2
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import os
+import json
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+import yaml
+from yaml.loader import SafeLoader
+
+from utils.logging import getLogger
+
+logger = getLogger()
+
+PROFILE_NAME = 'entity_profile'
+
+MANAGER_PAGE_QUERY = "MATCH (m:FundManager) RETURN m ORDER BY id(m) SKIP $skip LIMIT $limit"
+FUND_PAGE_QUERY = "MATCH (f:Fund) RETURN f ORDER BY id(f) SKIP $skip LIMIT $limit"
+MANAGE_PAGE_QUERY = ("MATCH (m:FundManager)-[r:manage]->(f:Fund) RETURN id(m) AS manager_id, id(f) AS fund_id, r "
+                     "ORDER BY manager_id, fund_id SKIP $skip LIMIT $limit")
+
+# 档案中展示的收益指标 (单位: %), 按时间由近到远
+RETURN_METRICS = [
+    ('nav_grw_r1w', '近1周'), ('nav_grw_r1m', '近1月'), ('nav_grw_r3m', '近3月'), ('nav_grw_ty', '今年以来'),
+    ('nav_grw_r1y', '近1年'), ('nav_grw_r3y', '近3年'), ('nav_grw_r5y', '近5年'), ('nav_grw_base', '成立以来'),
+]
+# 经理档案中每只基金只展示的关键指标
+KEY_METRICS = [('nav_grw_r1y', '近1年'), ('nav_grw_r3y', '近3年'), ('max_draw_down_base', '最大回撤')]
+
+BACKGROUND_CHARS = 300
+BRIEFINTRO_CHARS = 200
+
+
+def profile_doc_id(label: str, entity_id: str) -> str:
+    return f'{PROFILE_NAME}:{label}:{entity_id}'
+
+
+def profile_doc_ids(intent: str, parameters: dict) -> List[str]:
+    """
+    Profile documents that answer an EntityRouter intent: manager documents list the managed funds and
+    fund documents list their managers, so one document per named entity is enough.
+    """
+    doc_ids = [profile_doc_id('FundManager', entity_id) for entity_id in parameters.get('manager_ids', [])]
+    doc_ids += [profile_doc_id('Fund', entity_id) for entity_id in parameters.get('fund_ids', [])]
+    return doc_ids
+
+
+def _percent(value) -> Optional[str]:
+    try:
+        return f'{float(value):.2f}%'
+    except (TypeError, ValueError):
+        return None
+
+
+def _truncate(text, limit):
+    text = str(text or '')
+    return text if len(text) <= limit else text[:limit] + '…'
+
+
+def _fingerprint(properties: dict, related: List[tuple]) -> str:
+    # etl_timestamp 每次导出都会变化, 不参与指纹计算, 内容未变的记录不会触发重建
+    def content(values):
+        return {key: value for key, value in values.items() if key != 'etl_timestamp'}
+    source = [content(properties), [(other_id, content(other), content(edge)) for other_id, other, edge in related]]
+    return hashlib.sha1(json.dumps(source, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def render_manager(manager_id: str, manager: dict, funds: List[tuple]) -> (str, str):
+    """
+    :param manager: FundManager properties
+    :param funds: [(fund_id, fund properties, manage properties)]
+    :return: (text, answer): the text that is embedded and searched, and the pre-formatted profile
+    """
+    name = manager.get('chinesename') or manager_id
+    header = f"基金经理: {name}"
+    if manager.get('company'):
+        header += f" ({manager['company']})"
+    if manager.get('experiencetime') is not None:
+        header += f", 从业年限 {manager['experiencetime']} 年"
+    lines = [header]
+    if manager.get('background'):
+        lines.append(f"简介: {_truncate(manager['background'], BACKGROUND_CHARS)}")
+    lines.append(f"管理基金 ({len(funds)} 只):")
+    for fund_id, fund, _ in funds:
+        fields = [f"{fund.get('fund_name') or fund_id} ({fund.get('fund_code') or fund_id})"]
+        if fund.get('fund_2_type') or fund.get('fund_type'):
+            fields.append(f"类型 {fund.get('fund_2_type') or fund.get('fund_type')}")
+        if fund.get('risk_eva_level') is not None:
+            fields.append(f"风险等级 {fund['risk_eva_level']}")
+        fields += [f"{title} {_percent(fund[key])}" for key, title in KEY_METRICS if _percent(fund.get(key))]
+        lines.append('- ' + ' | '.join(fields))
+
+    text = ' '.join(filter(None, [f"基金经理 {name}", manager.get('company'), manager.get('keywords'),
+                                  ' '.join(fund.get('fund_name') or fund_id for fund_id, fund, _ in funds)]))
+    return text, '\n'.join(lines)
+
+
+def render_fund(fund_id: str, fund: dict, managers: List[tuple]) -> (str, str):
+    """
+    :param managers: [(manager_id, manager properties, manage properties)]
+    :return: (text, answer), see render_manager
+    """
+    name = fund.get('fund_name') or fund_id
+    lines = [f"基金: {name} ({fund.get('fund_code') or fund_id})"]
+    if fund.get('fund_full_name'):
+        lines.append(f"全称: {fund['fund_full_name']}")
+    classification = ' / '.join(str(fund[key]) for key in ('fund_2_type', 'primary_classification', 'secondary_classification',
+                                                             'third_classification', 'fourth_classification') if fund.get(key))
+    if classification:
+        lines.append(f"类型: {classification}")
+    facts = [f"{title} {fund[key]}" for key, title in [('risk_eva_level', '风险等级'), ('rating_star', '评级'),
+                                                       ('establish_date', '成立日期'), ('unit_nav', '单位净值'),
+                                                       ('totshare', '规模(亿份)'), ('trustee_name', '托管人')]
+             if fund.get(key) is not None]
+    if facts:
+        lines.append(', '.join(facts))
+    returns = [f"{title} {_percent(fund[key])}" for key, title in RETURN_METRICS if _percent(fund.get(key))]
+    if returns:
+        lines.append(f"收益: {', '.join(returns)}")
+    if _percent(fund.get('max_draw_down_base')):
+        lines.append(f"最大回撤: {_percent(fund['max_draw_down_base'])}")
+    if managers:
+        names = []
+        for manager_id, manager, manage in managers:
+            entry = manager.get('chinesename') or manager_id
+            if manage.get('manage_time_from'):
+                entry += f" (任职 {manage['manage_time_from']} 至 {manage.get('manage_time_to') or '今'})"
+            names.append(entry)
+        lines.append(f"基金经理: {', '.join(names)}")
+    if fund.get('briefintro'):
+        lines.append(f"简介: {_truncate(fund['briefintro'], BRIEFINTRO_CHARS)}")
+
+    text = ' '.join(filter(None, [f"基金 {name}", fund.get('fund_full_name'), fund.get('fund_code'), classification,
+                                  fund.get('keywords'), ' '.join(manager.get('chinesename') or manager_id
+                                                                 for manager_id, manager, _ in managers)]))
+    return text, '\n'.join(lines)
+
+
+class Manifest:
+    """Source fingerprint of every indexed profile document, saved as JSON after each run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fingerprints: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.fingerprints = json.load(file)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.fingerprints, file)
+        os.replace(tmp_path, self.path)
+
+
+class ProfileMaterializer:
+    """
+    Ingest-time job that walks FundManager-[:manage]->Fund and writes one pre-formatted profile document
+    per manager and per fund into the vector store (profile entity_profile), so questions about a named
+    entity are answered from a document lookup instead of LLM Cypher generation, a graph traversal and
+    a kNN search.
+
+    A document's fingerprint covers every source row it is rendered from (the entity, its manage edges
+    and the entities on the other side). Only documents whose fingerprint changed since the last run are
+    rendered, embedded and written; documents of entities that no longer exist are deleted.
+    """
+
+    def __init__(self, graph_db, vector_dao, titan_embeddings, index_name='text_neptune', dimensions=256,
+                 manifest_path=None, page_size=1000, batch_size=64):
+        self.graph_db = graph_db
+        self.vector_dao = vector_dao
+        self.titan_embeddings = titan_embeddings
+        self.index_name = index_name
+        self.dimensions = dimensions
+        self.manifest = Manifest(manifest_path)
+        self.page_size = page_size
+        self.batch_size = batch_size
+
+    def _pages(self, query):
+        skip = 0
+        while True:
+            rows = self.graph_db.execute_opencypher_query(query, {'skip': skip, 'limit': self.page_size}).get('results', [])
+            yield from rows
+            if len(rows) < self.page_size:
+                return
+            skip += self.page_size
+
+    def load_graph(self):
+        """:return: (managers, funds, edges) with {id: properties} and [(manager_id, fund_id, properties)]"""
+        managers = {row['m']['~id']: row['m'].get('~properties', {}) for row in self._pages(MANAGER_PAGE_QUERY)}
+        funds = {row['f']['~id']: row['f'].get('~properties', {}) for row in self._pages(FUND_PAGE_QUERY)}
+        edges = [(row['manager_id'], row['fund_id'], row['r'].get('~properties', {})) for row in self._pages(MANAGE_PAGE_QUERY)]
+        return managers, funds, edges
+
+    def build_documents(self, managers, funds, edges):
+        """:return: {doc_id: (fingerprint, render)} where render() returns (text, answer)"""
+        funds_of: Dict[str, List[tuple]] = {}
+        managers_of: Dict[str, List[tuple]] = {}
+        for manager_id, fund_id, properties in edges:
+            if manager_id in managers and fund_id in funds:
+                funds_of.setdefault(manager_id, []).append((fund_id, funds[fund_id], properties))
+                managers_of.setdefault(fund_id, []).append((manager_id, managers[manager_id], properties))
+
+        documents = {}
+        for manager_id, manager in managers.items():
+            related = funds_of.get(manager_id, [])
+            documents[profile_doc_id('FundManager', manager_id)] = (
+                _fingerprint(manager, related),
+                lambda manager_id=manager_id, manager=manager, related=related: render_manager(manager_id, manager, related)
+            )
+        for fund_id, fund in funds.items():
+            related = managers_of.get(fund_id, [])
+            documents[profile_doc_id('Fund', fund_id)] = (
+                _fingerprint(fund, related),
+                lambda fund_id=fund_id, fund=fund, related=related: render_fund(fund_id, fund, related)
+            )
+        return documents
+
+    def _write(self, doc_ids, documents):
+        rendered = [documents[doc_id][1]() for doc_id in doc_ids]
+        embeddings = self.titan_embeddings.embed_many([text for text, _ in rendered], dimensions=self.dimensions)
+        samples, written = [], []
+        for doc_id, (text, answer), embedding in zip(doc_ids, rendered, embeddings):
+            if not embedding:
+                logger.error(f"Skipping profile without embedding: {doc_id}")
+                continue
+            samples.append((PROFILE_NAME, text, answer, embedding))
+            written.append(doc_id)
+        indexed = self.vector_dao.add_samples(self.index_name, samples, written)
+        # 写入失败的文档不记录指纹, 下次运行时重试
+        if indexed == len(written):
+            for doc_id in written:
+                self.manifest.fingerprints[doc_id] = documents[doc_id][0]
+        return indexed
+
+    def run(self, full=False):
+        """
+        :param full: Rebuild every document regardless of the manifest
+        :return: {'unchanged', 'rebuilt', 'deleted', 'failed'} document counts
+        """
+        documents = self.build_documents(*self.load_graph())
+        changed = [doc_id for doc_id, (fingerprint, _) in documents.items()
+                   if full or self.manifest.fingerprints.get(doc_id) != fingerprint]
+        removed = [doc_id for doc_id in self.manifest.fingerprints if doc_id not in documents]
+        logger.info(f"Profiles: {len(documents)} entities, {len(changed)} to rebuild, {len(removed)} to delete")
+
+        rebuilt = 0
+        try:
+            for start in range(0, len(changed), self.batch_size):
+                rebuilt += self._write(changed[start:start + self.batch_size], documents)
+            for doc_id in removed:
+                try:
+                    self.vector_dao.delete_sample(self.index_name, doc_id)
+                except Exception as e:
+                    logger.error(f"Failed to delete profile {doc_id}: {e}")
+                self.manifest.fingerprints.pop(doc_id, None)
+        finally:
+            self.manifest.save()
+
+        counts = {'unchanged': len(documents) - len(changed), 'rebuilt': rebuilt, 'deleted': len(removed),
+                  'failed': len(changed) - rebuilt}
+        logger.info(f"Profiles materialized: {counts}")
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Materialize manager and fund profile documents into the vector store')
+    parser.add_argument('--config', default='config_files/aws_config.yaml')
+    parser.add_argument('--full', action='store_true', help='Rebuild every profile, ignoring the manifest')
+    args = parser.parse_args()
+
+    from core.chat_service import ChatService
+    from llm.embedding import TitanEmbeddings
+    from llm.embedding_cache import EmbeddingCache
+
+    with open(args.config) as file:
+        aws_config = yaml.load(file, Loader=SafeLoader)
+    profile_info = aws_config.get('entity_profile_info', {})
+    embedding_cache_info = aws_config.get('embedding_cache_info', {})
+    titan_embeddings = TitanEmbeddings(
+        cache=EmbeddingCache(embedding_cache_info.get('cache_dir', '.cache/embeddings'))
+        if embedding_cache_info.get('enabled', False) else None
+    )
+    materializer = ProfileMaterializer(
+        ChatService.create_graph_db(aws_config, 4),
+        ChatService.create_vector_dao(aws_config, 4),
+        titan_embeddings,
+        index_name=profile_info.get('index_name', 'text_neptune'),
+        dimensions=aws_config.get('opensearch_info', {}).get('embedding_dimension', 256),
+        manifest_path=profile_info.get('manifest_path', '.cache/entity_profiles.json')
+    )
+    materializer.run(full=args.full)
+
+
+# 使用示例: 每次数据导入后运行 python -m database.profile_materializer
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# 每个字节中 1 的个数, 用于计算汉明距离
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class VectorQuantizer:
+    """
+    Compressed form of the embeddings kept in the kNN index; the full float vectors are only read back
+    to rescore candidates.
+    - int8: symmetric scalar quantization with one scale for all dimensions, so cosine similarity of
+      the codes approximates cosine similarity of the floats. The scale is calibrated on a sample of the
+      corpus (a high percentile of the absolute values) and stored in a JSON file, because documents and
+      queries must be encoded with the same scale.
+    - binary: one sign bit per dimension packed into bytes (the same thresholding as Titan binary
+      output), compared with hamming distance. Needs no calibration.
+    """
+
+    MODES = ('int8', 'binary')
+
+    def __init__(self, mode: str = 'int8', scale: Optional[float] = None):
+        if mode not in self.MODES:
+            raise Exception(f"Unknown quantization mode {mode}, expected one of {self.MODES}")
+        self.mode = mode
+        self.scale = scale
+
+    @classmethod
+    def from_config(cls, quantization_info: dict) -> Optional['VectorQuantizer']:
+        """
+        :param quantization_info: opensearch_info.vector_quantization section
+        :return: The quantizer, or None when mode is none
+        """
+        mode = (quantization_info or {}).get('mode', 'none')
+        if mode == 'none':
+            return None
+        if mode == 'binary':
+            return cls('binary')
+        path = quantization_info.get('calibration_path', 'config_files/vector_calibration.json')
+        if not os.path.exists(path):
+            raise Exception(f"int8 quantization needs a calibration file, create {path} with "
+                            f"python -m database.quantization --calibration-out {path}")
+        return cls.load(path)
+
+    def fit(self, vectors, percentile: float = 99.9) -> 'VectorQuantizer':
+        """Calibrate the int8 scale: values beyond the percentile of |x| are clipped."""
+        if self.mode == 'int8':
+            vectors = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            bound = float(np.percentile(np.abs(vectors / np.where(norms > 0, norms, 1)), percentile))
+            self.scale = (bound or 1.0) / 127
+        return self
+
+    def encode(self, vectors) -> np.ndarray:
+        """
+        :param vectors: (n, dimension) float vectors, or one vector
+        :return: int8 codes; for binary the packed bits are returned as signed bytes, as OpenSearch expects
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.mode == 'binary':
+            return np.packbits(vectors > 0, axis=-1).view(np.int8)
+        if self.scale is None:
+            raise Exception("int8 quantizer is not calibrated")
+        # 校准基于单位向量, 编码前先归一化 (不改变余弦相似度)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        return np.clip(np.rint(vectors / self.scale), -128, 127).astype(np.int8)
+
+    def encode_one(self, embedding) -> List[int]:
+        return self.encode(embedding).tolist()
+
+    def scores(self, query_codes: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Similarity of one encoded query to every row of codes, higher is closer."""
+        if self.mode == 'binary':
+            distances = _POPCOUNT[np.bitwise_xor(codes.view(np.uint8), query_codes.view(np.uint8))].sum(axis=1, dtype=np.int32)
+            return -distances.astype(np.float32)
+        codes = codes.astype(np.float32)
+        query = query_codes.astype(np.float32)
+        norms = np.linalg.norm(codes, axis=1) * (np.linalg.norm(query) or 1.0)
+        return (codes @ query) / np.where(norms > 0, norms, 1.0)
+
+    def bytes_per_vector(self, dimension: int) -> int:
+        return (dimension + 7) // 8 if self.mode == 'binary' else dimension
+
+    def knn_mapping(self, dimension: int) -> dict:
+        """knn_vector mapping of the quantized vector field."""
+        if self.mode == 'binary':
+            # binary 向量仅 faiss 引擎支持, 维度按 bit 计且须为 8 的倍数
+            return {
+                "type": "knn_vector",
+                "dimension": dimension,
+                "data_type": "binary",
+                "method": {"name": "hnsw", "space_type": "hamming", "engine": "faiss"}
+            }
+        return {
+            "type": "knn_vector",
+            "dimension": dimension,
+            "data_type": "byte",
+            "method": {"name": "hnsw", "space_type": "cosinesimil", "engine": "lucene"}
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'mode': self.mode, 'scale': self.scale}, file)
+
+    @classmethod
+    def load(cls, path) -> 'VectorQuantizer':
+        with open(path) as file:
+            calibration = json.load(file)
+        return cls(calibration['mode'], calibration.get('scale'))
+
+
+def rescore(query_embedding, hits: List[dict], top_k: int, vector_field: str = 'vector_full') -> List[dict]:
+    """
+    Second phase of a quantized search: order the over-fetched hits by full-precision cosine similarity
+    :param hits: OpenSearch hits whose _source holds the float vector in vector_field
+    :return: The top_k hits, _score replaced with the OpenSearch cosinesimil score 1 / (2 - cos);
+             the float vector is removed from _source. Hits without it (documents indexed before
+             quantization was enabled) keep their kNN _score
+    """
+    if not hits:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    full = [i for i, hit in enumerate(hits) if hit.get('_source', {}).get(vector_field) is not None]
+    if len(full) < len(hits):
+        logger.warning(f"{len(hits) - len(full)} of {len(hits)} hits have no {vector_field}, keeping their kNN score; reindex to rescore them")
+    scores = np.asarray([hit.get('_score') or 0.0 for hit in hits], dtype=np.float64)
+    if full:
+        vectors = np.asarray([hits[i]['_source'][vector_field] for i in full], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarities = (vectors @ query) / np.where(norms > 0, norms, 1.0)
+        scores[full] = 1.0 / (2.0 - similarities)
+    order = np.argsort(-scores, kind='stable')[:top_k]
+    return [dict(hits[i], _score=float(scores[i]),
+                 _source={key: value for key, value in hits[i].get('_source', {}).items() if key != vector_field})
+            for i in order]
+
+
+def hnsw_memory_bytes(count: int, bytes_per_vector: int, m: int = 16) -> float:
+    # OpenSearch 文档中 HNSW 内存估算公式: 1.1 * (向量字节数 + 8 * M) * 向量个数
+    return 1.1 * (bytes_per_vector + 8 * m) * count
+
+
+def recall_report(vectors: np.ndarray, query_count: int = 200, top_k: int = 10, oversample=(1, 2, 4, 8),
+                  calibration_percentile: float = 99.9, seed: int = 0) -> List[dict]:
+    """
+    Recall@top_k of the quantized two-phase search against exact float search, per mode and over-fetch factor
+    :param vectors: Corpus embeddings; query_count of them are held out as queries
+    :return: One row per (mode, oversample) with recall, vector and HNSW memory and the search time per query
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    query_count = min(query_count, len(vectors) // 2)
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    queries, corpus = vectors[order[:query_count]], vectors[order[query_count:]]
+    top_k = min(top_k, len(corpus))
+    dimension = corpus.shape[1]
+
+    truth = [set(np.argsort(-(corpus @ query))[:top_k]) for query in queries]
+    started = time.perf_counter()
+    for query in queries:
+        np.argpartition(-(corpus @ query), top_k - 1)[:top_k]
+    float_ms = (time.perf_counter() - started) * 1000 / max(query_count, 1)
+    rows = [{'mode': 'float32', 'oversample': 1, 'recall': 1.0, 'bytes_per_vector': 4 * dimension,
+             'vector_mb': 4 * dimension * len(corpus) / 2 ** 20,
+             'hnsw_mb': hnsw_memory_bytes(len(corpus), 4 * dimension) / 2 ** 20, 'search_ms': float_ms}]
+
+    for mode in VectorQuantizer.MODES:
+        quantizer = VectorQuantizer(mode).fit(corpus, calibration_percentile)
+        codes = quantizer.encode(corpus)
+        bytes_per_vector = quantizer.bytes_per_vector(dimension)
+        for factor in oversample:
+            candidates = min(len(corpus), top_k * factor)
+            hits = 0
+            started = time.perf_counter()
+            for query, expected in zip(queries, truth):
+                scores = quantizer.scores(quantizer.encode(query), codes)
+                shortlist = np.argpartition(-scores, candidates - 1)[:candidates]
+                rescored = shortlist[np.argsort(-(corpus[shortlist] @ query))[:top_k]]
+                hits += len(expected.intersection(rescored.tolist()))
+            rows.append({
+                'mode': mode,
+                'oversample': factor,
+                'recall': hits / max(query_count * top_k, 1),
+                'bytes_per_vector': bytes_per_vector,
+                'vector_mb': bytes_per_vector * len(corpus) / 2 ** 20,
+                'hnsw_mb': hnsw_memory_bytes(len(corpus), bytes_per_vector) / 2 ** 20,
+                'search_ms': (time.perf_counter() - started) * 1000 / max(query_count, 1)
+            })
+    return rows
+
+
+def print_report(rows: List[dict], corpus_size: int, top_k: int):
+    print(f"corpus={corpus_size}  recall@{top_k} against exact float32 search; memory excludes the full vectors in _source, "
+          f"ms/query is a brute-force NumPy scan")
+    print(f"  {'mode':<8} {'oversample':>10} {'recall':>8} {'bytes/vec':>10} {'vector MB':>10} {'HNSW MB':>10} {'ms/query':>9}")
+    for row in rows:
+        print(f"  {row['mode']:<8} {row['oversample']:>10} {row['recall']:>8.4f} {row['bytes_per_vector']:>10} "
+              f"{row['vector_mb']:>10.2f} {row['hnsw_mb']:>10.2f} {row['search_ms']:>9.3f}")
+
+
+def synthetic_vectors(count: int, dimensions: int = 256, clusters: int = 64, spread: float = 0.5, seed: int = 0) -> np.ndarray:
+    """Clustered Gaussian vectors, for trying the report without real embeddings; real recall can differ."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    return centers[rng.integers(0, clusters, count)] + spread * rng.standard_normal((count, dimensions)).astype(np.float32)
+
+
+def load_vectors(local_index=None, input_path=None, dimensions=256) -> np.ndarray:
+    """Embeddings of a local vector index directory, or of the text field of a JSONL/CSV file (via Titan)."""
+    if local_index:
+        from database.local_vector import LocalVectorIndex
+        index = LocalVectorIndex(local_index)
+        return np.asarray(index.matrix()[np.flatnonzero(index.alive)])
+
+    from database.opensearch_indexer import iter_records
+    from llm.embedding import TitanEmbeddings
+    from llm.embedding_cache import EmbeddingCache
+    texts = [record['text'] for record in iter_records(input_path)]
+    embeddings = TitanEmbeddings(cache=EmbeddingCache('.cache/embeddings')).embed_many(texts, dimensions=dimensions)
+    return np.asarray([embedding for embedding in embeddings if embedding], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recall-vs-memory report of quantized embeddings, and int8 calibration')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--local-index', help='Local vector index directory, e.g. .cache/vector_index/text_neptune')
+    source.add_argument('--input', help='JSONL or CSV file with a text field, embedded with Titan (cached)')
+    source.add_argument('--synthetic', type=int, help='Use this many clustered random vectors instead of embeddings')
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=200, help='Vectors held out as queries')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--oversample', type=int, nargs='+', default=[1, 2, 4, 8], help='Over-fetch factors of the first phase')
+    parser.add_argument('--percentile', type=float, default=99.9, help='Percentile of |x| used as the int8 clipping bound')
+    parser.add_argument('--calibration-out', help='Write the int8 calibration fitted on the whole corpus to this file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dimensions)
+    else:
+        vectors = load_vectors(args.local_index, args.input, args.dimensions)
+    if len(vectors) < 2:
+        raise SystemExit("Need at least two embeddings")
+    rows = recall_report(vectors, args.queries, args.top_k, args.oversample, args.percentile)
+    print_report(rows, len(vectors) - min(args.queries, len(vectors) // 2), args.top_k)
+
+    if args.calibration_out:
+        VectorQuantizer('int8').fit(vectors, args.percentile).save(args.calibration_out)
+        logger.info(f"Saved int8 calibration to {args.calibration_out}")
+
+
+# 使用示例: python -m database.quantization --local-index .cache/vector_index/text_neptune --calibration-out config_files/vector_calibration.json
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import re
+from typing import Dict, List
+
+_TOKEN = re.compile(r'[一-鿿]|[0-9a-z]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Same tokens as the OpenSearch standard analyzer for this data: one token per CJK character,
+    lowercase alphanumeric runs otherwise.
+    """
+    return _TOKEN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], rank_constant: int = 60, top_n: int = 3) -> List[dict]:
+    """
+    Fuse ranked hit lists: each hit scores sum(1 / (rank_constant + rank)) over the lists it appears in.
+    :param result_lists: Lists of OpenSearch-style hits ({'_id', '_source', ...}), best first
+    :param rank_constant: Damping constant; larger values flatten the contribution of top ranks
+    :param top_n: Number of fused hits to return
+    :return: Hits ordered by fused score, '_score' replaced by the fused score and 'ranks' holding the
+             1-based rank in each input list (None when absent)
+    """
+    fused: Dict[str, dict] = {}
+    for list_index, hits in enumerate(result_lists):
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.get(hit['_id'])
+            if entry is None:
+                entry = fused[hit['_id']] = dict(hit, _score=0.0, ranks=[None] * len(result_lists))
+            entry['_score'] += 1.0 / (rank_constant + rank)
+            entry['ranks'][list_index] = rank
+    return sorted(fused.values(), key=lambda hit: -hit['_score'])[:top_n]
@@ -0,0 +1,104 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Tokens of an openCypher query: string literals are kept verbatim, everything else is whitespace-collapsed
+_CYPHER_TOKEN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\s+|[^\s'\"`]+")
+_WRITE_CLAUSE = re.compile(r'\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|LOAD|CALL)\b', re.IGNORECASE)
+
+
+def canonicalize_query(query: str) -> str:
+    """
+    Canonical form of an openCypher query: whitespace runs outside string literals
+    are collapsed to a single space and a trailing semicolon is dropped.
+    """
+    parts = []
+    for token in _CYPHER_TOKEN.findall(query.strip()):
+        parts.append(' ' if token.isspace() else token)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def is_read_only(query: str) -> bool:
+    """True if the query has no write clause outside string literals."""
+    code = ' '.join(token for token in _CYPHER_TOKEN.findall(query) if token[0] not in '\'"`')
+    return _WRITE_CLAUSE.search(code) is None
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results bounded by entry count and total serialized size.
+
+    Entries expire after ttl_seconds, and every key includes the current data version,
+    so bump_data_version() after a data load invalidates everything cached before it.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 600, data_version=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.data_version = data_version
+        self._entries = OrderedDict()  # key -> (result, size, created_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, query: str, parameters: dict = None) -> str:
+        return json.dumps([self.data_version, canonicalize_query(query), parameters or {}], sort_keys=True, ensure_ascii=False)
+
+    def get(self, key: str):
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result):
+        size = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, time.time())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def bump_data_version(self, data_version=None):
+        """
+        Invalidate all cached results after a data load.
+        :param data_version: New version, e.g. the etl_timestamp of the load (default: current time)
+        """
+        with self._lock:
+            self.data_version = data_version if data_version is not None else int(time.time())
+            self._entries.clear()
+            self._bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'data_version': self.data_version
+            }
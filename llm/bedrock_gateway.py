@@ -0,0 +1,286 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from utils.tracing import get_registry, count
+
+# Error codes that mean "slow down": they shrink the model's rate and are retried
+THROTTLING_CODES = ('ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException')
+# Transient errors that are retried without changing the rate
+RETRYABLE_CODES = THROTTLING_CODES + ('ServiceUnavailableException', 'ModelNotReadyException', 'InternalServerException')
+
+
+class TokenBucket:
+    """
+    Token bucket where callers reserve tokens up front. The balance may go negative; each caller then
+    waits for the time it takes to refill its own reservation, which keeps callers in arrival order
+    without polling.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """:return: Seconds to wait before the reserved tokens are available"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        # 按实际消耗修正预留量: 正数表示多扣, 负数表示少扣
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_rate(self, rate_per_second: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate_per_second
+
+
+class ModelLimiter:
+    """
+    Request and token budgets of one model id, with AIMD adaptation: every throttling response halves
+    the effective rate (down to min_scale of the configured rate) and every success recovers 5% of it.
+    """
+
+    def __init__(self, model_id: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 min_scale: float = 0.1):
+        self.model_id = model_id
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_scale = min_scale
+        self.scale = 1.0
+        # 突发容量为 1 秒的配额, 至少允许单个请求通过
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60)) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60)) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def _set_scale(self, scale):
+        self.scale = scale
+        if self.requests is not None:
+            self.requests.set_rate(self.requests_per_minute / 60 * scale)
+        if self.tokens is not None:
+            self.tokens.set_rate(self.tokens_per_minute / 60 * scale)
+        get_registry().gauge('bedrock_gateway_rate_scale', 'Fraction of the configured Bedrock rate in use').set(scale, model=self.model_id)
+
+    def on_throttle(self):
+        with self._lock:
+            self._set_scale(max(self.min_scale, self.scale * 0.5))
+
+    def on_success(self):
+        with self._lock:
+            if self.scale < 1.0:
+                self._set_scale(min(1.0, self.scale + 0.05))
+
+
+class BedrockGateway:
+    """
+    Shared entry point for Bedrock calls of one process:
+    - per model id request and token budgets (token buckets) applied before the call;
+    - retries with exponential backoff and full jitter on throttling, transient errors and network failures,
+      with the model rate reduced on throttling only (botocore retries should be disabled on clients that use
+      the gateway);
+    - single flight: concurrent calls with the same model id and body share one in-flight request.
+    Queue depth, wait time, throttles and coalesced calls are exported through utils.tracing.
+    """
+
+    def __init__(self, model_limits: Dict[str, dict] = None, default_limits: dict = None,
+                 max_attempts: int = 6, base_delay: float = 0.25, max_delay: float = 20.0):
+        self.model_limits = model_limits or {}
+        self.default_limits = default_limits or {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiters: Dict[str, ModelLimiter] = {}
+        self.in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, gateway_info: dict) -> 'BedrockGateway':
+        return cls(
+            model_limits=gateway_info.get('models', {}),
+            default_limits=gateway_info.get('default', {}),
+            max_attempts=gateway_info.get('max_attempts', 6),
+            base_delay=gateway_info.get('base_delay', 0.25),
+            max_delay=gateway_info.get('max_delay', 20.0)
+        )
+
+    def limiter(self, model_id: str) -> ModelLimiter:
+        with self._lock:
+            if model_id not in self.limiters:
+                limits = self.model_limits.get(model_id, self.default_limits)
+                self.limiters[model_id] = ModelLimiter(model_id, limits.get('requests_per_minute'), limits.get('tokens_per_minute'))
+            return self.limiters[model_id]
+
+    @staticmethod
+    def estimate_tokens(body: str, max_output_tokens: int = 0) -> int:
+        # 请求体以中文为主, 按约 2 个字符 1 个 token 粗略估计, 调用完成后按实际用量修正
+        return len(body) // 2 + max_output_tokens
+
+    def invoke(self, model_id: str, body: str, call: Callable[[], object], max_output_tokens: int = 0,
+               usage: Callable[[object], Optional[int]] = None, dedup: bool = True, stream: bool = False):
+        """
+        Run call() under the model's limits
+        :param model_id: Bedrock model id, selects the limits
+        :param body: Request body, used for the token estimate and the single-flight key
+        :param call: Performs the Bedrock request and returns its result; with dedup the result is shared
+                     between callers, so it must not be a stream
+        :param max_output_tokens: Output tokens reserved on top of the input estimate
+        :param usage: Returns the actual token count from the result, to correct the reservation; for a stream
+                      it is applied to each decoded chunk and the reservation is corrected once the stream ends
+        :param dedup: Share the result with concurrent identical calls
+        :param stream: call() returns an invoke_model_with_response_stream response, which is never shared
+        """
+        if not dedup or stream:
+            return self._invoke(model_id, body, call, max_output_tokens, usage, stream)
+
+        key = hashlib.sha1(f'{model_id}\n{body}'.encode('utf-8')).hexdigest()
+        with self._lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            count('bedrock_gateway_coalesced_total', 'Bedrock calls served by an identical in-flight call', model=model_id)
+            return future.result()
+
+        try:
+            result = self._invoke(model_id, body, call, max_output_tokens, usage)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self.in_flight.pop(key, None)
+
+    def _invoke(self, model_id, body, call, max_output_tokens, usage, stream=False):
+        # Imported here so that importing the gateway does not load botocore. ConnectionError and HTTPClientError
+        # are the network failures (EndpointConnectionError, ReadTimeoutError, ConnectionClosedError, ...) that
+        # botocore's standard retry mode retried before the gateway disabled it; retried with backoff, no rate cut
+        from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+        limiter = self.limiter(model_id)
+        metrics = get_registry()
+        queue_depth = metrics.gauge('bedrock_gateway_queue_depth', 'Bedrock calls waiting for rate limit budget')
+        wait_time = metrics.histogram('bedrock_gateway_wait_seconds', 'Time Bedrock calls waited for rate limit budget')
+
+        for attempt in range(1, self.max_attempts + 1):
+            estimated_tokens = self.estimate_tokens(body, max_output_tokens)
+            wait = limiter.reserve(estimated_tokens)
+            wait_time.observe(wait, model=model_id)
+            if wait > 0:
+                queue_depth.inc(model=model_id)
+                try:
+                    time.sleep(wait)
+                finally:
+                    queue_depth.dec(model=model_id)
+
+            try:
+                result = call()
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code', '')
+                # 请求未被执行, 退还预留的 token
+                limiter.settle(estimated_tokens, 0)
+                if code not in RETRYABLE_CODES or attempt == self.max_attempts:
+                    raise
+                if code in THROTTLING_CODES:
+                    count('bedrock_throttles_total', 'Throttled Bedrock calls', model=model_id)
+                    limiter.on_throttle()
+                count('bedrock_retries_total', 'Bedrock retry attempts', model=model_id)
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            except (ConnectionError, HTTPClientError) as e:
+                # 连接未建立时请求未被执行, 退还预留的 token; 读超时等情况下请求可能已被执行, 保留预留量
+                if isinstance(e, ConnectionError):
+                    limiter.settle(estimated_tokens, 0)
+                if attempt == self.max_attempts:
+                    raise
+                count('bedrock_retries_total', 'Bedrock retry attempts', model=model_id)
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+
+            limiter.on_success()
+            if stream:
+                input_tokens = self.estimate_tokens(body)
+                result['body'] = self._settled_stream(result['body'], limiter, estimated_tokens, input_tokens, usage)
+                return result
+            limiter.settle(estimated_tokens, usage(result) if usage is not None else None)
+            return result
+
+    @staticmethod
+    def _settled_stream(events, limiter, estimated_tokens, input_tokens, usage):
+        """
+        Pass the stream events through and, once the stream ends or is closed, correct the token reservation
+        from the usage in the last chunk
+        """
+        actual_tokens, streamed_bytes = None, 0
+        try:
+            for event in events:
+                chunk = event.get('chunk')
+                if chunk is not None:
+                    streamed_bytes += len(chunk['bytes'])
+                    if usage is not None and b'invocationMetrics' in chunk['bytes']:
+                        actual_tokens = usage(json.loads(chunk['bytes']))
+                yield event
+        finally:
+            # 流被提前关闭或没有用量信息时, 按输入估计加已收到的输出估计, 退还其余的输出预留
+            if actual_tokens is None:
+                actual_tokens = min(estimated_tokens, input_tokens + streamed_bytes // 2)
+            limiter.settle(estimated_tokens, actual_tokens)
+
+
+def llama_usage(response_body: dict) -> Optional[int]:
+    if 'prompt_token_count' not in response_body:
+        return None
+    return response_body.get('prompt_token_count', 0) + response_body.get('generation_token_count', 0)
+
+
+def llama_stream_usage(chunk: dict) -> Optional[int]:
+    # 流式响应的最后一个 chunk 带有本次调用的用量
+    metrics = chunk.get('amazon-bedrock-invocationMetrics')
+    if metrics is None:
+        return None
+    return metrics.get('inputTokenCount', 0) + metrics.get('outputTokenCount', 0)
+
+
+def titan_usage(response_body: dict) -> Optional[int]:
+    return response_body.get('inputTextTokenCount')
+
+
+if __name__ == "__main__":
+    gateway = BedrockGateway(default_limits={'requests_per_minute': 120, 'tokens_per_minute': 100000})
+    body = json.dumps({'prompt': 'who are you', 'max_gen_len': 64})
+    started = time.monotonic()
+    for _ in range(5):
+        gateway.invoke('meta.llama3-70b-instruct-v1:0', body, lambda: {'generation': 'I am a stub'}, max_output_tokens=64)
+    print(f"5 calls in {time.monotonic() - started:.2f}s")
+    print(get_registry().to_prometheus())
@@ -1,6 +1,11 @@
 import json
-import boto3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict
+from llm.embedding_cache import EmbeddingCache
+from utils.tracing import count
+from utils.startup import timed
+from llm.bedrock_gateway import BedrockGateway, titan_usage
 
 class TitanEmbeddings:
     ACCEPT = "application/json"
@@ -9,9 +14,32 @@ class TitanEmbeddings:
     DEFAULT_REGION = 'us-east-1'
     DEFAULT_MODEL_ID = "amazon.titan-embed-text-v2:0"
 
-    def __init__(self, model_id: str = DEFAULT_MODEL_ID, boto3_client: Optional[boto3.client] = None, region_name: str = DEFAULT_REGION):
-        self.bedrock_boto3 = boto3_client or boto3.client(service_name=self.SERVICE_NAME, region_name=region_name)
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID, boto3_client=None, region_name: str = DEFAULT_REGION,
+                 max_pool_connections: int = 10, cache: Optional[EmbeddingCache] = None, gateway: Optional[BedrockGateway] = None):
+        # Without boto3_client the bedrock-runtime client is created on first use
+        self._bedrock_boto3 = boto3_client
+        self._lock = threading.Lock()
+        self.region_name = region_name
+        self.gateway = gateway
         self.model_id = model_id
+        self.max_pool_connections = max_pool_connections
+        self.cache = cache
+
+    @property
+    def bedrock_boto3(self):
+        if self._bedrock_boto3 is None:
+            with self._lock:
+                if self._bedrock_boto3 is None:
+                    with timed('titan_client'):
+                        import boto3
+                        from botocore.config import Config
+                        # With a gateway, retries and rate limiting happen there instead of in botocore
+                        retries = {'total_max_attempts': 1, 'mode': 'standard'} if self.gateway is not None else None
+                        self._bedrock_boto3 = boto3.client(
+                            service_name=self.SERVICE_NAME,
+                            config=Config(region_name=self.region_name, max_pool_connections=self.max_pool_connections, retries=retries)
+                        )
+        return self._bedrock_boto3
 
     def __call__(self, text: str, dimensions: int, normalize: bool = True) -> List[float]:
         """
@@ -25,28 +53,87 @@ class TitanEmbeddings:
         Returns:
             List[float]: Embedding.
         """
+        if self.cache is not None:
+            embedding = self.cache.get(text, self.model_id, dimensions, normalize)
+            count('embedding_cache_requests_total', 'Embedding cache lookups', result='hit' if embedding is not None else 'miss')
+            if embedding is not None:
+                return embedding
+
+        embedding = self._invoke(text, dimensions, normalize)
+        if self.cache is not None and embedding:
+            self.cache.put(text, self.model_id, dimensions, normalize, embedding)
+        return embedding
+
+    def embed_many(self, texts: List[str], dimensions: int, normalize: bool = True, max_workers: Optional[int] = None) -> List[List[float]]:
+        """
+        Returns Titan Embeddings for many texts
+
+        Cached texts are served from the cache; the remaining distinct texts are embedded
+        concurrently with at most max_workers Bedrock calls in flight.
+
+        Args:
+            texts (List[str]): Texts to embed.
+            dimensions (int): Number of output dimensions.
+            normalize (bool): Whether to return the normalized embedding or not.
+            max_workers (int): Maximum concurrent Bedrock calls (default: the client connection pool size).
+
+        Returns:
+            List[List[float]]: Embeddings, in the same order as texts.
+        """
+        embeddings: Dict[str, List[float]] = {}
+        misses = []
+        for text in dict.fromkeys(texts):
+            embedding = self.cache.get(text, self.model_id, dimensions, normalize) if self.cache is not None else None
+            if embedding is not None:
+                embeddings[text] = embedding
+            else:
+                misses.append(text)
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_pool_connections) as executor:
+                for text, embedding in zip(misses, executor.map(lambda t: self._invoke(t, dimensions, normalize), misses)):
+                    embeddings[text] = embedding
+                    if self.cache is not None and embedding:
+                        self.cache.put(text, self.model_id, dimensions, normalize, embedding)
+
+        return [embeddings[text] for text in texts]
+
+    def _invoke(self, text: str, dimensions: int, normalize: bool) -> List[float]:
         body = json.dumps({
             "inputText": text,
             "dimensions": dimensions,
             "normalize": normalize
         })
 
-        try:
+        def call():
             response = self.bedrock_boto3.invoke_model(
                 body=body,
                 modelId=self.model_id,
                 accept=self.ACCEPT,
                 contentType=self.CONTENT_TYPE
             )
-            response_body = json.loads(response['body'].read())
+            count('bedrock_requests_total', 'Bedrock calls', model=self.model_id)
+            retries = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            if retries:
+                count('bedrock_retries_total', 'Bedrock retry attempts', amount=retries, model=self.model_id)
+            return json.loads(response['body'].read())
+
+        try:
+            if self.gateway is None:
+                response_body = call()
+            else:
+                response_body = self.gateway.invoke(self.model_id, body, call, usage=titan_usage)
             return response_body.get('embedding', [])
         except Exception as e:
+            count('bedrock_errors_total', 'Failed Bedrock calls', model=self.model_id, error=type(e).__name__)
             # Log the error or handle it as needed
             print(f"Error invoking model: {e}")
             return []
 
 
 if __name__ == "__main__":
-    titan_embeddings = TitanEmbeddings()
+    titan_embeddings = TitanEmbeddings(cache=EmbeddingCache('.cache/embeddings'))
     embedding = titan_embeddings("Hello, world!", dimensions=256)
-    print(embedding)
\ No newline at end of file
+    print(embedding)
+    embeddings = titan_embeddings.embed_many(["Hello, world!", "你好, 世界!"], dimensions=256)
+    print(len(embeddings))
@@ -0,0 +1,132 @@
+import os
+import re
+import fcntl
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by content hash + model id + dimensions + normalize flag.
+
+    Each (model id, dimensions, normalize) combination is stored as a pair of files:
+    `<name>.f32` holds the vectors as contiguous float32 rows and is read through a
+    memory map, and `<name>.idx` holds one "<content hash> <row>" line per vector.
+    Both files are append-only and shared by every process using the cache directory: rows are
+    assigned from the file size under an exclusive file lock, and each process picks up the
+    entries written by the others on a cache miss. A write interrupted mid-row is dropped by the
+    next writer.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._stores: Dict[tuple, '_VectorStore'] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _store(self, model_id: str, dimensions: int, normalize: bool) -> '_VectorStore':
+        namespace = (model_id, dimensions, normalize)
+        with self._lock:
+            if namespace not in self._stores:
+                name = f"{re.sub(r'[^A-Za-z0-9.-]+', '_', model_id)}_{dimensions}_{'norm' if normalize else 'raw'}"
+                self._stores[namespace] = _VectorStore(os.path.join(self.cache_dir, name), dimensions)
+            return self._stores[namespace]
+
+    def get(self, text: str, model_id: str, dimensions: int, normalize: bool) -> Optional[List[float]]:
+        return self._store(model_id, dimensions, normalize).get(self.content_hash(text))
+
+    def put(self, text: str, model_id: str, dimensions: int, normalize: bool, embedding: List[float]):
+        if len(embedding) != dimensions:
+            return
+        self._store(model_id, dimensions, normalize).put(self.content_hash(text), embedding)
+
+
+class _VectorStore:
+    def __init__(self, path_prefix: str, dimensions: int):
+        self.vector_path = path_prefix + '.f32'
+        self.index_path = path_prefix + '.idx'
+        self.lock_path = path_prefix + '.lock'
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * np.dtype(np.float32).itemsize
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0  # 已读入的 .idx 字节数
+        self._index_lines = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+        for path in (self.vector_path, self.index_path):
+            open(path, 'ab').close()
+        self._read_index()
+
+    def _read_index(self):
+        """Read the index entries appended since the last call, including those of other processes."""
+        with open(self.index_path, 'rb') as index_file:
+            index_file.seek(self._index_offset)
+            data = index_file.read()
+        end = data.rfind(b'\n') + 1  # 末尾未写完的行留到下次再读
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].isdigit():
+                self._rows.setdefault(parts[0], int(parts[1]))
+            elif len(parts) == 1:
+                # 旧格式: 每行一个哈希, 行号即向量行号
+                self._rows.setdefault(parts[0], self._index_lines)
+            self._index_lines += 1
+        self._index_offset += end
+
+    def _vectors(self, row: int) -> Optional[np.ndarray]:
+        if self._mmap is None or row >= len(self._mmap):
+            row_count = os.path.getsize(self.vector_path) // self.row_bytes
+            if row >= row_count:
+                return None
+            self._mmap = np.memmap(self.vector_path, dtype=np.float32, mode='r', shape=(row_count, self.dimensions))
+        return self._mmap
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                # 其他进程可能已写入该向量
+                self._read_index()
+                row = self._rows.get(key)
+                if row is None:
+                    return None
+            # 读取时再次确认该行已完整写入
+            vectors = self._vectors(row)
+            return vectors[row].tolist() if vectors is not None else None
+
+    def put(self, key: str, embedding: List[float]):
+        with self._lock:
+            if key in self._rows:
+                return
+            # 多个进程共享缓存目录: 在文件排他锁内以文件末尾偏移确定行号, 先写向量再写索引
+            with open(self.lock_path, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    with open(self.vector_path, 'r+b') as vector_file:
+                        size = vector_file.seek(0, os.SEEK_END)
+                        if size % self.row_bytes:
+                            # 中断的写入留下的不完整行
+                            size = vector_file.truncate(size - size % self.row_bytes)
+                            vector_file.seek(size)
+                        vector_file.write(np.asarray(embedding, dtype=np.float32).tobytes())
+                    row = size // self.row_bytes
+                    with open(self.index_path, 'r+b') as index_file:
+                        index_size = index_file.seek(0, os.SEEK_END)
+                        tail_start = max(0, index_size - 256)
+                        index_file.seek(tail_start)
+                        tail = index_file.read()
+                        if tail and not tail.endswith(b'\n'):
+                            # 丢弃中断的写入留下的半行, 否则会与新行拼在一起
+                            index_file.truncate(tail_start + tail.rfind(b'\n') + 1)
+                        index_file.seek(0, os.SEEK_END)
+                        index_file.write(f'{key} {row}\n'.encode('utf-8'))
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._rows[key] = row
@@ -1,24 +1,41 @@
-import boto3
 import json
 import logging
-from botocore.config import Config
+import threading
+from utils.tracing import count
+from utils.startup import timed
+from llm.bedrock_gateway import BedrockGateway, llama_usage, llama_stream_usage
 
 class BedrockLLMClient:
-    def __init__(self, region_name="us-east-1"):
-        self.config = Config(
-            region_name=region_name,
-            signature_version='v4',
-            retries={
-                'max_attempts': 10,
-                'mode': 'standard'
-            },
-            read_timeout=600
-        )
+    def __init__(self, region_name="us-east-1", max_pool_connections=10, gateway: BedrockGateway = None):
+        self.gateway = gateway
+        self.region_name = region_name
+        self.max_pool_connections = max_pool_connections
         self.bedrock = None
+        self._lock = threading.Lock()
 
     def get_bedrock_client(self):
+        # boto3 is imported and the client created on first use, keeping both off the startup path
         if not self.bedrock:
-            self.bedrock = boto3.client(service_name='bedrock-runtime', config=self.config)
+            with self._lock:
+                if not self.bedrock:
+                    with timed('bedrock_client'):
+                        import boto3
+                        from botocore.config import Config
+                        config = Config(
+                            region_name=self.region_name,
+                            signature_version='v4',
+                            # The gateway retries with its own backoff and rate adaptation, so botocore must not retry as well
+                            retries={
+                                'total_max_attempts': 1,
+                                'mode': 'standard'
+                            } if self.gateway is not None else {
+                                'max_attempts': 10,
+                                'mode': 'standard'
+                            },
+                            read_timeout=600,
+                            max_pool_connections=self.max_pool_connections
+                        )
+                        self.bedrock = boto3.client(service_name='bedrock-runtime', config=config)
         return self.bedrock
 
     def invoke_llama_70b(self, model_id, system_prompt, user_prompt, max_tokens=2048, with_response_stream=False):
@@ -46,20 +63,63 @@ class BedrockLLMClient:
                 "top_p": 0.9
             }
 
+            body = json.dumps(body)
+
             if with_response_stream:
-                response = self.get_bedrock_client().invoke_model_with_response_stream(body=json.dumps(body), modelId=model_id)
-                return response
+                def call():
+                    response = self.get_bedrock_client().invoke_model_with_response_stream(body=body, modelId=model_id)
+                    self._count_retries(model_id, response)
+                    return response
             else:
-                response = self.get_bedrock_client().invoke_model(
-                    modelId=model_id, body=json.dumps(body)
-                )
-                response_body = json.loads(response["body"].read())
-                return response_body
+                def call():
+                    response = self.get_bedrock_client().invoke_model(
+                        modelId=model_id, body=body
+                    )
+                    self._count_retries(model_id, response)
+                    return json.loads(response["body"].read())
+
+            if self.gateway is None:
+                return call()
+            # A response stream can only be read once, so streamed calls are never coalesced
+            return self.gateway.invoke(model_id, body, call, max_output_tokens=max_tokens,
+                                       usage=llama_stream_usage if with_response_stream else llama_usage,
+                                       stream=with_response_stream)
         except Exception as e:
+            count('bedrock_errors_total', 'Failed Bedrock calls', model=model_id, error=type(e).__name__)
             logging.error("Couldn't invoke LLama 70B")
             logging.error(e)
             raise
 
+    @staticmethod
+    def _count_retries(model_id, response):
+        # botocore retries throttled calls transparently; the attempts are only visible in the response metadata
+        count('bedrock_requests_total', 'Bedrock calls', model=model_id)
+        retries = response.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        if retries:
+            count('bedrock_retries_total', 'Bedrock retry attempts', amount=retries, model=model_id)
+
+    def stream_llama_70b(self, model_id, system_prompt, user_prompt, max_tokens=2048):
+        """
+        Invoke LLama-70B model with response streaming
+        :param model_id: The ID of the model to use
+        :param system_prompt: The system prompt
+        :param user_prompt: The user prompt
+        :param max_tokens: Maximum number of tokens to generate (default: 2048)
+        :return: Generator of the generated text deltas
+        """
+        response = self.invoke_llama_70b(model_id, system_prompt, user_prompt, max_tokens=max_tokens, with_response_stream=True)
+        for event in response["body"]:
+            chunk = event.get("chunk")
+            if chunk is None:
+                # Errors raised mid-stream arrive as events such as {"throttlingException": {...}}
+                errors = [name for name in event if name.endswith("Exception")]
+                if errors:
+                    raise Exception(f"Bedrock stream error {errors[0]}: {event[errors[0]]}")
+                continue
+            generation = json.loads(chunk["bytes"]).get("generation")
+            if generation:
+                yield generation
+
 if __name__ == "__main__":
     client = BedrockLLMClient()
     response = client.invoke_llama_70b(
@@ -67,4 +127,11 @@ if __name__ == "__main__":
         system_prompt="You are a friendly conversation assistant",
         user_prompt="who are you"
     )
-    print(response)
\ No newline at end of file
+    print(response)
+
+    for text in client.stream_llama_70b(
+        model_id="meta.llama3-70b-instruct-v1:0",
+        system_prompt="You are a friendly conversation assistant",
+        user_prompt="who are you"
+    ):
+        print(text, end="", flush=True)
@@ -1,14 +1,27 @@
 
+import os
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 
-from core.chat_service import ChatService
 from utils.pages_config import make_sidebar
 
 from dotenv import load_dotenv
 
 
+@st.cache_resource
+def load_chat_service():
+    # With CHAT_API_URL set the page is a client of api.server, otherwise the pipeline runs in process
+    api_url = os.environ.get('CHAT_API_URL')
+    # Both branches import their modules here, so the page only loads requests or the pipeline
+    # (boto3, opensearchpy, ...) when it actually uses them
+    if api_url:
+        from api.client import ChatApiClient
+        return ChatApiClient(api_url)
+    # One warm service per process, shared by all sessions and reruns
+    from core.chat_service import get_chat_service
+    return get_chat_service()
+
+
 def history_show():
     for item in st.session_state.messages:
         if item["role"] == "user":
@@ -33,6 +46,8 @@ def main():
         st.title('Setting')
         clean_history = st.button("clean history", on_click=clean_st_history)
 
+    load_chat_service()
+
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
@@ -49,10 +64,9 @@ def main():
                     {"role": "user", "content": search_box, "type": "text"})
                 st.write(search_box)
             # 调用 ChatService
-            chat_service = ChatService()
-            response = chat_service.execute_chat(search_box)
+            chat_service = load_chat_service()
             with st.chat_message("assistant"):
-                st.write(response)
+                response = st.write_stream(chat_service.execute_chat_stream(search_box))
                 st.session_state.messages.append(
                     {"role": "assistant", "content": response, "type": "text"})
 
@@ -1,32 +1,31 @@
 import os
 import json
-import boto3
 import logging
-import pandas as pd
-from botocore.config import Config
-from botocore.exceptions import ClientError
+import threading
+from llm.embedding import TitanEmbeddings
+from llm.embedding_cache import EmbeddingCache
+from utils.startup import timed
 
 
-config = Config(
-    region_name=os.getenv('BEDROCK_REGION'),
-    signature_version='v4',
-    retries={
-        'max_attempts': 10,
-        'mode': 'standard'
-    },
-    read_timeout=600
-)
-
 embedding_info = {
     "embedding_platform": os.getenv('EMBEDDING_PLATFORM', "bedrock"),
     "embedding_name": os.getenv('EMBEDDING_NAME', "amazon.titan-embed-text-v2:0"),
     "embedding_dimension": int(os.getenv('EMBEDDING_DIMENSION', 256)),
-    "embedding_region": os.getenv('EMBEDDING_REGION', os.getenv('AWS_DEFAULT_REGION'))
+    "embedding_region": os.getenv('EMBEDDING_REGION', os.getenv('AWS_DEFAULT_REGION')),
+    "embedding_cache_dir": os.getenv('EMBEDDING_CACHE_DIR', '.cache/embeddings')
 }
 
 BEDROCK_SECRETS_AK_SK = os.getenv('BEDROCK_SECRETS_AK_SK', '')
 
+bedrock = None
+bedrock_ak_sk_info = None
+titan_embeddings = None
+_lock = threading.RLock()
+
+
 def get_bedrock_parameter():
+    import boto3
+    from botocore.exceptions import ClientError
     bedrock_ak_sk_info = {}
     try:
         session = boto3.session.Session()
@@ -45,21 +44,60 @@ def get_bedrock_parameter():
     return bedrock_ak_sk_info
 
 
-bedrock_ak_sk_info = get_bedrock_parameter()
+def get_bedrock_ak_sk_info():
+    # Secrets Manager is only called when a Bedrock client is first needed, not at import time
+    global bedrock_ak_sk_info
+    if bedrock_ak_sk_info is None:
+        with _lock:
+            if bedrock_ak_sk_info is None:
+                with timed('bedrock_secrets'):
+                    bedrock_ak_sk_info = get_bedrock_parameter()
+    return bedrock_ak_sk_info
 
 
 def get_bedrock_client():
     global bedrock
     if not bedrock:
-        if len(bedrock_ak_sk_info) == 0:
-            bedrock = boto3.client(service_name='bedrock-runtime', config=config)
-        else:
-            bedrock = boto3.client(
-                service_name='bedrock-runtime', config=config,
-                aws_access_key_id=bedrock_ak_sk_info['access_key_id'],
-                aws_secret_access_key=bedrock_ak_sk_info['secret_access_key'])
+        with _lock:
+            if not bedrock:
+                import boto3
+                from botocore.config import Config
+                config = Config(
+                    region_name=os.getenv('BEDROCK_REGION'),
+                    signature_version='v4',
+                    retries={
+                        'max_attempts': 10,
+                        'mode': 'standard'
+                    },
+                    read_timeout=600
+                )
+                ak_sk_info = get_bedrock_ak_sk_info()
+                if len(ak_sk_info) == 0:
+                    bedrock = boto3.client(service_name='bedrock-runtime', config=config)
+                else:
+                    bedrock = boto3.client(
+                        service_name='bedrock-runtime', config=config,
+                        aws_access_key_id=ak_sk_info['access_key_id'],
+                        aws_secret_access_key=ak_sk_info['secret_access_key'])
     return bedrock
 
+
+def get_titan_embeddings(model_name):
+    global titan_embeddings
+    embeddings = titan_embeddings
+    if embeddings is None or embeddings.model_id != model_name:
+        with _lock:
+            if titan_embeddings is None or titan_embeddings.model_id != model_name:
+                cache_dir = embedding_info["embedding_cache_dir"]
+                titan_embeddings = TitanEmbeddings(
+                    model_id=model_name,
+                    boto3_client=get_bedrock_client(),
+                    cache=EmbeddingCache(cache_dir) if cache_dir else None
+                )
+            embeddings = titan_embeddings
+    return embeddings
+
+
 def create_vector_embedding(text, index_name):
     model_name = embedding_info["embedding_name"]
     if embedding_info["embedding_platform"] == "bedrock":
@@ -68,17 +106,21 @@ def create_vector_embedding(text, index_name):
         return []
 
 
+def create_vector_embeddings(texts, index_name):
+    model_name = embedding_info["embedding_name"]
+    if embedding_info["embedding_platform"] == "bedrock":
+        embeddings = get_titan_embeddings(model_name).embed_many(texts, dimensions=embedding_info["embedding_dimension"])
+        failed = [text for text, embedding in zip(texts, embeddings) if not embedding]
+        if failed:
+            raise Exception(f"Bedrock embedding failed for {len(failed)} of {len(texts)} texts, e.g. {failed[0][:50]}")
+        return [{"_index": index_name, "text": text, "vector_field": embedding} for text, embedding in zip(texts, embeddings)]
+    else:
+        return []
+
+
 def create_vector_embedding_with_bedrock(text, index_name, model_name):
-    payload = {"inputText": f"{text}"}
-    body = json.dumps(payload)
-    modelId = model_name
-    accept = "application/json"
-    contentType = "application/json"
-
-    response = get_bedrock_client().invoke_model(
-        body=body, modelId=modelId, accept=accept, contentType=contentType
-    )
-    response_body = json.loads(response.get("body").read())
-
-    embedding = response_body.get("embedding")
-    return {"_index": index_name, "text": text, "vector_field": embedding}
\ No newline at end of file
+    embedding = get_titan_embeddings(model_name)(text, dimensions=embedding_info["embedding_dimension"])
+    # TitanEmbeddings returns [] when the Bedrock call fails; raise as the direct invoke_model call did
+    if not embedding:
+        raise Exception(f"Bedrock embedding failed for text: {text[:50]}")
+    return {"_index": index_name, "text": text, "vector_field": embedding}
@@ -0,0 +1,25 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+# 进程内各组件的初始化耗时 (毫秒), 包括客户端首次使用时的延迟创建
+_timings: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(component: str):
+    """Record how long the initialization of a component took; repeated names accumulate."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        with _lock:
+            _timings[component] = round(_timings.get(component, 0.0) + elapsed, 2)
+
+
+def init_timings() -> Dict[str, float]:
+    with _lock:
+        return dict(_timings)
@@ -0,0 +1,304 @@
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.logging import getLogger
+
+logger = getLogger()
+
+# 默认延迟分桶 (秒), 覆盖缓存命中的毫秒级到最终生成的数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            lines.extend(f'{self.name}{_format_labels(key)} {value}' for key, value in sorted(self.values.items()))
+        return lines
+
+    def to_json(self) -> list:
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in sorted(self.values.items())]
+
+
+class Gauge:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge']
+        with self._lock:
+            lines.extend(f'{self.name}{_format_labels(key)} {value}' for key, value in sorted(self.values.items()))
+        return lines
+
+    def to_json(self) -> list:
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{self.name}_bucket{_format_labels(key, {"le": le})} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {series["count"]}')
+        return lines
+
+    def to_json(self) -> list:
+        with self._lock:
+            return [{
+                'labels': dict(key),
+                'count': series['count'],
+                'sum': series['sum'],
+                'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], series['counts']))
+            } for key, series in sorted(self.series.items())]
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics. Counters and histograms are created on first use; collectors are callables
+    returning {metric_name: value} that are read at export time, e.g. to expose cache stats() as gauges.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.collectors: List[Tuple[str, Callable[[], dict]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, description='') -> Counter:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, description)
+            return self.metrics[name]
+
+    def gauge(self, name, description='') -> Gauge:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Gauge(name, description)
+            return self.metrics[name]
+
+    def histogram(self, name, description='', buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, description, buckets)
+            return self.metrics[name]
+
+    def register_collector(self, prefix, collector: Callable[[], dict]):
+        with self._lock:
+            self.collectors = [(p, c) for p, c in self.collectors if p != prefix] + [(prefix, collector)]
+
+    def _collect(self) -> Dict[str, float]:
+        gauges = {}
+        for prefix, collector in list(self.collectors):
+            try:
+                for name, value in collector().items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        gauges[f'{prefix}_{name}'] = value
+            except Exception as e:
+                logger.error(f"Metrics collector {prefix} failed: {e}")
+        return gauges
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.to_prometheus())
+        for name, value in sorted(self._collect().items()):
+            lines.extend([f'# TYPE {name} gauge', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> dict:
+        data = {name: metric.to_json() for name, metric in list(self.metrics.items())}
+        data.update(self._collect())
+        return data
+
+
+registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    return registry
+
+
+class RequestTrace:
+    """
+    Timings of one question through the pipeline. Each stage runs inside span(); its duration is kept
+    on the trace and observed in the qa_stage_latency_seconds histogram. Failed stages count in
+    qa_errors_total. Attributes such as the generated Cypher are attached with set().
+    """
+
+    def __init__(self, request_id: Optional[str] = None, slow_threshold_seconds: Optional[float] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self.attributes: Dict[str, object] = {}
+        self.duration = None
+        self.status = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str):
+        metrics = get_registry()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield self
+        except Exception as e:
+            error = type(e).__name__
+            metrics.counter('qa_errors_total', 'Pipeline stage failures').inc(stage=stage, error=error)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.histogram('qa_stage_latency_seconds', 'Latency of each QA pipeline stage').observe(elapsed, stage=stage)
+            with self._lock:
+                self.spans.append({
+                    'stage': stage,
+                    'start_ms': round((start - self.started) * 1000, 2),
+                    'duration_ms': round(elapsed * 1000, 2),
+                    'error': error
+                })
+
+    def set(self, name, value):
+        with self._lock:
+            self.attributes[name] = value
+
+    def stage_timings(self) -> Dict[str, float]:
+        with self._lock:
+            return {span['stage']: span['duration_ms'] for span in self.spans}
+
+    def finish(self, status='ok'):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.started
+        self.status = status
+        metrics = get_registry()
+        metrics.histogram('qa_request_latency_seconds', 'End-to-end latency of a question').observe(self.duration)
+        metrics.counter('qa_requests_total', 'Questions processed').inc(status=status)
+        if self.slow_threshold_seconds is not None and self.duration >= self.slow_threshold_seconds:
+            logger.warning(f"Slow request: {json.dumps(self.to_json(), ensure_ascii=False)}")
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {
+                'request_id': self.request_id,
+                'status': self.status,
+                'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+                'spans': list(self.spans),
+                'attributes': dict(self.attributes)
+            }
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: RequestTrace):
+    """Make trace the current trace of this thread (and of contexts copied from it)."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Span of the current trace; still records the stage histogram when no trace is active."""
+    trace = current_trace()
+    if trace is None:
+        trace = RequestTrace()
+        with trace.span(stage):
+            yield trace
+    else:
+        with trace.span(stage):
+            yield trace
+
+
+def count(name, description='', amount=1, **labels):
+    get_registry().counter(name, description).inc(amount, **labels)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the current trace into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+if __name__ == "__main__":
+    trace = RequestTrace(slow_threshold_seconds=0.01)
+    with use_trace(trace):
+        with span('generate_cypher'):
+            trace.set('cypher', 'MATCH (m:FundManager) RETURN m LIMIT 30')
+            time.sleep(0.02)
+        count('cache_hits_total', 'Cache hits', cache='cypher_exact')
+    trace.finish()
+    print(get_registry().to_prometheus())